@@ -0,0 +1,261 @@
+import time, heapq
+from typing import AbstractSet, Dict, List, Optional, Tuple
+from collections import Counter
+
+import numpy as np
+
+from backend.utils import MINHASH_PERM, MINHASH_BANDS, MINHASH_SHINGLE
+from backend.simgraph import similarity_groups
+from backend.corpus import CompactCorpus
+
+
+# -------------------- /anomalies: staged pipeline --------------------
+# One pass builds a per-user index; every stage reads that index instead of rescanning posts.
+class UserIndex:
+    __slots__ = ("items", "buckets")
+
+    def __init__(self):
+        self.items: List[Dict] = []                      # {"id", "raw", "norm"} in post order
+        self.buckets: Dict[str, List[Dict]] = {}         # norm -> items, first-seen order
+
+
+def user_rows(corpus: CompactCorpus, users: AbstractSet[int]) -> List[int]:
+    """
+    Row numbers of `users`' posts, in corpus order.
+    """
+    return [i for i, uid in enumerate(corpus.user_ids) if uid in users]
+
+
+def build_user_index(corpus: CompactCorpus, users: Optional[AbstractSet[int]] = None) -> Dict[int, UserIndex]:
+    """
+    userId -> UserIndex, users in first-seen order; reads the precomputed normalized titles.
+    `users` restricts the index to those users (incremental updates).
+    """
+    index: Dict[int, UserIndex] = {}
+    cols = (corpus.ids, corpus.user_ids, corpus.titles, corpus.norms)
+    rows = zip(*cols) if users is None else (tuple(c[i] for c in cols) for i in user_rows(corpus, users))
+    for pid, uid, raw, norm in rows:
+        ui = index.get(uid)
+        if ui is None:
+            ui = index[uid] = UserIndex()
+        it = {"id": pid, "raw": raw, "norm": norm}
+        ui.items.append(it)
+        ui.buckets.setdefault(norm, []).append(it)
+    return index
+
+
+def short_titles_stage(corpus: CompactCorpus, min_title_len: int) -> List[Dict]:
+    return [corpus.post(i) for i, t in enumerate(corpus.titles) if len(t) < min_title_len]
+
+
+def user_duplicates(uid: int, ui: UserIndex) -> List[Dict]:
+    dups = [{"userId": uid, "title": bucket[0]["raw"], "count": len(bucket), "postIds": [it["id"] for it in bucket]}
+            for bucket in ui.buckets.values() if len(bucket) > 1]
+    return sorted(dups, key=lambda x: -x["count"])
+
+
+class AnomalyState:
+    """
+    The per-user stages of one corpus view (index + duplicate entries), kept between versions:
+    advance() rebuilds only the users a corpus delta lists and shares the rest.
+    """
+    __slots__ = ("version", "n", "index", "dups")
+
+    def __init__(self, version: str, n: int, index: Dict[int, UserIndex], dups: Dict[int, List[Dict]]):
+        self.version, self.n, self.index, self.dups = version, n, index, dups
+
+    @classmethod
+    def build(cls, corpus: CompactCorpus, version: str) -> "AnomalyState":
+        index = build_user_index(corpus)
+        return cls(version, len(corpus), index, {uid: user_duplicates(uid, ui) for uid, ui in index.items()})
+
+    def advance(self, corpus: CompactCorpus, version: str, users: AbstractSet[int]) -> "AnomalyState":
+        index, dups = dict(self.index), dict(self.dups)
+        for uid in users:
+            index.pop(uid, None); dups.pop(uid, None)
+        fresh = build_user_index(corpus, users)
+        index.update(fresh)
+        dups.update((uid, user_duplicates(uid, ui)) for uid, ui in fresh.items())
+        return AnomalyState(version, len(corpus), index, dups)
+
+    def duplicates(self) -> List[Dict]:
+        return [d for uid in sorted(self.dups) for d in self.dups[uid]]
+
+    def nbytes(self) -> int:
+        # rough: item dicts dominate
+        return 400 * self.n + 200 * len(self.index)
+
+
+def similarity_job(ui: UserIndex, method: str, thresholds: List[float], floor: float, graph=None):
+    """
+    One user's groups at each threshold, plus the similarity graph to cache for the next call.
+    """
+    return similarity_groups(ui.items, method, thresholds, floor, graph)
+
+
+def similarity_backend(method: str) -> str:
+    if method == "embedding":
+        # sentence-transformers was too costly for deployment; MinHash/LSH is the
+        # CPU-only, no-download near-duplicate backend behind this method now
+        return "minhash"
+    return method
+
+
+def similarity_jobs(index: Dict[int, UserIndex]) -> List[int]:
+    """
+    Users needing similarity grouping, in output order; each is an independent job.
+    """
+    return [uid for uid in sorted(index) if len(index[uid].items) >= 2]
+
+
+def collect_suspicious(uids: List[int], results: List[Tuple[List[Dict], Dict[str, int]]],
+                       suspicious_threshold: int) -> Tuple[List[Dict], Counter]:
+    suspicious_users = []
+    pair_stats: Counter = Counter()
+    for uid, (groups, stats) in zip(uids, results):
+        pair_stats.update(stats)
+        total_similar = sum(g["count"] for g in groups)
+        if total_similar > suspicious_threshold:
+            suspicious_users.append({
+                "userId": uid,
+                "total_similar_posts": total_similar,
+                "groups": groups
+            })
+    return sorted(suspicious_users, key=lambda x: -x["total_similar_posts"]), pair_stats
+
+
+def anomalies_meta(method: str, backend_used: str, similar_threshold: float, max_scan: int, version: str,
+                   pair_stats: Counter, graph_info: Optional[Dict] = None) -> Dict:
+    meta = {"backend": backend_used, "similar_threshold": similar_threshold, "max_scan": max_scan, "corpus_version": version}
+    if graph_info is not None:
+        meta["similarity_graph"] = graph_info
+    if method == "fuzzy":
+        meta["fuzzy_pairs"] = {"compared": pair_stats["pairs"], "exact": pair_stats["exact"],
+                               "pruned": pair_stats["pruned_length"] + pair_stats["pruned_chars"],
+                               "reused": pair_stats["reused"]}
+    elif backend_used == "minhash":
+        meta["minhash"] = {"perm": MINHASH_PERM, "bands": MINHASH_BANDS, "shingle": MINHASH_SHINGLE}
+    return meta
+
+
+def prepare_anomalies(corpus: CompactCorpus, min_title_len: int, version: str = "",
+                      state: Optional[AnomalyState] = None, users: Optional[AbstractSet[int]] = None
+                      ) -> Tuple[AnomalyState, List[Dict], List[Dict], Dict[str, float]]:
+    """
+    Linear stages: per-user index + duplicates (an AnomalyState: `state` advanced over the
+    `users` delta when given, else built), short titles; plus each stage's seconds
+    (measured here so they survive a process-pool round trip).
+    """
+    t0 = time.perf_counter()
+    if state is None or users is None:
+        state = AnomalyState.build(corpus, version)
+    elif users or state.version != version:
+        state = state.advance(corpus, version, users)
+    t1 = time.perf_counter()
+    # 1 short titles
+    short_titles = short_titles_stage(corpus, min_title_len)
+    t2 = time.perf_counter()
+    # 2 duplicates by same user (normalized)
+    duplicate_titles = state.duplicates()
+    t3 = time.perf_counter()
+    return state, short_titles, duplicate_titles, {"index": t1 - t0, "short_titles": t2 - t1, "duplicates": t3 - t2}
+
+
+def empty_anomalies(method: str) -> Dict:
+    return {"short_titles": [], "duplicate_titles": [], "suspicious_users": [], "meta": {"backend": method}}
+
+
+# -------------------- /summary: top users with unique words + global word freq --------------------
+def count_user_words(corpus: CompactCorpus, drop_stopwords: bool,
+                     users: Optional[AbstractSet[int]] = None) -> Dict[int, Counter]:
+    """
+    userId -> Counter of token ids over that user's titles (only `users`, when given).
+    """
+    counts: Dict[int, Counter] = {}
+    stop, uids = corpus.stop, corpus.user_ids
+    for i in range(len(corpus)) if users is None else user_rows(corpus, users):
+        uid = uids[i]
+        c = counts.get(uid)
+        if c is None:
+            c = counts[uid] = Counter()
+        toks = corpus.token_ids(i)
+        c.update([t for t in toks if not stop[t]] if drop_stopwords else toks)
+    return counts
+
+
+class SummaryState:
+    """
+    Per-user token Counters and their sum for one corpus view; advance() swaps in recounts of
+    the users a corpus delta lists and patches the global counts by the difference.
+    """
+    __slots__ = ("version", "n", "drop_stopwords", "user_counts", "global_counts")
+
+    def __init__(self, version: str, n: int, drop_stopwords: bool, user_counts: Dict[int, Counter]):
+        self.version, self.n, self.drop_stopwords, self.user_counts = version, n, drop_stopwords, user_counts
+        self.global_counts: Counter = Counter()
+
+    @classmethod
+    def build(cls, corpus: CompactCorpus, drop_stopwords: bool, version: str) -> "SummaryState":
+        state = cls(version, len(corpus), drop_stopwords, count_user_words(corpus, drop_stopwords))
+        for c in state.user_counts.values():
+            state.global_counts.update(c)
+        return state
+
+    def advance(self, corpus: CompactCorpus, version: str, users: AbstractSet[int]) -> "SummaryState":
+        state = SummaryState(version, len(corpus), self.drop_stopwords, dict(self.user_counts))
+        g = state.global_counts = self.global_counts.copy()
+        touched = set()
+        for uid in users:
+            old = state.user_counts.pop(uid, None)
+            if old:
+                g.subtract(old)
+                touched.update(old)
+        fresh = count_user_words(corpus, self.drop_stopwords, users)
+        for c in fresh.values():
+            g.update(c)
+        state.user_counts.update(fresh)
+        for t in touched:
+            if g[t] <= 0:
+                del g[t]
+        return state
+
+    def result(self, corpus: CompactCorpus, top_n_users: int, max_scan: int) -> Dict:
+        # ties keep the full-count order: users by first post, words by first occurrence
+        counts = self.user_counts
+        ranked_users = sorted(dict.fromkeys(corpus.user_ids), key=lambda u: -len(counts[u]))[:top_n_users]
+        top = self.top_words(corpus, 20)
+        return {"top_users_by_unique_words": [{"userId": u, "unique_word_count": len(counts[u])} for u in ranked_users],
+                "top_words": [{"word": corpus.words[w], "count": c} for w, c in top],
+                "meta": {"max_scan": max_scan, "corpus_version": self.version}}
+
+    def top_words(self, corpus: CompactCorpus, k: int) -> List[Tuple[int, int]]:
+        """
+        The k most common (token id, count), ties broken by first occurrence in `corpus` as
+        Counter.most_common does. Token ids can't stand in for that order: the vocabulary is
+        seeded from earlier snapshots. Only words tied at or above the k-th count are located.
+        """
+        g = self.global_counts
+        kth = heapq.nlargest(k, g.values())[-1] if len(g) > k else 0
+        cands = [(w, c) for w, c in g.items() if c >= kth]
+        toks = np.frombuffer(corpus.tok_flat, dtype=np.uint32)
+        hit = np.flatnonzero(np.isin(toks, np.fromiter((w for w, _ in cands), dtype=np.uint32, count=len(cands))))
+        found, first = np.unique(toks[hit], return_index=True)
+        pos = dict(zip(found.tolist(), hit[first].tolist()))
+        return sorted(cands, key=lambda kv: (-kv[1], pos.get(kv[0], len(toks))))[:k]
+
+    def nbytes(self) -> int:
+        # rough: ~100 bytes per Counter entry
+        return 100 * (sum(len(c) for c in self.user_counts.values()) + len(self.global_counts))
+
+
+def summary_job(corpus: CompactCorpus, top_n_users: int, drop_stopwords: bool, max_scan: int, version: str,
+                state: Optional[SummaryState] = None, users: Optional[AbstractSet[int]] = None
+                ) -> Tuple[Dict, SummaryState]:
+    """
+    The summary plus the state to keep: `state` advanced over the `users` delta when given, else built.
+    """
+    if state is None or users is None:
+        state = SummaryState.build(corpus, drop_stopwords, version)
+    elif users or state.version != version:
+        state = state.advance(corpus, version, users)
+    return state.result(corpus, top_n_users, max_scan), state
@@ -1,25 +1,80 @@
-import os, re, time, asyncio
-from typing import Dict, List, Optional, Literal, Tuple
-from collections import defaultdict, Counter, OrderedDict
+import os, re, time, asyncio, hashlib, tempfile
+from typing import Dict, FrozenSet, List, Optional, Literal, Tuple
+from collections import deque, Counter
 
 import httpx
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
 
-from backend.utils import normalize_title, cosine_similarity_titles, fuzzy_ratio, tokenize
+from backend.analytics import (summary_job, prepare_anomalies, similarity_job, similarity_backend, similarity_jobs,
+                               collect_suspicious, anomalies_meta, empty_anomalies)
+from backend.simgraph import similarity_floor
+from backend.search import SearchIndexHolder, QueryError
+from backend.crossuser import cross_user_clusters
+from backend.persist import SnapshotError, load_snapshot, save_snapshot, snapshot_entries
+from backend.corpus import CorpusStore, CorpusSnapshot
+from backend.cache import TTLCache, SQLiteCache
+from backend.encoding import Encoded, dumps, accepts_gzip
+from backend.workers import AnalyticsExecutor, AnalyticsBusy, AnalyticsTimeout
+from backend.resilience import (CircuitBreaker, Hedger, ScanDeadlineExceeded, backoff_delay, deadline_after,
+                                 remaining)
+from backend.metrics import (REGISTRY, MetricsMiddleware, UPSTREAM_SECONDS, UPSTREAM_RETRIES, SCAN_PAGES,
+                             record_stage, timed)
 
 # -------------------- Config --------------------
 UPSTREAM_URL     = os.getenv("UPSTREAM_URL", "https://jsonplaceholder.typicode.com/posts")
 UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))      # seconds
 CHUNK_LIMIT      = int(os.getenv("CHUNK_LIMIT", "50"))            # upstream _limit per page
 SCAN_MAX         = int(os.getenv("SCAN_MAX", "100"))             # safety cap for scans
+SCAN_LIMIT       = max(SCAN_MAX, int(os.getenv("SCAN_LIMIT", "10000")))  # largest max_scan a request may ask for
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))        # upstream windows in flight per scan (1 = sequential)
+CORPUS_REFRESH   = float(os.getenv("CORPUS_REFRESH", "60"))       # seconds between background corpus re-scans (0 = off)
 
-# local cache only
+# upstream resilience
+UPSTREAM_ATTEMPTS    = int(os.getenv("UPSTREAM_ATTEMPTS", "3"))          # tries per upstream GET
+UPSTREAM_BACKOFF     = float(os.getenv("UPSTREAM_BACKOFF", "0.2"))       # seconds; full-jitter exponential base
+UPSTREAM_BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", "2"))     # seconds; max single backoff
+BREAKER_FAILURES     = int(os.getenv("BREAKER_FAILURES", "5"))           # consecutive failures to open (0 = off)
+BREAKER_RESET        = float(os.getenv("BREAKER_RESET", "30"))           # seconds open before a half-open probe
+HEDGE_PERCENTILE     = float(os.getenv("HEDGE_PERCENTILE", "95"))        # hedge past this latency percentile (0 = off)
+HEDGE_MIN_DELAY      = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))       # seconds; never hedge sooner
+SCAN_DEADLINE        = float(os.getenv("SCAN_DEADLINE", "20"))           # seconds shared by all pages of a scan (0 = none)
+UPSTREAM_REVALIDATE  = os.getenv("UPSTREAM_REVALIDATE", "on") != "off"   # conditional GETs for pages with ETag/Last-Modified
+PAGE_TTL             = int(os.getenv("PAGE_TTL", "86400"))              # seconds a page's validators + rows are kept
+PAGE_CACHE_BYTES     = int(os.getenv("PAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# warm-start snapshot of the corpus + cached analytics ("" = off)
+SNAPSHOT_PATH     = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_MAX_AGE  = float(os.getenv("SNAPSHOT_MAX_AGE", "86400"))  # seconds; older snapshots are ignored (0 = any)
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))   # seconds between background saves (0 = shutdown only)
+
+# response cache: per-process memory, or a SQLite file shared by all workers on the host
+CACHE_BACKEND    = os.getenv("CACHE_BACKEND", "memory")           # memory | sqlite
+CACHE_PATH       = os.getenv("CACHE_PATH", os.path.join(tempfile.gettempdir(), "cookie-cutter-cache.sqlite3"))
 CACHE_TTL        = int(os.getenv("CACHE_TTL", "60"))              # seconds
 MAX_CACHE_ITEMS  = int(os.getenv("MAX_CACHE_ITEMS", "500"))       # cap entries to bound memory
+MAX_CACHE_BYTES  = int(os.getenv("MAX_CACHE_BYTES", str(64 * 1024 * 1024)))  # estimated payload bytes (0 = no cap)
+CACHE_STALE_TTL  = int(os.getenv("CACHE_STALE_TTL", "30"))        # serve expired entries this long while refreshing (0 = off)
+
+# CPU-bound analytics run off the event loop
+ANALYTICS_EXECUTOR  = os.getenv("ANALYTICS_EXECUTOR", "thread")         # inline | thread | process
+ANALYTICS_WORKERS   = int(os.getenv("ANALYTICS_WORKERS", "0")) or None   # 0 = cpu count
+ANALYTICS_MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "64"))        # pending jobs before 503
+ANALYTICS_TIMEOUT   = float(os.getenv("ANALYTICS_TIMEOUT", "30"))        # seconds per job before 504 (0 = none)
+
+# per-user similarity graphs, reused across thresholds for one corpus version (in-process only)
+GRAPH_TTL        = int(os.getenv("GRAPH_TTL", "600"))             # seconds
+GRAPH_CACHE_BYTES = int(os.getenv("GRAPH_CACHE_BYTES", str(128 * 1024 * 1024)))
+STATE_TTL        = int(os.getenv("STATE_TTL", "3600"))            # seconds an incremental analytics state outlives its version
+STATE_CACHE_BYTES = int(os.getenv("STATE_CACHE_BYTES", str(256 * 1024 * 1024)))
+MAX_THRESHOLDS   = 20                                              # values per multi-threshold request
+
+RESPONSE_GZIP_MIN = int(os.getenv("RESPONSE_GZIP_MIN", "1024"))   # pre-gzip cached bodies at least this big (0 = off)
+
+SERVER_TIMING    = os.getenv("SERVER_TIMING", "on") != "off"      # per-stage Server-Timing response header
 
 RATE_LIMIT       = os.getenv("RATE_LIMIT", "60/minute")                 # e.g., "60/minute" or "off"
 ALLOW_ORIGINS    = [o for o in os.getenv("ALLOW_ORIGINS", "http://localhost:3000").split(",") if o]
@@ -49,38 +104,98 @@ except Exception:
     RateLimitExceeded = Exception
     rate_limit = _noop_decorator
 
-# -------------------- Local TTL + LRU-ish cache --------------------
-# Stores: key -> { val, exp }. Uses OrderedDict for LRU eviction.
-_mem_cache: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+# -------------------- TTL + LRU cache --------------------
+# Heap-indexed expiry, entry + byte caps, stale window for stale-while-revalidate (see backend/cache.py).
+# CACHE_BACKEND=sqlite keeps the same semantics in a WAL file so multiple uvicorn workers share hits.
+def make_cache(backend: str = CACHE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteCache(CACHE_PATH, MAX_CACHE_ITEMS, MAX_CACHE_BYTES, CACHE_STALE_TTL)
+    if backend == "memory":
+        return TTLCache(MAX_CACHE_ITEMS, MAX_CACHE_BYTES, CACHE_STALE_TTL)
+    raise ValueError(f"unknown cache backend: {backend}")
 
-def _cache_get(k: str):
-    entry = _mem_cache.get(k)
-    if not entry:
-        return None
-    if entry["exp"] < time.time():
-        _mem_cache.pop(k, None)
-        return None
-    # mark as recently used
-    _mem_cache.move_to_end(k, last=True)
-    return entry["val"]
-
-def _cache_set(k: str, v, ttl: int):
-    # insert/update
-    _mem_cache[k] = {"val": v, "exp": time.time() + ttl}
-    _mem_cache.move_to_end(k, last=True)
-    # evict expired first (cheap pass)
-    expired = [kk for kk, ee in _mem_cache.items() if ee["exp"] < time.time()]
-    for kk in expired:
-        _mem_cache.pop(kk, None)
-    # hard cap eviction (LRU)
-    while len(_mem_cache) > MAX_CACHE_ITEMS:
-        _mem_cache.popitem(last=False)  # remove least-recently used
+_mem_cache = make_cache()
+# graphs are arrays/dicts, not JSON: always a local cache, bounded by their own byte budget
+_graph_cache = TTLCache(64, GRAPH_CACHE_BYTES)
+# same for the per-view incremental analytics state (see "Incremental analytics state" below)
+_state_cache = TTLCache(32, STATE_CACHE_BYTES)
+# upstream pages kept with their validators for conditional GETs (see "Conditional upstream GETs")
+_page_cache = TTLCache(4096, PAGE_CACHE_BYTES)
+
+async def cache_lookup(key: str) -> Tuple[object, bool]:
+    """
+    (value, fresh); value is None on a miss, fresh is False for a stale-but-servable entry.
+    A blocking backend (SQLite) is called from a thread, never on the event loop.
+    """
+    if _mem_cache.blocking:
+        return await asyncio.to_thread(_mem_cache.lookup, key)
+    return _mem_cache.lookup(key)
 
 async def cache_get(key: str):
-    return _cache_get(key)
+    if _mem_cache.blocking:
+        return await asyncio.to_thread(_mem_cache.get, key)
+    return _mem_cache.get(key)
 
 async def cache_set(key: str, value, ttl: int):
-    _cache_set(key, value, ttl)
+    if _mem_cache.blocking:
+        await asyncio.to_thread(_mem_cache.set, key, value, ttl)
+    else:
+        _mem_cache.set(key, value, ttl)
+
+# -------------------- Single-flight: coalesce concurrent misses per key --------------------
+_inflight: Dict[str, asyncio.Task] = {}
+_cache_stats: Counter = Counter()   # hits / misses / coalesced
+
+def _start_compute(key: str, compute, ttl: int) -> asyncio.Task:
+    task = asyncio.ensure_future(_compute_and_store(key, compute, ttl))
+    # nobody left awaiting (all callers disconnected) -> don't warn about an unretrieved error
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _inflight[key] = task
+    return task
+
+async def _compute_and_store(key: str, compute, ttl: int):
+    try:
+        value = await compute()
+        await cache_set(key, value, ttl)   # failures raise above and are never cached
+        return value
+    finally:
+        _inflight.pop(key, None)
+
+async def cache_get_or_compute(key: str, compute, ttl: int, use_cache: bool = True):
+    """
+    Cache lookup; on a miss the first caller runs `compute()` and concurrent callers
+    for the same key await that same task (its result or its exception).
+    A stale entry is returned immediately while one background task refreshes it.
+    """
+    if not use_cache:
+        return await compute()
+    value, _ = await cache_get_or_compute_outcome(key, compute, ttl)
+    return value
+
+async def cache_get_or_compute_outcome(key: str, compute, ttl: int) -> Tuple[object, str]:
+    """
+    cache_get_or_compute with how it was answered: "hits", "stale", "misses" or "coalesced".
+    """
+    cached, fresh = await cache_lookup(key)
+    if cached is not None:
+        outcome = "hits" if fresh else "stale"
+        if not fresh and key not in _inflight:
+            _start_compute(key, compute, ttl)
+        _cache_stats[outcome] += 1
+        return cached, outcome
+    task = _inflight.get(key)
+    if task is not None:
+        outcome = "coalesced"
+    else:
+        outcome = "misses"
+        task = _start_compute(key, compute, ttl)
+    _cache_stats[outcome] += 1
+    # shield: one caller disconnecting must not cancel the computation for the others
+    return await asyncio.shield(task), outcome
+
+def cache_stats() -> Dict[str, int]:
+    return {**_mem_cache.stats(), "inflight": len(_inflight),
+            **{k: _cache_stats[k] for k in ("hits", "stale", "misses", "coalesced")}}
 
 # -------------------- App, CORS, shared HTTP client --------------------
 @asynccontextmanager
@@ -91,10 +206,30 @@ async def lifespan(app: FastAPI):
         limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
         headers={"User-Agent": "posts-proxy/1.0"}
     )
+    # breaker + hedging state for every upstream GET
+    app.state.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+    app.state.hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MIN_DELAY)
+    # full-text index over the corpus, rebuilt in the background when its version changes
+    app.state.search = SearchIndexHolder()
+    # ONE shared corpus snapshot for all analytics endpoints
+    app.state.corpus = CorpusStore(scan_all_titles, SCAN_MAX, CORPUS_REFRESH)
+    # warm start: serve the on-disk snapshot (if any) right away; start() refreshes it in the background
+    app.state.snapshot_info = restore_snapshot()
+    app.state.corpus.start()
+    app.state.analytics = AnalyticsExecutor(ANALYTICS_EXECUTOR, ANALYTICS_WORKERS, ANALYTICS_MAX_QUEUE, ANALYTICS_TIMEOUT)
+    saver = asyncio.create_task(snapshot_saver()) if SNAPSHOT_PATH and SNAPSHOT_INTERVAL > 0 else None
     try:
         yield   # app runs here
     finally:
         # close cleanly on shutdown
+        if saver is not None:
+            saver.cancel()
+        await app.state.corpus.stop()
+        try:
+            await persist_snapshot()
+        except OSError:
+            pass
+        app.state.analytics.shutdown()
         try:
             await app.state.client.aclose()
         except Exception:
@@ -107,6 +242,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# fresh ones are installed on every startup (see lifespan)
+app.state.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+app.state.hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MIN_DELAY)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOW_ORIGINS,
@@ -115,6 +254,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
+
 if limiter:
     app.state.limiter = limiter
     app.add_middleware(SlowAPIMiddleware)
@@ -123,64 +264,469 @@ if limiter:
     async def _rate_exceeded(_: Request, __: RateLimitExceeded):
         return JSONResponse(status_code=429, content={"error": "Too many requests"})
 
+@app.exception_handler(AnalyticsBusy)
+async def _analytics_busy(_: Request, exc: AnalyticsBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(AnalyticsTimeout)
+async def _analytics_timeout(_: Request, exc: AnalyticsTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 
 
 # -------------------- HTTP helpers (retries/backoff) --------------------
-async def get_with_retries(params: Dict, attempts=3) -> httpx.Response:
-    delay = 0.2
+UPSTREAM_ERRORS = (httpx.RequestError, httpx.HTTPStatusError)   # incl. CircuitOpen / scan deadline
+
+def _breaker_failure(e: Exception) -> bool:
+    # transport errors, 5xx and 429 mean upstream trouble; other 4xx are our request
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return True
+
+async def get_with_retries(params: Dict, attempts: int = UPSTREAM_ATTEMPTS, deadline: Optional[float] = None,
+                           headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """
+    GET upstream through the breaker, hedging slow attempts and retrying with jittered backoff.
+    `deadline` (monotonic) bounds every attempt and sleep; scans share one across all pages.
+    With conditional `headers`, a 304 is returned like a success.
+    """
+    breaker: CircuitBreaker = app.state.breaker
+    hedger: Hedger = app.state.hedger
+
+    async def send():
+        if headers:
+            r = await app.state.client.get(UPSTREAM_URL, params=params, headers=headers)
+            if r.status_code == 304:
+                return r
+        else:
+            r = await app.state.client.get(UPSTREAM_URL, params=params)
+        r.raise_for_status()
+        return r
+
     for i in range(attempts):
+        breaker.check()
+        budget = remaining(deadline)
+        t0 = time.perf_counter()
         try:
-            r = await app.state.client.get(UPSTREAM_URL, params=params)
-            r.raise_for_status()
-            return r
-        except (httpx.RequestError, httpx.HTTPStatusError):
-            if i == attempts - 1:
+            if budget is None:
+                r = await hedger.run(send)
+            else:
+                try:
+                    r = await asyncio.wait_for(hedger.run(send), budget)
+                except asyncio.TimeoutError:
+                    raise ScanDeadlineExceeded("scan deadline exceeded") from None
+        except UPSTREAM_ERRORS as e:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - t0, type(e).__name__)
+            if isinstance(e, ScanDeadlineExceeded):
+                breaker.release_probe()   # says nothing about upstream health either way
+                raise
+            if _breaker_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # upstream answered; the request itself was refused
+            if i == attempts - 1 or breaker.state == CircuitBreaker.OPEN:
                 raise
-            await asyncio.sleep(delay)
-            delay *= 2
+            UPSTREAM_RETRIES.inc()
+            pause = backoff_delay(i, UPSTREAM_BACKOFF, UPSTREAM_BACKOFF_CAP)
+            left = remaining(deadline)
+            await asyncio.sleep(pause if left is None else min(pause, left))
+            continue
+        elapsed = time.perf_counter() - t0
+        UPSTREAM_SECONDS.observe(elapsed, "ok")
+        hedger.observe(elapsed)
+        breaker.record_success()
+        return r
+
+# -------------------- Conditional upstream GETs --------------------
+# A page that came with an ETag or Last-Modified is kept (parsed) per request params; the next
+# fetch of it sends If-None-Match / If-Modified-Since, and a 304 reuses the kept rows unparsed.
+_page_stats: Counter = Counter()   # revalidated / not_modified
+
+def page_key(params: Dict) -> str:
+    return "page:" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+async def get_page(params: Dict, deadline: Optional[float] = None) -> Tuple[List[Dict], Dict[str, Optional[str]]]:
+    """
+    (rows, {"X-Total-Count": ...}) for one upstream page, revalidating the kept copy if there is one.
+    """
+    key = page_key(params)
+    kept = _page_cache.get(key) if UPSTREAM_REVALIDATE else None
+    conditional = {}
+    if kept is not None:
+        if kept["etag"]:
+            conditional["If-None-Match"] = kept["etag"]
+        if kept["last_modified"]:
+            conditional["If-Modified-Since"] = kept["last_modified"]
+        _page_stats["revalidated"] += 1
+    resp = await get_with_retries(params, deadline=deadline, headers=conditional)
+    if resp.status_code == 304:
+        _page_stats["not_modified"] += 1
+        return kept["rows"], kept["headers"]
+    rows = resp.json()
+    headers = {"X-Total-Count": resp.headers.get("X-Total-Count")}
+    etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if UPSTREAM_REVALIDATE and (etag or last_modified):
+        _page_cache.set(key, {"etag": etag, "last_modified": last_modified, "rows": rows, "headers": headers}, PAGE_TTL)
+    return rows, headers
+
+def page_stats() -> Dict[str, int]:
+    return {"kept": len(_page_cache), "bytes": _page_cache.bytes,
+            **{k: _page_stats[k] for k in ("revalidated", "not_modified")}}
+
+async def iter_pages(client_params: Dict, start: int, limit: int, max_records: int, concurrency: Optional[int] = None):
+    """
+    _iter_pages under one SCAN_DEADLINE budget shared by all its pages, counting pages fetched.
+    """
+    pages = 0
+    deadline = deadline_after(SCAN_DEADLINE)
+    try:
+        async with aclosing(_iter_pages(client_params, start, limit, max_records, concurrency, deadline)) as it:
+            async for page in it:
+                pages += 1
+                yield page
+    finally:
+        SCAN_PAGES.observe(pages)
 
-async def iter_pages(client_params: Dict, start: int, limit: int, max_records: int):
+async def _iter_pages(client_params: Dict, start: int, limit: int, max_records: int, concurrency: Optional[int] = None,
+                      deadline: Optional[float] = None):
     """
     Iterate upstream in chunks using _start/_limit (JSONPlaceholder supports these).
     Stops when max_records reached or upstream returns empty.
+    The first page's X-Total-Count plans the remaining windows, which are then fetched
+    `concurrency` at a time through the shared client; pages are still yielded in order.
     """
-    fetched = 0
-    while True:
+    concurrency = SCAN_CONCURRENCY if concurrency is None else concurrency
+    origin, fetched = start, 0
+    chunk = min(limit, max_records) if max_records else limit
+    data, headers = await get_page({"_start": start, "_limit": chunk, **client_params}, deadline)
+    if not data:
+        return
+    yield data, headers
+    fetched += len(data)
+    start += len(data)
+
+    total = _parse_total(headers)
+    if concurrency > 1 and total is not None:
+        # plan with the page size upstream actually served (it may cap _limit below ours)
+        page = len(data)
+        end = min(total, origin + max_records) if max_records else total
+        windows = [(s, min(page, end - s)) for s in range(start, end, page)]
+        async for data, headers in _fetch_windows(client_params, windows, concurrency, deadline):
+            yield data, headers
+            fetched += len(data)
+            start += len(data)
+        if start >= end:
+            return
+        # a short page ended the windows early: finish sequentially from where it stopped
+
+    while not (max_records and fetched >= max_records):
         chunk = min(limit, max_records - fetched) if max_records else limit
-        params = {"_start": start, "_limit": chunk, **client_params}
-        resp = await get_with_retries(params)
-        data = resp.json()
+        data, headers = await get_page({"_start": start, "_limit": chunk, **client_params}, deadline)
         if not data:
             break
-        yield data, resp.headers
+        yield data, headers
         fetched += len(data)
         start += len(data)
-        if max_records and fetched >= max_records:
-            break
 
-async def fetch_posts_paged(user_id: Optional[int], offset: int, limit: int, scan_max: int) -> Tuple[List[Dict], Dict[str,str]]:
+def _parse_total(headers) -> Optional[int]:
+    try:
+        return int(headers.get("X-Total-Count"))
+    except (TypeError, ValueError):
+        return None
+
+async def _fetch_windows(client_params: Dict, windows: List[Tuple[int, int]], concurrency: int,
+                         deadline: Optional[float] = None):
+    """
+    Fetch planned (_start, _limit) windows with at most `concurrency` in flight; yields in window order.
+    Stops after a page shorter than its window, since later windows would no longer line up.
+    """
+    async def fetch(w_start: int, w_limit: int):
+        return await get_page({"_start": w_start, "_limit": w_limit, **client_params}, deadline)
+
+    pending: "deque[Tuple[int, asyncio.Task]]" = deque()
+    it = iter(windows)
+
+    def launch_next():
+        w = next(it, None)
+        if w is not None:
+            pending.append((w[1], asyncio.create_task(fetch(*w))))
+
+    try:
+        for _ in range(concurrency):
+            launch_next()
+        while pending:
+            w_limit, task = pending.popleft()
+            data, headers = await task
+            if not data:
+                break  # upstream shrank since the first page
+            yield data, headers
+            if len(data) < w_limit:
+                break
+            launch_next()
+    finally:
+        for _, t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*(t for _, t in pending), return_exceptions=True)
+
+# -------------------- Page-block cache for /posts --------------------
+# Upstream pages of CHUNK_LIMIT rows are cached per (userId filter, page index); a slice is
+# assembled from cached blocks and only the missing ones are fetched, SCAN_CONCURRENCY at a time.
+_block_stats: Counter = Counter()   # hits / stale / misses
+
+def block_key(user_id: Optional[int], idx: int) -> str:
+    return f"block:{user_id}:{CHUNK_LIMIT}:{idx}"
+
+async def get_block(user_id: Optional[int], idx: int, use_cache: bool = True, deadline: Optional[float] = None) -> Dict:
+    """
+    {"rows": [...], "total": X-Total-Count, "end": bool} for page `idx` (CHUNK_LIMIT rows unless
+    upstream ran out, which sets "end"); concurrent misses share one fetch. An upstream that caps
+    its page size below CHUNK_LIMIT is read in several requests until the block is full.
+    """
+    key = block_key(user_id, idx)
+
+    async def compute():
+        rows, total, end = [], None, False
+        while len(rows) < CHUNK_LIMIT:
+            params = {"_start": idx * CHUNK_LIMIT + len(rows), "_limit": CHUNK_LIMIT - len(rows)}
+            if user_id is not None:
+                params["userId"] = user_id
+            page, headers = await get_page(params, deadline)
+            total = headers["X-Total-Count"] if total is None else total
+            if not page:
+                end = True
+                break
+            rows.extend(page)
+            known = _parse_total({"X-Total-Count": total})
+            if known is not None and idx * CHUNK_LIMIT + len(rows) >= known:
+                end = True   # X-Total-Count says this was the last row; skip the empty request
+                break
+        return {"rows": rows, "total": total, "end": end}
+
+    if not use_cache:
+        # fresh read requested: refetch, but keep the block for later slices
+        block = await compute()
+        await cache_set(key, block, CACHE_TTL)
+        return block
+    block, outcome = await cache_get_or_compute_outcome(key, compute, CACHE_TTL)
+    _block_stats["misses" if outcome == "coalesced" else outcome] += 1   # coalesced: fetched, just not by us
+    return block
+
+async def iter_blocks(user_id: Optional[int], first: int, last: int, use_cache: bool = True,
+                      deadline: Optional[float] = None):
+    """
+    Yield (idx, block) for pages first..last in order, with at most SCAN_CONCURRENCY fetches in flight.
+    The first block is resolved alone so its X-Total-Count keeps later fetches inside the data.
+    """
+    block = await get_block(user_id, first, use_cache, deadline)
+    yield first, block
+    total = _parse_total({"X-Total-Count": block["total"]})
+    if block["end"]:
+        return
+    if total is not None:
+        last = min(last, (total - 1) // CHUNK_LIMIT)
+
+    pending: "deque[Tuple[int, asyncio.Task]]" = deque()
+    it = iter(range(first + 1, last + 1))
+
+    def launch_next():
+        idx = next(it, None)
+        if idx is not None:
+            pending.append((idx, asyncio.ensure_future(get_block(user_id, idx, use_cache, deadline))))
+
+    try:
+        for _ in range(max(1, SCAN_CONCURRENCY)):
+            launch_next()
+        while pending:
+            idx, task = pending[0]
+            block = await task
+            pending.popleft()
+            yield idx, block
+            if block["end"]:
+                return   # end of upstream data
+            launch_next()
+    finally:
+        for _, t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*(t for _, t in pending), return_exceptions=True)
+
+def block_stats() -> Dict[str, int]:
+    return {k: _block_stats[k] for k in ("hits", "stale", "misses")}
+
+def slice_end(offset: int, limit: int, scan_max: int) -> int:
+    # scan_max caps rows read from the first page boundary, as before
+    end = offset + limit
+    return min(end, offset // CHUNK_LIMIT * CHUNK_LIMIT + scan_max) if scan_max else end
+
+async def iter_posts_slice(user_id: Optional[int], offset: int, limit: int, scan_max: int, use_cache: bool = True):
+    """
+    Yield (rows, headers) per upstream page, trimmed to [offset:offset+limit], as pages arrive.
     """
-    Fetch exactly [offset:offset+limit] by paging upstream (no blasting).
+    first = offset // CHUNK_LIMIT
+    end = slice_end(offset, limit, scan_max)
+    if end <= offset:
+        return
+    deadline = deadline_after(SCAN_DEADLINE)
+    async with aclosing(iter_blocks(user_id, first, (end - 1) // CHUNK_LIMIT, use_cache, deadline)) as blocks:
+        async for idx, block in blocks:
+            page_start = idx * CHUNK_LIMIT
+            yield block["rows"][max(0, offset - page_start):max(0, end - page_start)], {"X-Total-Count": block["total"]}
+
+async def fetch_posts_paged(user_id: Optional[int], offset: int, limit: int, scan_max: int,
+                            use_cache: bool = True) -> Tuple[List[Dict], Dict[str,str]]:
+    """
+    Fetch exactly [offset:offset+limit] from cached or freshly fetched page blocks.
     """
     collected: List[Dict] = []
     headers_out: Dict[str, str] = {}
-    target_end = offset + limit
-    page_start = (offset // CHUNK_LIMIT) * CHUNK_LIMIT
-    client_params = {"userId": user_id} if user_id is not None else {}
-
-    async for page, headers in iter_pages(client_params, page_start, CHUNK_LIMIT, scan_max or 0):
-        headers_out = headers
-        for i, item in enumerate(page):
-            idx = page_start + i
-            if offset <= idx < target_end:
-                collected.append(item)
-            if len(collected) >= limit:
-                return collected, headers_out
-        page_start += len(page)
-
+    async with aclosing(iter_posts_slice(user_id, offset, limit, scan_max, use_cache)) as pages:
+        async for rows, headers in pages:
+            headers_out = headers
+            collected.extend(rows)
     return collected, headers_out
 
+# -------------------- Pre-encoded JSON responses --------------------
+# Results are encoded (and gzipped) once when the cache is filled; hits write the stored bytes.
+def encode_result(obj) -> Encoded:
+    return Encoded.encode(obj, RESPONSE_GZIP_MIN)
+
+def compose_encoded(sections: Dict[str, Encoded], meta: Dict) -> Encoded:
+    """
+    One JSON object from already-encoded section bodies, spliced as bytes (no decode/re-encode).
+    """
+    parts = [dumps(name) + b":" + enc.body for name, enc in sections.items()]
+    parts.append(b'"meta":' + dumps(meta))
+    return Encoded.from_body(b"{" + b",".join(parts) + b"}", RESPONSE_GZIP_MIN)
+
+def encoded_response(request: Request, enc: Encoded, headers: Optional[Dict[str, str]] = None,
+                     etag: Optional[str] = None) -> Response:
+    headers = dict(headers or {})
+    body = enc.body
+    if etag:
+        headers["ETag"] = etag
+    if enc.gz is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request.headers.get("accept-encoding", "")):
+            body = enc.gz
+            headers["Content-Encoding"] = "gzip"
+            if etag:
+                headers["ETag"] = gzip_etag(etag)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# -------------------- Validators: ETag / If-None-Match --------------------
+# Analytics bodies are fixed by (corpus version, parameters), i.e. by their cache key, so their
+# tag is a hash of the key and a match is answered before any lookup or compute. /posts slices
+# come from upstream pages, so theirs hashes the body. Tags are weak where meta (timings, reuse
+# counts) can differ between renders of one key. The gzip representation gets "-gz".
+REVALIDATE = {"Cache-Control": "no-cache"}   # browsers keep the body but revalidate every use
+
+def etag_for(key: str, weak: bool = False) -> str:
+    tag = f'"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+    return "W/" + tag if weak else tag
+
+def body_etag(enc: Encoded) -> str:
+    return f'"{hashlib.blake2b(enc.body, digest_size=12).hexdigest()}"'
+
+def gzip_etag(etag: str) -> str:
+    return etag[:-1] + '-gz"'
+
+def if_none_match(request: Request, etag: str) -> Optional[str]:
+    """
+    The If-None-Match entry matching `etag` (weak comparison, either representation), or None.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) in (opaque, gzip_etag(opaque)):
+            return tag
+    return None
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag, "Vary": "Accept-Encoding"})
+
+
+# -------------------- NDJSON streaming --------------------
+NDJSON = "application/x-ndjson"
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+    return stream or NDJSON in request.headers.get("accept", "")
+
+def ndjson_line(obj) -> bytes:
+    return dumps(obj) + b"\n"
+
+def upstream_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="Upstream timeout")
+    return HTTPException(status_code=502, detail=f"Upstream error: {e}")
+
+async def stream_posts(user_id: Optional[int], offset: int, limit: int, use_cache: bool = True) -> StreamingResponse:
+    """
+    One JSON row per line as upstream pages arrive, then a {"meta": ...} line.
+    The first page is awaited up front so upstream failures still map to 502/504.
+    """
+    pages = iter_posts_slice(user_id, offset, limit, SCAN_MAX, use_cache)
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except UPSTREAM_ERRORS as e:
+        await pages.aclose()
+        raise upstream_http_error(e)
+
+    async def body():
+        source_total = None
+        async with aclosing(pages):
+            try:
+                if first is not None:
+                    rows, headers = first
+                    source_total = headers.get("X-Total-Count")
+                    for row in rows:
+                        yield ndjson_line(row)
+                    async for rows, headers in pages:
+                        source_total = headers.get("X-Total-Count")
+                        for row in rows:
+                            yield ndjson_line(row)
+            except UPSTREAM_ERRORS as e:
+                # status line is already sent; report in-band and stop
+                yield ndjson_line({"error": upstream_http_error(e).detail})
+                return
+        yield ndjson_line({"meta": {"offset": offset, "limit": limit, "userId": user_id, "source_total": source_total}})
+
+    return StreamingResponse(body(), media_type=NDJSON)
+
+def stream_cached(cached: Encoded, rows_key: Optional[str] = None) -> StreamingResponse:
+    """
+    Replay a cached result as NDJSON: one line per row of `rows_key` (if given), else one per section.
+    """
+    result = cached.data()
+
+    def body():
+        for k, v in result.items():
+            if k == rows_key:
+                for row in v:
+                    yield ndjson_line(row)
+            else:
+                yield ndjson_line({k: v})
+    return StreamingResponse(body(), media_type=NDJSON)
+
 # -------------------- /posts: Fetch and return raw data --------------------
+def posts_key(user_id: Optional[int], offset: int, limit: int) -> str:
+    return f"posts:{user_id}:{offset}:{limit}"
+
+def posts_result(data: List[Dict], user_id: Optional[int], offset: int, limit: int, total: Optional[str]) -> Encoded:
+    return encode_result({"data": data, "meta": {"offset": offset, "limit": limit, "userId": user_id, "source_total": total}})
+
+async def compute_posts(user_id: Optional[int], offset: int, limit: int, use_cache: bool = True) -> Encoded:
+    data, headers = await fetch_posts_paged(user_id, offset, limit, SCAN_MAX, use_cache)
+    return posts_result(data, user_id, offset, limit, headers.get("X-Total-Count"))
+
 @app.get("/posts")
 @rate_limit(limiter)  # uses global RATE_LIMIT if enabled; otherwise no-op
 async def get_posts(
@@ -189,193 +735,494 @@ async def get_posts(
     offset: int = Query(0,  ge=0,            description="Zero-based start index"),
     userId: Optional[int] = Query(None, ge=1, le=10,  description="Filter by userId (JSONPlaceholder has 1..10)"),
     cache: bool = Query(True, description="Enable small TTL cache for this slice"),
+    stream: bool = Query(False, description="Stream rows as NDJSON (also via Accept: application/x-ndjson)"),
 ):
-    cache_key = f"posts:{userId}:{offset}:{limit}"
-    if cache:
-        cached = await cache_get(cache_key)
+    cache_key = posts_key(userId, offset, limit)
+    if wants_ndjson(request, stream):
+        cached = await cache_get(cache_key) if cache else None
         if cached is not None:
-            return JSONResponse(content=cached)
+            return stream_cached(cached, rows_key="data")
+        return await stream_posts(userId, offset, limit, cache)
+
+    async def compute():
+        return await compute_posts(userId, offset, limit, cache)
 
     try:
-        data, headers = await fetch_posts_paged(userId, offset, limit, SCAN_MAX)
-        result = {
-            "data": data,
-            "meta": {"offset": offset, "limit": limit, "userId": userId, "source_total": headers.get("X-Total-Count")}
-        }
-        if cache:
-            await cache_set(cache_key, result, CACHE_TTL)
-        return JSONResponse(content=result, headers={"Cache-Control": f"public, max-age={CACHE_TTL}"})
-    except httpx.TimeoutException:
-        raise HTTPException(status_code=504, detail="Upstream timeout")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+        result = await cache_get_or_compute(cache_key, compute, CACHE_TTL, use_cache=cache)
+    except UPSTREAM_ERRORS as e:
+        raise upstream_http_error(e)
+    headers, etag = {"Cache-Control": f"public, max-age={CACHE_TTL}"}, body_etag(result)
+    matched = if_none_match(request, etag)
+    if matched:
+        return not_modified(matched, headers)
+    return encoded_response(request, result, headers, etag)
 
 # -------------------- /anomalies: short, duplicates, similar --------------------
 
 
-async def scan_all_titles(max_scan: int) -> List[Dict]:
+async def scan_all_titles(max_scan: int) -> Tuple[List[Dict], Optional[int]]:
     out: List[Dict] = []
-    async for page, _ in iter_pages({}, start=0, limit=CHUNK_LIMIT, max_records=max_scan):
+    total = None
+    async for page, headers in iter_pages({}, start=0, limit=CHUNK_LIMIT, max_records=max_scan):
         out.extend(page)
+        total = _parse_total(headers)
+    return out, total
+
+async def get_corpus(max_scan: int) -> CorpusSnapshot:
+    """
+    Shared snapshot (scanned once, refreshed in the background); analytics slice it to max_scan.
+    Upstream failures surface as 502/504, so endpoints reading the corpus need no handling of their own.
+    """
+    with timed("corpus"):
+        try:
+            return await app.state.corpus.get(max_scan)
+        except UPSTREAM_ERRORS as e:
+            raise upstream_http_error(e)
+
+# -------------------- Incremental analytics state --------------------
+# /summary counters and the /anomalies per-user index are kept per view (max_scan) across
+# corpus versions; a refresh recomputes only the users CorpusSnapshot.delta lists.
+_incremental_stats: Counter = Counter()   # built / advanced / reused / users_recomputed
+
+def state_for(key: str, snap: CorpusSnapshot, max_scan: int, reuse: bool = True) -> Tuple[object, Optional[FrozenSet[int]]]:
+    """
+    (cached state, users to recompute to bring it to snap's view); users None = rebuild.
+    """
+    state = _state_cache.get(key) if reuse else None
+    users = snap.delta_since(state.version, state.n, max_scan) if state is not None else None
+    if users is None:
+        _incremental_stats["built"] += 1
+    elif not users and state.version == snap.version:
+        _incremental_stats["reused"] += 1
+    else:
+        _incremental_stats["advanced"] += 1
+        _incremental_stats["users_recomputed"] += len(users)
+    return state, users
+
+def keep_state(key: str, old, new):
+    if new is not old:
+        _state_cache.set(key, new, STATE_TTL, size=new.nbytes())
+
+def incremental_stats() -> Dict:
+    return {**{k: _incremental_stats[k] for k in ("built", "advanced", "reused", "users_recomputed")},
+            "states": _state_cache.stats()}
+
+# -------------------- Warm-start snapshot --------------------
+def restore_snapshot() -> Dict:
+    """
+    Load SNAPSHOT_PATH into the corpus store and the response cache; returns what happened.
+    """
+    info: Dict = {"path": SNAPSHOT_PATH, "loaded": False}
+    if not SNAPSHOT_PATH:
+        return info
+    t0 = time.perf_counter()
+    try:
+        snap, entries = load_snapshot(SNAPSHOT_PATH, UPSTREAM_URL, SNAPSHOT_MAX_AGE)
+    except FileNotFoundError:
+        info["reason"] = "missing"
+        return info
+    except (SnapshotError, OSError, ValueError, KeyError) as e:
+        info["reason"] = str(e) or type(e).__name__
+        return info
+    app.state.corpus.seed(snap)
+    for key, enc in entries.items():
+        _mem_cache.set(key, enc, CACHE_TTL)
+    seconds = time.perf_counter() - t0
+    record_stage("snapshot_load", seconds)
+    app.state.snapshot_saved = (snap.version, frozenset(entries))
+    info.update(loaded=True, version=snap.version, posts=len(snap.corpus), entries=len(entries),
+                load_seconds=round(seconds, 3), age_seconds=round(time.time() - snap.fetched_at, 1))
+    return info
+
+async def persist_snapshot() -> bool:
+    """
+    Write the current corpus + its cached analytics bodies to SNAPSHOT_PATH, unless unchanged.
+    """
+    snap = app.state.corpus.snapshot
+    if not SNAPSHOT_PATH or snap is None:
+        return False
+    # a SQLite cache already persists itself; only the in-process cache needs saving
+    entries = snapshot_entries(_mem_cache.items(), snap.version) if isinstance(_mem_cache, TTLCache) else []
+    state = (snap.version, frozenset(k for k, _ in entries))
+    if getattr(app.state, "snapshot_saved", None) == state:
+        return False
+    await asyncio.to_thread(save_snapshot, SNAPSHOT_PATH, snap, entries, UPSTREAM_URL)
+    app.state.snapshot_saved = state
+    return True
+
+async def snapshot_saver():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            await persist_snapshot()
+        except OSError:
+            pass  # disk trouble: keep serving, try again next tick
+
+async def iter_anomaly_sections(snap: CorpusSnapshot, min_title_len: int, method: str, similar_threshold: float,
+                                suspicious_threshold: int, max_scan: int,
+                                thresholds: Tuple[float, ...] = (), reuse: bool = True,
+                                cross_user: Optional[Tuple[float, int, int]] = None):
+    """
+    The /anomalies stages on the analytics executor, yielding (section, value) as each stage finishes:
+    linear stages as one job, then one similarity job per user fanned out across workers.
+    Per-user similarity graphs are cached per (version, max_scan, method), so another threshold
+    only re-groups; `thresholds` adds suspicious users for each extra threshold in one pass.
+    After a refresh, the index and graphs of users the corpus delta doesn't list are carried
+    over from the previous version (`reuse=False` recomputes everything).
+    `cross_user` = (threshold, min_size, min_users) adds cross_user_clusters: one template
+    posted from several accounts, found over the whole corpus rather than per user.
+    """
+    corpus, version = snap.view(max_scan), snap.version
+    if not len(corpus):
+        for section in empty_anomalies(method).items():
+            yield section
+        if thresholds:
+            yield "suspicious_users_by_threshold", {str(t): [] for t in thresholds}
+        if cross_user:
+            yield "cross_user_clusters", []
+        return
+    pool: AnalyticsExecutor = app.state.analytics
+    state_key = f"state:anoms:{max_scan}"
+    old, users = state_for(state_key, snap, max_scan, reuse)
+    state, short_titles, duplicate_titles, stage_seconds = await pool.run(prepare_anomalies, corpus, min_title_len,
+                                                                          version, old, users)
+    keep_state(state_key, old, state)
+    index = state.index
+    for stage, seconds in stage_seconds.items():
+        record_stage(stage, seconds, method)
+    yield "short_titles", short_titles
+    yield "duplicate_titles", duplicate_titles
+    backend_used = similarity_backend(method)
+    uids = similarity_jobs(index)
+    wanted = [similar_threshold, *thresholds]
+    floor = similarity_floor(wanted)
+    graph_key = f"graph:{version}:{max_scan}:{backend_used}"
+    graphs = _graph_cache.get(graph_key) if reuse else None
+    if graphs is None and reuse and snap.base is not None:
+        changed = snap.delta_since(snap.base, snap.base_len, max_scan)
+        prev = _graph_cache.get(f"graph:{snap.base}:{max_scan}:{backend_used}") if changed is not None else None
+        if prev:
+            graphs = {uid: g for uid, g in prev.items() if uid not in changed}
+    graphs = graphs or {}
+    with timed("similarity", backend_used):
+        outs = await pool.map(similarity_job, [(index[uid], backend_used, wanted, floor, graphs.get(uid)) for uid in uids])
+    fresh = {uid: g for uid, (_, g) in zip(uids, outs) if g is not None}
+    if fresh:
+        _graph_cache.set(graph_key, fresh, GRAPH_TTL, size=sum(g.nbytes() for g in fresh.values()))
+    suspicious_users, pair_stats = collect_suspicious(uids, [res[0] for res, _ in outs], suspicious_threshold)
+    yield "suspicious_users", suspicious_users
+    if thresholds:
+        yield "suspicious_users_by_threshold", {
+            str(t): collect_suspicious(uids, [res[k] for res, _ in outs], suspicious_threshold)[0]
+            for k, t in enumerate(thresholds, start=1)}
+    graph_info = {"edges": sum(g.edges for g in fresh.values()), "reused": bool(graphs)} if fresh else None
+    meta = anomalies_meta(method, backend_used, similar_threshold, max_scan, version, pair_stats, graph_info)
+    if cross_user:
+        with timed("cross_user"):
+            clusters, meta["cross_user"] = await pool.run(cross_user_clusters, corpus, *cross_user)
+        yield "cross_user_clusters", clusters
+    yield "meta", meta
+
+async def run_anomalies(*args) -> Dict:
+    out = {}
+    async for section, value in iter_anomaly_sections(*args):
+        out[section] = value
     return out
 
+async def stream_anomalies(cache_key: str, args: Tuple, use_cache: bool) -> StreamingResponse:
+    """
+    One {"section": value} line per stage as it finishes; the assembled result is cached at the end.
+    The first stage is awaited up front so a full queue or timeout still maps to 503/504.
+    """
+    sections = iter_anomaly_sections(*args)
+    first = await sections.__anext__()
+
+    async def body():
+        out = dict([first])
+        yield ndjson_line({first[0]: first[1]})
+        async with aclosing(sections):
+            try:
+                async for section, value in sections:
+                    out[section] = value
+                    yield ndjson_line({section: value})
+            except (AnalyticsBusy, AnalyticsTimeout) as e:
+                # status line is already sent; report in-band and stop
+                yield ndjson_line({"error": str(e)})
+                return
+        if use_cache:
+            await cache_set(cache_key, encode_result(out), CACHE_TTL)
+    return StreamingResponse(body(), media_type=NDJSON)
+
+def anomalies_key(snap: CorpusSnapshot, min_title_len: int, method: str, similar_threshold: float,
+                  suspicious_threshold: int, max_scan: int, extra: Tuple[float, ...],
+                  cross_user: Optional[Tuple[float, int, int]] = None) -> str:
+    return (f"anoms:{snap.version}:{min_title_len}:{method}:{similar_threshold}:{suspicious_threshold}:{max_scan}"
+            f":{','.join(map(str, extra))}" + (f":xu{','.join(map(str, cross_user))}" if cross_user else ""))
+
+def parse_thresholds(raw: Optional[str]) -> Tuple[float, ...]:
+    if not raw:
+        return ()
+    try:
+        values = tuple(dict.fromkeys(float(v) for v in raw.split(",") if v.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="thresholds must be comma-separated numbers")
+    if len(values) > MAX_THRESHOLDS or any(not 0.0 <= v <= 1.0 for v in values):
+        raise HTTPException(status_code=422, detail=f"thresholds: at most {MAX_THRESHOLDS} values in [0, 1]")
+    return values
+
 @app.get("/anomalies")
 @rate_limit(limiter)
 async def anomalies(
     request: Request,
     min_title_len: int = Query(15, ge=1),
-    method: Literal["exact","fuzzy","cosine","embedding"] = Query("fuzzy"),
+    method: Literal["exact","fuzzy","cosine","minhash","embedding"] = Query("fuzzy"),
     similar_threshold: float = Query(0.4, ge=0.0, le=1.0),
     suspicious_threshold: int = Query(5, ge=1),
-    max_scan: int = Query(SCAN_MAX, ge=1, description="Safety cap on total records scanned"),
-    cache: bool = Query(True)
+    max_scan: int = Query(SCAN_MAX, ge=1, le=SCAN_LIMIT, description="Safety cap on total records scanned"),
+    cache: bool = Query(True),
+    stream: bool = Query(False, description="Emit sections as NDJSON as each stage finishes"),
+    thresholds: Optional[str] = Query(None, description="Comma-separated extra similar_threshold values, "
+                                                        "answered together in suspicious_users_by_threshold"),
+    cross_user: bool = Query(False, description="Add cross_user_clusters: near-identical posts spanning users"),
+    cross_user_threshold: float = Query(0.8, ge=0.5, le=1.0, description="Min estimated Jaccard of title+body"),
+    cross_user_min_size: int = Query(3, ge=2, description="Min posts per cluster"),
+    cross_user_min_users: int = Query(3, ge=2, description="Min distinct users per cluster"),
 ):
-    cache_key = f"anoms:{min_title_len}:{method}:{similar_threshold}:{suspicious_threshold}:{max_scan}"
-    if cache:
-        cached = await cache_get(cache_key)
+    extra = parse_thresholds(thresholds)
+    xu = (cross_user_threshold, cross_user_min_size, cross_user_min_users) if cross_user else None
+    snap = await get_corpus(max_scan)
+    cache_key = anomalies_key(snap, min_title_len, method, similar_threshold, suspicious_threshold, max_scan, extra, xu)
+    args = (snap, min_title_len, method, similar_threshold, suspicious_threshold, max_scan, extra, cache, xu)
+
+    if wants_ndjson(request, stream):
+        cached = await cache_get(cache_key) if cache else None
         if cached is not None:
-            return cached
-
-    posts = await scan_all_titles(max_scan)
-    if not posts:
-        return {"short_titles": [], "duplicate_titles": [], "suspicious_users": [], "meta": {"backend": method}}
-
-    # 1 short titles
-    short_titles = [p for p in posts if len(p["title"]) < min_title_len]
-
-    # 2 duplicates by same user (normalized)
-    user_title_norms = defaultdict(list)
-    for p in posts:
-        user_title_norms[p["userId"]].append(normalize_title(p["title"]))
-
-    duplicate_titles = []
-    for uid, titles in user_title_norms.items():
-        counts = Counter(titles)
-        for nt, c in counts.items():
-            if c > 1:
-                ids = [p["id"] for p in posts if p["userId"] == uid and normalize_title(p["title"]) == nt]
-                raw_sample = next(p["title"] for p in posts if p["id"] == ids[0])
-                duplicate_titles.append({"userId": uid, "title": raw_sample, "count": c, "postIds": ids})
-
-    # 3 suspicious users via similarity grouping
-    backend_used = method
-    suspicious_users = []
-
-    for uid in sorted({p["userId"] for p in posts}):
-        items = [{"id": p["id"], "raw": p["title"], "norm": normalize_title(p["title"])} for p in posts if p["userId"] == uid]
-        if len(items) < 2:
-            continue
+            return stream_cached(cached)
+        return await stream_anomalies(cache_key, args, cache)
 
-        groups = []
-        if method == "exact":
-            c = Counter(i["norm"] for i in items)
-            for nt, n in c.items():
-                if n >= 2:
-                    ids = [i["id"] for i in items if i["norm"] == nt]
-                    raw_sample = next(i["raw"] for i in items if i["norm"] == nt)
-                    groups.append({"rep_title": raw_sample, "postIds": ids, "count": n})
-
-        elif method == "fuzzy":
-            for it in items:
-                placed = False
-                for g in groups:
-                    if fuzzy_ratio(it["norm"], normalize_title(g["rep_title"])) >= similar_threshold:
-                        g["postIds"].append(it["id"]); g["count"] += 1; placed = True; break
-                if not placed:
-                    groups.append({"rep_title": it["raw"], "postIds": [it["id"]], "count": 1})
-            groups = [g for g in groups if g["count"] >= 2]
-
-        elif method in ("cosine", "embedding"):
-            titles = [i["norm"] for i in items]
-            sim_matrix = None
-            if method == "embedding":
-                # try:
-                #     from sentence_transformers import SentenceTransformer, util
-                #     model = SentenceTransformer(os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
-                #     emb = model.encode(titles, convert_to_tensor=True, normalize_embeddings=True)
-                #     sim_matrix = util.cos_sim(emb, emb).cpu().tolist()
-                # except Exception:
-                #     backend_used = "cosine"
-
-                # this was too costly for deployment; fallback to cosine; big sad
-                backend_used = "cosine"
-            if sim_matrix is None:
-                sim_matrix = cosine_similarity_titles(titles)
-
-            n = len(items)
-            assigned = [False]*n
-            for i in range(n):
-                if assigned[i]: continue
-                group = [i]; assigned[i] = True
-                for j in range(i+1, n):
-                    if not assigned[j] and sim_matrix[i][j] >= similar_threshold:
-                        group.append(j); assigned[j] = True
-                if len(group) >= 2:
-                    groups.append({
-                        "rep_title": items[group[0]]["raw"],
-                        "postIds": [items[k]["id"] for k in group],
-                        "count": len(group)
-                    })
-
-        total_similar = sum(g["count"] for g in groups)
-        if total_similar > suspicious_threshold:
-            suspicious_users.append({
-                "userId": uid,
-                "total_similar_posts": total_similar,
-                "groups": groups
-            })
-
-    out = {
-        "short_titles": short_titles,
-        "duplicate_titles": sorted(duplicate_titles, key=lambda x: (x["userId"], -x["count"])),
-        "suspicious_users": sorted(suspicious_users, key=lambda x: -x["total_similar_posts"]),
-        "meta": {"backend": backend_used, "similar_threshold": similar_threshold, "max_scan": max_scan}
-    }
-    if cache:
-        await cache_set(cache_key, out, CACHE_TTL)
-    return out
+    # weak: meta (graph / fuzzy reuse counts) differs between recomputes of the same key
+    etag = etag_for(cache_key, weak=True)
+    matched = if_none_match(request, etag)
+    if matched:
+        return not_modified(matched, REVALIDATE)
+
+    async def compute():
+        return encode_result(await run_anomalies(*args))
+
+    enc = await cache_get_or_compute(cache_key, compute, CACHE_TTL, use_cache=cache)
+    return encoded_response(request, enc, REVALIDATE, etag)
 
 
 # -------------------- /summary: top users with unique words + global word freq --------------------
 
 
+def summary_key(snap: CorpusSnapshot, top_n_users: int, drop_stopwords: bool, max_scan: int) -> str:
+    return f"summary:{snap.version}:{top_n_users}:{drop_stopwords}:{max_scan}"
+
+async def compute_summary_section(snap: CorpusSnapshot, top_n_users: int, drop_stopwords: bool, max_scan: int,
+                                  reuse: bool = True) -> Encoded:
+    state_key = f"state:summary:{max_scan}:{drop_stopwords}"
+    old, users = state_for(state_key, snap, max_scan, reuse)
+    with timed("summary"):
+        result, state = await app.state.analytics.run(summary_job, snap.view(max_scan), top_n_users, drop_stopwords,
+                                                      max_scan, snap.version, old, users)
+    keep_state(state_key, old, state)
+    return encode_result(result)
+
 @app.get("/summary")
 @rate_limit(limiter)
 async def summary(
     request: Request,
     top_n_users: int = Query(3, ge=1, le=50),
     drop_stopwords: bool = Query(True),
-    max_scan: int = Query(SCAN_MAX, ge=1),
+    max_scan: int = Query(SCAN_MAX, ge=1, le=SCAN_LIMIT),
     cache: bool = Query(True)
 ):
-    cache_key = f"summary:{top_n_users}:{drop_stopwords}:{max_scan}"
-    if cache:
-        cached = await cache_get(cache_key)
-        if cached is not None:
-            return cached
+    snap = await get_corpus(max_scan)
+    cache_key = summary_key(snap, top_n_users, drop_stopwords, max_scan)
+    etag = etag_for(cache_key)
+    matched = if_none_match(request, etag)
+    if matched:
+        return not_modified(matched, REVALIDATE)
 
-    posts = await scan_all_titles(max_scan)
+    async def compute():
+        return await compute_summary_section(snap, top_n_users, drop_stopwords, max_scan, cache)
 
-    user_words: Dict[int, set] = defaultdict(set)
-    global_counts: Counter = Counter()
+    enc = await cache_get_or_compute(cache_key, compute, CACHE_TTL, use_cache=cache)
+    return encoded_response(request, enc, REVALIDATE, etag)
 
-    for p in posts:
-        words = tokenize(p["title"], drop_stops=drop_stopwords)
-        global_counts.update(words)
-        user_words[p["userId"]].update(words)
 
-    ranked_users = sorted(
-        [{"userId": u, "unique_word_count": len(ws)} for u, ws in user_words.items()],
-        key=lambda x: -x["unique_word_count"]
-    )[:top_n_users]
+# -------------------- /dashboard: posts + anomalies + summary in one request --------------------
+def snapshot_posts(snap: CorpusSnapshot, user_id: Optional[int], offset: int, limit: int) -> Optional[Encoded]:
+    """
+    The /posts slice cut from the corpus snapshot, or None when the snapshot may not hold all of
+    it (an incomplete scan can't say what lies past its end, or what a userId filter would match).
+    Capped at SCAN_MAX like compute_posts, since both fill the same cache key.
+    """
+    if not snap.complete:
+        return None
+    end = slice_end(offset, limit, SCAN_MAX)
+    if end <= offset:
+        return posts_result([], user_id, offset, limit, None)
+    corpus = snap.corpus
+    rows = range(len(corpus)) if user_id is None else [i for i, u in enumerate(corpus.user_ids) if u == user_id]
+    return posts_result([corpus.post(i) for i in rows[offset:end]], user_id, offset, limit, str(len(rows)))
 
-    top_words = [{"word": w, "count": c} for w, c in global_counts.most_common(20)]
+async def cached_section(key: str, compute, use_cache: bool) -> Tuple[Encoded, Dict]:
+    """
+    A section through the response cache under its single-endpoint key, plus its timing.
+    """
+    t0, computed = time.perf_counter(), False
+
+    async def run():
+        nonlocal computed
+        computed = True
+        return await compute()
+
+    enc = await cache_get_or_compute(key, run, CACHE_TTL, use_cache=use_cache)
+    return enc, {"seconds": round(time.perf_counter() - t0, 6), "cache": "miss" if computed else "hit"}
+
+@app.get("/dashboard")
+@rate_limit(limiter)
+async def dashboard(
+    request: Request,
+    # /posts
+    posts_limit: int = Query(200, ge=0, le=1000, description="/posts limit (0 = skip the section)"),
+    posts_offset: int = Query(0, ge=0, description="/posts offset"),
+    userId: Optional[int] = Query(None, ge=1, le=10, description="/posts userId filter"),
+    # /anomalies
+    min_title_len: int = Query(15, ge=1),
+    method: Literal["exact","fuzzy","cosine","minhash","embedding"] = Query("fuzzy"),
+    similar_threshold: float = Query(0.4, ge=0.0, le=1.0),
+    suspicious_threshold: int = Query(5, ge=1),
+    thresholds: Optional[str] = Query(None),
+    cross_user: bool = Query(False),
+    cross_user_threshold: float = Query(0.8, ge=0.5, le=1.0),
+    cross_user_min_size: int = Query(3, ge=2),
+    cross_user_min_users: int = Query(3, ge=2),
+    # /summary
+    top_n_users: int = Query(3, ge=1, le=50),
+    drop_stopwords: bool = Query(True),
+    # shared
+    max_scan: int = Query(SCAN_MAX, ge=1, le=SCAN_LIMIT, description="Scan cap shared by /anomalies and /summary"),
+    cache: bool = Query(True),
+):
+    """
+    The page-load bundle: every section reads one corpus snapshot (one scan, one tokenization)
+    and is cached under the same key as its own endpoint, so later single calls hit.
+    """
+    extra = parse_thresholds(thresholds)
+    xu = (cross_user_threshold, cross_user_min_size, cross_user_min_users) if cross_user else None
+    t0 = time.perf_counter()
+    snap = await get_corpus(max_scan)
+    corpus_seconds = time.perf_counter() - t0
+
+    async def posts():
+        return snapshot_posts(snap, userId, posts_offset, posts_limit) or await compute_posts(userId, posts_offset, posts_limit, cache)
+
+    async def anomalies():
+        return encode_result(await run_anomalies(snap, min_title_len, method, similar_threshold, suspicious_threshold,
+                                                 max_scan, extra, cache, xu))
+
+    async def summary():
+        return await compute_summary_section(snap, top_n_users, drop_stopwords, max_scan, cache)
+
+    jobs = {"anomalies": (anomalies_key(snap, min_title_len, method, similar_threshold, suspicious_threshold, max_scan,
+                                        extra, xu), anomalies),
+            "summary": (summary_key(snap, top_n_users, drop_stopwords, max_scan), summary)}
+    if posts_limit:
+        jobs = {"posts": (posts_key(userId, posts_offset, posts_limit), posts), **jobs}
+    # weak: meta timings differ between renders. No tag when posts may come from upstream pages
+    # rather than this snapshot, since the section keys would not pin them.
+    etag = None
+    if snap.complete or not posts_limit:
+        etag = etag_for(f"dashboard:{snap.version}:" + "|".join(key for key, _ in jobs.values()), weak=True)
+        matched = if_none_match(request, etag)
+        if matched:
+            return not_modified(matched, REVALIDATE)
+    try:
+        done = await asyncio.gather(*[cached_section(key, fn, cache) for key, fn in jobs.values()])
+    except UPSTREAM_ERRORS as e:
+        raise upstream_http_error(e)
+    sections = dict(zip(jobs, [enc for enc, _ in done]))
+    meta = {"corpus_version": snap.version, "max_scan": max_scan,
+            "timings": {"corpus": {"seconds": round(corpus_seconds, 6)}, **dict(zip(jobs, [t for _, t in done]))},
+            "total_seconds": round(time.perf_counter() - t0, 6)}
+    return encoded_response(request, compose_encoded(sections, meta), REVALIDATE if etag else None, etag)
+
+
+# -------------------- /search: inverted index over titles + bodies --------------------
+
+
+@app.get("/search")
+@rate_limit(limiter)
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500,
+                   description='Terms (all required); "OR" between alternatives; trailing * for a prefix'),
+    userId: Optional[int] = Query(None, ge=1, description="Only this user's posts"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    max_scan: int = Query(SCAN_MAX, ge=1, le=SCAN_LIMIT),
+):
+    snap = await get_corpus(max_scan)
+    with timed("search_index"):
+        index = await app.state.search.get(snap)
+    try:
+        with timed("search"):
+            # a thread, not the analytics executor: a process pool would pickle the whole index per query
+            result = await asyncio.to_thread(index.search, q, userId, offset, limit, max_scan)
+    except QueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    result["meta"] = {"q": q, "userId": userId, "offset": offset, "limit": limit, "max_scan": max_scan,
+                      "corpus_version": index.version, "stale": index.version != snap.version}
+    return encoded_response(request, encode_result(result))
+
+
+# -------------------- /metrics: Prometheus text format --------------------
+def upstream_info() -> Dict:
+    corpus = getattr(app.state, "corpus", None)
+    return {"breaker": app.state.breaker.info(), "hedging": {"delay": app.state.hedger.delay(), **app.state.hedger.stats},
+            "corpus_stale_served": corpus.stale_served if corpus is not None else 0, "pages": page_stats()}
+
+@REGISTRY.collector
+def _state_metrics():
+    cs = cache_stats()
+    yield ("cache_requests_total", "counter", "Cache lookups by result",
+           {(("result", k),): cs[k] for k in ("hits", "stale", "misses", "coalesced")})
+    yield ("posts_block_requests_total", "counter", "/posts page-block lookups by result",
+           {(("result", k),): v for k, v in block_stats().items()})
+    yield ("cache_entries", "gauge", "Entries held in the local cache", {(): cs["items"]})
+    yield ("cache_bytes", "gauge", "Estimated bytes held in the local cache", {(): cs["bytes"]})
+    yield ("cache_evictions_total", "counter", "Entries evicted by the size caps", {(): cs["evictions"]})
+    breaker = app.state.breaker
+    yield ("upstream_breaker_state", "gauge", "Upstream circuit breaker state (1 = current)",
+           {(("state", st),): int(breaker.state == st)
+            for st in (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN)})
+    yield ("upstream_breaker_transitions_total", "counter", "Times the upstream breaker opened", {(): breaker.stats["opened"]})
+    yield ("upstream_breaker_rejected_total", "counter", "Upstream calls failed fast by the breaker",
+           {(): breaker.stats["rejected"]})
+    yield ("upstream_hedges_total", "counter", "Hedged duplicate upstream requests by outcome",
+           {(("outcome", "sent"),): app.state.hedger.stats["hedged"], (("outcome", "won"),): app.state.hedger.stats["hedge_wins"]})
+    pool = getattr(app.state, "analytics", None)
+    if pool is not None:
+        info = pool.info()
+        yield ("analytics_jobs_pending", "gauge", "Analytics jobs queued or running", {(): info["pending"]})
+        yield ("analytics_jobs_total", "counter", "Analytics jobs by outcome",
+               {(("outcome", k),): info[k] for k in ("completed", "rejected", "timeouts")})
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-    out = {"top_users_by_unique_words": ranked_users, "top_words": top_words, "meta": {"max_scan": max_scan}}
-    if cache:
-        await cache_set(cache_key, out, CACHE_TTL)
-    return out
 
+# -------------------- /stats: cache + analytics counters --------------------
+@app.get("/stats")
+async def stats():
+    return {"cache": cache_stats(), "blocks": block_stats(), "graphs": _graph_cache.stats(),
+            "incremental": incremental_stats(), "search": app.state.search.info(),
+            "analytics": app.state.analytics.info(), "snapshot": app.state.snapshot_info,
+            "upstream": upstream_info()}
 
 
 # if __name__ == "__main__":
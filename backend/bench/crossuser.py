@@ -0,0 +1,32 @@
+"""
+Cross-user cluster benchmark: python -m backend.bench.crossuser [n_posts] [accounts]
+
+Plants one template (lightly edited) from `accounts` users in a synthetic corpus and prints,
+as JSON, the clustering work stats, runtime, how many planted posts were recovered and peak RSS.
+"""
+import sys, json, time, random, resource
+
+from backend.bench.synthetic import make_corpus
+from backend.corpus import CompactCorpus
+from backend.crossuser import cross_user_clusters
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    posts = make_corpus(n, users=5000)
+    rng = random.Random(1)
+    title = "limited offer claim your free cookie cutter set today"
+    body = "click the link below to claim your free set before the offer ends tonight friends"
+    planted = set()
+    for k, p in enumerate(rng.sample(posts, accounts)):
+        p["userId"], p["title"], p["body"] = 10_000 + k, title, body + ("" if k % 2 else " now")
+        planted.add(p["id"])
+    corpus = CompactCorpus.from_posts(posts)
+    del posts
+    t0 = time.perf_counter()
+    clusters, stats = cross_user_clusters(corpus)
+    seconds = time.perf_counter() - t0
+    found = max((set(c["postIds"]) & planted for c in clusters), key=len, default=set())
+    print(json.dumps({**stats, "seconds": round(seconds, 2), "planted": accounts, "recovered": len(found),
+                      "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024}, indent=2))
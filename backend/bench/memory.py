@@ -0,0 +1,46 @@
+"""
+Corpus memory report: python -m backend.bench.memory [n_posts]
+
+Builds a synthetic corpus and prints, as JSON, the bytes held by the post dicts versus the
+compact corpus columns.
+"""
+import sys, json
+from typing import Dict, List
+
+from backend.bench.synthetic import make_corpus
+from backend.corpus import CompactCorpus
+
+
+def deep_sizeof(obj) -> int:
+    """
+    Bytes reachable from obj, counting shared objects once.
+    """
+    seen, total, stack = set(), 0, [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys()); stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, CompactCorpus):
+            stack.extend(getattr(o, k) for k in CompactCorpus.__slots__)
+    return total
+
+
+def memory_report(posts: List[Dict]) -> Dict:
+    """
+    Resident size of the same posts as a list of dicts vs a CompactCorpus (incl. precomputed columns).
+    """
+    compact = CompactCorpus.from_posts(posts)
+    as_dicts, as_columns = deep_sizeof(posts), deep_sizeof(compact)
+    return {"posts": len(posts), "list_of_dicts_bytes": as_dicts, "compact_bytes": as_columns,
+            "ratio": round(as_columns / as_dicts, 3) if as_dicts else None, "vocab": len(compact.words)}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(json.dumps(memory_report(make_corpus(n, users=100)), indent=2))
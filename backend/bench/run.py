@@ -0,0 +1,159 @@
+"""
+Reproducible benchmark: python -m backend.bench.run --posts 10000 --out bench.json
+
+Serves a synthetic corpus through a local upstream stand-in, drives /posts, /anomalies
+(every method) and /summary in-process, and prints machine-readable JSON with latency
+percentiles, throughput, peak RSS and per-stage analytics timings.
+"""
+import os, sys, json, time, asyncio, argparse, platform, resource, subprocess
+from typing import Callable, Dict, List
+
+# must be set before the app module reads its config
+os.environ.setdefault("RATE_LIMIT", "off")
+
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, round(q / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[k]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+async def drive(client, path: str, n: int, concurrency: int) -> Dict:
+    """
+    n GETs of `path` with `concurrency` in flight; latency in ms.
+    """
+    latencies: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.get(path)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if r.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(n)])
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {"path": path, "requests": n, "errors": errors,
+            "p50_ms": round(percentile(latencies, 50), 2), "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2), "throughput_rps": round(n / wall, 1) if wall else None}
+
+
+def time_stage(fn: Callable, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return round((time.perf_counter() - t0) * 1000, 2)
+
+
+def stage_timings(corpus, methods: List[str], threshold: float) -> Dict:
+    """
+    Per-stage analytics cost measured directly on the corpus (ms), through the functions the
+    endpoints run: the linear /anomalies stages, each method's per-user similarity jobs, /summary.
+    """
+    from backend.analytics import prepare_anomalies, similarity_backend, similarity_job, similarity_jobs, summary_job
+    from backend.simgraph import similarity_floor
+    state, _, _, seconds = prepare_anomalies(corpus, 15)
+    out = {stage: round(s * 1000, 2) for stage, s in seconds.items()}
+    out["summary"] = time_stage(summary_job, corpus, 3, True, len(corpus), "")
+    floor = similarity_floor([threshold])
+
+    def similarity(method):
+        for uid in similarity_jobs(state.index):
+            similarity_job(state.index[uid], method, [threshold], floor)
+
+    for m in methods:
+        out[f"similarity:{m}"] = time_stage(similarity, similarity_backend(m))
+    return out
+
+
+async def run(args) -> Dict:
+    import httpx
+    from backend.api_handle import app
+    from backend.bench.synthetic import make_corpus, upstream_transport
+
+    t0 = time.perf_counter()
+    posts = make_corpus(args.posts, users=args.users, dup_rate=args.dup_rate, user_skew=args.skew, seed=args.seed)
+    gen_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    report: Dict = {
+        "commit": git_commit(), "python": platform.python_version(), "timestamp": time.time(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "generate_ms": gen_ms, "scenarios": [],
+    }
+    async with app.router.lifespan_context(app):
+        await app.state.client.aclose()
+        app.state.client = httpx.AsyncClient(transport=upstream_transport(posts), base_url="http://upstream")
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+        n = args.posts
+
+        # cold corpus ingest through the upstream stand-in
+        t0 = time.perf_counter()
+        await app.state.corpus.get(n)
+        report["ingest_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        paths = [f"/posts?limit=100&offset={n // 2}&cache=false", "/posts?limit=100&offset=0"]
+        for m in args.methods:
+            paths.append(f"/anomalies?method={m}&similar_threshold={args.threshold}&max_scan={n}&cache=false")
+            paths.append(f"/anomalies?method={m}&similar_threshold={args.threshold}&max_scan={n}")
+        paths += [f"/summary?max_scan={n}&cache=false", f"/summary?max_scan={n}"]
+        for path in paths:
+            cold = "cache=false" in path
+            reqs = args.cold_requests if cold else args.requests
+            if not cold:
+                await client.get(path)   # warm the entry so the scenario measures hits only
+            res = await drive(client, path, reqs, 1 if cold and path.startswith("/anomalies") else args.concurrency)
+            res["cached"] = not cold
+            report["scenarios"].append(res)
+        await client.aclose()
+
+        report["stages_ms"] = stage_timings(app.state.corpus.snapshot.view(n), args.methods, args.threshold)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--posts", type=int, default=10_000)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--dup-rate", type=float, default=0.1)
+    ap.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for posts per user")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--methods", nargs="+", default=["exact", "fuzzy", "cosine", "minhash"])
+    ap.add_argument("--threshold", type=float, default=0.4)
+    ap.add_argument("--requests", type=int, default=200, help="requests per cached scenario")
+    ap.add_argument("--cold-requests", type=int, default=5, help="requests per uncached scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
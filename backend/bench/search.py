@@ -0,0 +1,25 @@
+"""
+Search index benchmark: python -m backend.bench.search [n_posts]
+
+Builds the inverted index over a synthetic corpus and prints, as JSON, the build time,
+index size and per-query latency for term, AND, OR and prefix queries.
+"""
+import sys, json, time
+
+from backend.bench.synthetic import make_corpus
+from backend.corpus import CorpusSnapshot
+from backend.search import SearchIndex
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    snap = CorpusSnapshot(make_corpus(n), n)
+    t0 = time.perf_counter()
+    index = SearchIndex.build(snap.corpus, snap.version)
+    report = {"posts": n, "build_s": round(time.perf_counter() - t0, 2), **index.info(), "query_ms": {}}
+    for q in ("verbum12", "verbum12 verbum7", "verbum12 OR verbum7", "verbum1*", "verbum4* verbum9"):
+        t0 = time.perf_counter()
+        for _ in range(20):
+            total = index.search(q, limit=20)["total"]
+        report["query_ms"][q] = {"total": total, "ms": round((time.perf_counter() - t0) / 20 * 1000, 2)}
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,31 @@
+"""
+Snapshot benchmark: python -m backend.bench.snapshot [n_posts]
+
+Builds a synthetic corpus, saves it with backend.persist and loads it back, printing as JSON
+the file size and the build, save and cold-start load times.
+"""
+import os, sys, json, time, tempfile
+
+from backend.bench.synthetic import make_corpus
+from backend.corpus import CorpusSnapshot
+from backend.persist import save_snapshot, load_snapshot
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    posts = make_corpus(n)
+    t0 = time.perf_counter()
+    snap = CorpusSnapshot(posts, n)
+    build_s = time.perf_counter() - t0
+    del posts
+    path = os.path.join(tempfile.mkdtemp(), "corpus.snap")
+    t0 = time.perf_counter()
+    size = save_snapshot(path, snap, [], "bench")
+    save_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    loaded, _ = load_snapshot(path, "bench")
+    load_s = time.perf_counter() - t0
+    assert loaded.version == snap.version and len(loaded.corpus) == n
+    os.remove(path)
+    print(json.dumps({"posts": n, "file_mb": round(size / 2**20, 1), "build_from_posts_s": round(build_s, 2),
+                      "save_s": round(save_s, 2), "load_s": round(load_s, 2)}, indent=2))
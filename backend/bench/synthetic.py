@@ -0,0 +1,55 @@
+import json, random
+from typing import Dict, List
+
+import httpx
+
+from backend.utils import STOPWORDS
+
+
+# -------------------- Synthetic corpus --------------------
+def make_corpus(n: int, users: int = 10, dup_rate: float = 0.1, user_skew: float = 1.0,
+                vocab: int = 5000, seed: int = 0) -> List[Dict]:
+    """
+    JSONPlaceholder-shaped posts (userId, id, title, body).
+    - dup_rate: share of posts re-using an earlier title of the same user (exact or lightly edited)
+    - user_skew: Zipf exponent for posts per user (0 = uniform)
+    """
+    rng = random.Random(seed)
+    words = sorted(STOPWORDS) + [f"verbum{i}" for i in range(vocab)]
+    weights = [1.0 / (u ** user_skew) for u in range(1, users + 1)]
+    user_ids = rng.choices(range(1, users + 1), weights=weights, k=n)
+    by_user: Dict[int, List[str]] = {}
+    posts = []
+    for i, uid in enumerate(user_ids):
+        seen = by_user.setdefault(uid, [])
+        if seen and rng.random() < dup_rate:
+            title = rng.choice(seen)
+            if rng.random() < 0.5:
+                title = title + " " + rng.choice(words)   # near-duplicate
+        else:
+            title = " ".join(rng.choice(words) for _ in range(rng.randint(2, 8)))
+            seen.append(title)
+        body = "\n".join(" ".join(rng.choice(words) for _ in range(8)) for _ in range(4))
+        posts.append({"userId": uid, "id": i + 1, "title": title, "body": body})
+    return posts
+
+
+# -------------------- Local upstream stand-in --------------------
+def upstream_transport(posts: List[Dict]) -> httpx.MockTransport:
+    """
+    Serves posts like JSONPlaceholder /posts: honors _start, _limit, userId and sets X-Total-Count.
+    """
+    by_user: Dict[int, List[Dict]] = {}
+    for p in posts:
+        by_user.setdefault(p["userId"], []).append(p)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        q = request.url.params
+        rows = by_user.get(int(q["userId"]), []) if "userId" in q else posts
+        start = int(q.get("_start", 0))
+        limit = int(q["_limit"]) if "_limit" in q else len(rows)
+        body = json.dumps(rows[start:start + limit]).encode()
+        return httpx.Response(200, content=body, headers={"Content-Type": "application/json",
+                                                         "X-Total-Count": str(len(rows))})
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,254 @@
+import sys, json, time, heapq, sqlite3, threading
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+
+from backend.encoding import Encoded
+
+
+# -------------------- Size estimate --------------------
+def estimate_size(value: Any) -> int:
+    """
+    Cheap recursive byte estimate for JSON-like values (dict/list/str/bytes/numbers).
+    """
+    total, stack = 0, [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, (str, bytes, bytearray)):
+            total += sys.getsizeof(v)
+        elif isinstance(v, dict):
+            total += sys.getsizeof(v)
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(v)
+            stack.extend(v)
+        else:
+            total += sys.getsizeof(v, 32)
+    return total
+
+
+# -------------------- TTL + LRU cache --------------------
+class _Entry:
+    __slots__ = ("val", "exp", "size", "seq")
+
+    def __init__(self, val, exp: float, size: int, seq: int):
+        self.val, self.exp, self.size, self.seq = val, exp, size, seq
+
+
+class TTLCache:
+    """
+    TTL + LRU cache.
+    - expiry is indexed by a min-heap of (drop_at, seq, key); stale heap rows are skipped lazily
+      and the heap is compacted when it outgrows the live entries (amortized O(log n) per write)
+    - capacity is bounded by entry count AND an estimated byte budget, evicting LRU first
+    - entries stay readable as "stale" for `stale_ttl` seconds past expiry (stale-while-revalidate)
+    """
+
+    blocking = False   # in-memory: safe to call on the event loop
+
+    def __init__(self, max_items: int, max_bytes: int = 0, stale_ttl: float = 0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self.bytes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key: str, now: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Returns (value, fresh). value is None on a miss; fresh is False inside the stale window.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None, False
+        now = time.time() if now is None else now
+        if entry.exp + self.stale_ttl < now:
+            self._remove(key)
+            return None, False
+        # mark as recently used
+        self._data.move_to_end(key, last=True)
+        return entry.val, entry.exp >= now
+
+    def get(self, key: str, now: Optional[float] = None):
+        val, fresh = self.lookup(key, now)
+        return val if fresh else None
+
+    def set(self, key: str, value, ttl: float, now: Optional[float] = None, size: Optional[int] = None):
+        now = time.time() if now is None else now
+        if key in self._data:
+            self._remove(key)
+        self._seq += 1
+        entry = _Entry(value, now + ttl, estimate_size(value) if size is None else size, self._seq)
+        self._data[key] = entry
+        self.bytes += entry.size
+        heapq.heappush(self._heap, (entry.exp + self.stale_ttl, entry.seq, key))
+        self._purge(now)
+        # hard caps (LRU): entry count, then byte budget; always keep the newest entry
+        while len(self._data) > self.max_items or (self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1):
+            old_key = next(iter(self._data))
+            self._remove(old_key)
+            self.evictions += 1
+
+    def items(self, now: Optional[float] = None) -> List[Tuple[str, Any]]:
+        """
+        (key, value) of entries still servable (fresh or stale), least recently used first.
+        """
+        now = time.time() if now is None else now
+        return [(k, e.val) for k, e in self._data.items() if e.exp + self.stale_ttl >= now]
+
+    def pop(self, key: str):
+        if key in self._data:
+            self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self._heap.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key)
+        self.bytes -= entry.size
+
+    def _purge(self, now: float):
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            _, seq, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry.seq == seq:
+                self._remove(key)
+        # drop rows for overwritten/evicted keys once they dominate the heap
+        if len(heap) > 2 * len(self._data) + 64:
+            self._heap = [(e.exp + self.stale_ttl, e.seq, k) for k, e in self._data.items()]
+            heapq.heapify(self._heap)
+
+    def stats(self) -> Dict[str, int]:
+        return {"items": len(self._data), "bytes": self.bytes, "evictions": self.evictions}
+
+
+# -------------------- Cross-process cache (SQLite WAL) --------------------
+class SQLiteCache:
+    """
+    TTLCache semantics (TTL, stale window, LRU entry + byte caps) over a SQLite file in WAL mode,
+    so every uvicorn worker on the host shares one cache without an external service.
+    - values are stored serialized (JSON, raw bytes or Encoded bodies as-is); size is the serialized length
+    - LRU order is a global `used` sequence; reads never write: hits are remembered per process
+      and their `used` bumped in the next set()'s transaction
+    - calls block on SQLite (`blocking = True`): async callers run them in a thread
+    - evictions are counted per process
+    """
+    blocking = True
+
+    def __init__(self, path: str, max_items: int, max_bytes: int = 0, stale_ttl: float = 0):
+        self.path = path
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, None] = {}   # keys hit since the last set(), in hit order
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, val BLOB NOT NULL, "
+                         "raw INTEGER NOT NULL, exp REAL NOT NULL, size INTEGER NOT NULL, used INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_exp ON entries (exp)")
+
+    # raw: 0 = JSON, 1 = bytes, 2 = pre-encoded response body
+    @staticmethod
+    def _dump(value) -> Tuple[bytes, int]:
+        if isinstance(value, Encoded):
+            return value.to_bytes(), 2
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value), 1
+        return json.dumps(value, separators=(",", ":")).encode(), 0
+
+    @staticmethod
+    def _load(blob: bytes, raw: int):
+        if raw == 2:
+            return Encoded.from_bytes(blob)
+        return blob if raw else json.loads(blob)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def lookup(self, key: str, now: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Returns (value, fresh). value is None on a miss; fresh is False inside the stale window.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute("SELECT val, raw, exp FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None, False
+            blob, raw, exp = row
+            if exp + self.stale_ttl < now:
+                return None, False   # purged by the next set()
+            # mark as recently used (flushed by the next set)
+            self._touched.pop(key, None)
+            self._touched[key] = None
+        return self._load(blob, raw), exp >= now
+
+    def get(self, key: str, now: Optional[float] = None):
+        val, fresh = self.lookup(key, now)
+        return val if fresh else None
+
+    def set(self, key: str, value, ttl: float, now: Optional[float] = None, size: Optional[int] = None):
+        now = time.time() if now is None else now
+        blob, raw = self._dump(value)
+        size = len(blob) if size is None else size
+        with self._lock:
+            db = self._db
+            touched, self._touched = list(self._touched), {}
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                base = db.execute("SELECT COALESCE(MAX(used), 0) FROM entries").fetchone()[0]
+                db.executemany("UPDATE entries SET used = ? WHERE key = ?",
+                               [(base + 1 + i, k) for i, k in enumerate(touched)])
+                db.execute("INSERT OR REPLACE INTO entries (key, val, raw, exp, size, used) VALUES (?, ?, ?, ?, ?, ?)",
+                           (key, blob, raw, now + ttl, size, base + 1 + len(touched)))
+                db.execute("DELETE FROM entries WHERE exp < ?", (now - self.stale_ttl,))
+                # hard caps (LRU): entry count, then byte budget; always keep the newest entry.
+                # One DELETE drops the least recently used rows until both caps hold.
+                n, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+                extra_n = n - self.max_items
+                extra_bytes = total - self.max_bytes if self.max_bytes else 0
+                if extra_n > 0 or extra_bytes > 0:
+                    cur = db.execute(
+                        "DELETE FROM entries WHERE key IN (SELECT key FROM ("
+                        "  SELECT key, size, ROW_NUMBER() OVER w AS rn, SUM(size) OVER w AS cum"
+                        "  FROM entries WHERE key != ? WINDOW w AS (ORDER BY used ROWS UNBOUNDED PRECEDING))"
+                        " WHERE rn <= ? OR cum - size < ?)", (key, extra_n, extra_bytes))
+                    self.evictions += cur.rowcount
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def pop(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"items": n, "bytes": total, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,376 @@
+import time, array, asyncio, hashlib
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from backend.utils import normalize_title, tokenize, STOPWORDS
+
+
+# -------------------- Corpus snapshot --------------------
+def corpus_version(posts: List[Dict]) -> str:
+    """
+    Content hash of the scanned posts; only changes when the upstream data does.
+    """
+    h = hashlib.sha1()
+    for p in posts:
+        h.update(f"{p.get('id')}\x1f{p.get('userId')}\x1f{p.get('title')}\x1f{p.get('body')}\x1e".encode())
+    return h.hexdigest()[:16]
+
+
+# -------------------- Compact column store --------------------
+class CompactCorpus:
+    """
+    Posts as parallel columns instead of a list of upstream dicts:
+    - ids / userIds in int64 arrays
+    - titles interned (identical titles share one string); normalized titles precomputed,
+      reusing the title object when normalization is a no-op
+    - token ids of every title in one flat array over a shared vocabulary (+ offsets)
+    - bodies, which analytics never read, as one UTF-8 blob (+ offsets)
+    Posts are stored as (userId, id, title, body); post(i) rebuilds the upstream dict.
+    """
+    __slots__ = ("ids", "user_ids", "titles", "norms", "tok_flat", "tok_off", "body_blob", "body_off",
+                 "vocab", "words", "stop")
+
+    def __init__(self):
+        self.ids = array.array("q")
+        self.user_ids = array.array("q")
+        self.titles: List[str] = []
+        self.norms: List[str] = []
+        self.tok_flat = array.array("I")              # token ids of tokenize(title, drop_stops=False)
+        self.tok_off = array.array("q", [0])
+        self.body_blob = bytearray()
+        self.body_off = array.array("q", [0])
+        self.vocab: Dict[str, int] = {}               # word -> token id
+        self.words: List[str] = []                    # token id -> word
+        self.stop = bytearray()                       # token id -> 1 if STOPWORDS
+
+    @classmethod
+    def from_posts(cls, posts: List[Dict], prev: Optional["CompactCorpus"] = None) -> "CompactCorpus":
+        """
+        Build from upstream dicts. Normalization/tokenization is memoized per distinct title,
+        seeded from `prev` (the previous snapshot) so unchanged titles are not re-processed.
+        """
+        c = cls()
+        memo: Dict[str, tuple] = {}
+        if prev is not None:
+            c.vocab, c.words, c.stop = dict(prev.vocab), list(prev.words), bytearray(prev.stop)
+            for i, t in enumerate(prev.titles):
+                memo[t] = (t, prev.norms[i], prev.token_ids(i))
+        for p in posts:
+            title = p["title"]
+            hit = memo.get(title)
+            if hit is None:
+                norm = normalize_title(title)
+                hit = memo[title] = (title, title if norm == title else norm, c._token_ids(title))
+            c.ids.append(p["id"])
+            c.user_ids.append(p["userId"])
+            c.titles.append(hit[0])
+            c.norms.append(hit[1])
+            c.tok_flat.extend(hit[2])
+            c.tok_off.append(len(c.tok_flat))
+            c.body_blob += (p.get("body") or "").encode()
+            c.body_off.append(len(c.body_blob))
+        return c
+
+    def _token_ids(self, text: str) -> array.array:
+        out = array.array("I")
+        for w in tokenize(text, drop_stops=False):
+            tid = self.vocab.get(w)
+            if tid is None:
+                tid = self.vocab[w] = len(self.words)
+                self.words.append(w)
+                self.stop.append(w in STOPWORDS)
+            out.append(tid)
+        return out
+
+    def __len__(self):
+        return len(self.ids)
+
+    def token_ids(self, i: int) -> array.array:
+        return self.tok_flat[self.tok_off[i]:self.tok_off[i + 1]]
+
+    def body(self, i: int) -> str:
+        return self.body_blob[self.body_off[i]:self.body_off[i + 1]].decode()
+
+    def head(self, n: int) -> "CompactCorpus":
+        """
+        First n posts; shares title strings and the vocabulary.
+        """
+        if n >= len(self):
+            return self
+        c = CompactCorpus()
+        c.ids, c.user_ids, c.titles, c.norms = self.ids[:n], self.user_ids[:n], self.titles[:n], self.norms[:n]
+        c.tok_off, c.tok_flat = self.tok_off[:n + 1], self.tok_flat[:self.tok_off[n]]
+        c.body_off, c.body_blob = self.body_off[:n + 1], self.body_blob[:self.body_off[n]]
+        c.vocab, c.words, c.stop = self.vocab, self.words, self.stop
+        return c
+
+    def post(self, i: int) -> Dict:
+        return {"userId": self.user_ids[i], "id": self.ids[i], "title": self.titles[i], "body": self.body(i)}
+
+    def posts(self) -> Iterator[Dict]:
+        return (self.post(i) for i in range(len(self)))
+
+    # ---- flat sections for on-disk snapshots (see backend/persist.py) ----
+    def to_sections(self) -> Dict[str, bytes]:
+        same = bytearray(n is t for t, n in zip(self.titles, self.norms))
+        titles, title_off = _pack_strs(self.titles)
+        norms, norm_off = _pack_strs(n for n, s in zip(self.norms, same) if not s)
+        words, word_off = _pack_strs(self.words)
+        return {"ids": self.ids.tobytes(), "user_ids": self.user_ids.tobytes(),
+                "titles": titles, "title_off": title_off.tobytes(),
+                "norm_same": bytes(same), "norms": norms, "norm_off": norm_off.tobytes(),
+                "tok_flat": self.tok_flat.tobytes(), "tok_off": self.tok_off.tobytes(),
+                "body_blob": bytes(self.body_blob), "body_off": self.body_off.tobytes(),
+                "words": words, "word_off": word_off.tobytes(), "stop": bytes(self.stop)}
+
+    @classmethod
+    def from_sections(cls, sec: Dict[str, bytes]) -> "CompactCorpus":
+        """
+        Inverse of to_sections: arrays are copied back as-is, titles re-interned, nothing re-tokenized.
+        """
+        c = cls()
+        for name in ("ids", "user_ids", "tok_flat", "tok_off", "body_off"):
+            col = array.array(getattr(c, name).typecode)
+            col.frombytes(sec[name])
+            setattr(c, name, col)
+        memo: Dict[str, str] = {}
+        c.titles = [memo.setdefault(t, t) for t in _unpack_strs(sec["titles"], sec["title_off"])]
+        other = iter(_unpack_strs(sec["norms"], sec["norm_off"]))
+        c.norms = [t if s else next(other) for t, s in zip(c.titles, sec["norm_same"])]
+        c.body_blob = bytearray(sec["body_blob"])
+        c.words = _unpack_strs(sec["words"], sec["word_off"])
+        c.vocab = {w: i for i, w in enumerate(c.words)}
+        c.stop = bytearray(sec["stop"])
+        return c
+
+
+def _pack_strs(strs: Iterable[str]) -> Tuple[bytes, array.array]:
+    # one UTF-8 blob + character offsets (decode once, slice per string)
+    strs = list(strs)
+    off = array.array("q", [0])
+    total = 0
+    for x in strs:
+        total += len(x)
+        off.append(total)
+    return "".join(strs).encode(), off
+
+
+def _unpack_strs(blob: bytes, off_bytes: bytes) -> List[str]:
+    off = array.array("q")
+    off.frombytes(off_bytes)
+    text = blob.decode()
+    return [text[off[i]:off[i + 1]] for i in range(len(off) - 1)]
+
+
+def changed_users(prev: CompactCorpus, cur: CompactCorpus) -> FrozenSet[int]:
+    """
+    Users with a post added, removed, changed (title or owner) or reordered between two corpora,
+    matched by post id. Titles interned from `prev` compare by identity first, so unchanged
+    posts cost one dict lookup; analytics only read ids, owners and titles, so bodies are ignored.
+    """
+    where = dict(zip(prev.ids, range(len(prev))))
+    users = set()
+    last: Dict[int, int] = {}   # userId -> prev row of its previous post (per-user order must hold)
+    p_uids, p_titles = prev.user_ids, prev.titles
+    for pid, uid, title in zip(cur.ids, cur.user_ids, cur.titles):
+        j = where.pop(pid, None)
+        if j is None:
+            users.add(uid)
+            continue
+        if p_uids[j] != uid:
+            users.add(uid); users.add(p_uids[j])
+        elif (p_titles[j] is not title and p_titles[j] != title) or j < last.get(uid, -1):
+            users.add(uid)
+        last[uid] = j
+    users.update(p_uids[j] for j in where.values())   # removed posts
+    return frozenset(users)
+
+
+# -------------------- Corpus snapshot --------------------
+class CorpusSnapshot:
+    """
+    One scan of upstream, with the X-Total-Count upstream reported for it (`total`, None if
+    unknown). When built from a previous snapshot it also records which users changed (`delta`)
+    so per-user analytics state can be advanced instead of rebuilt.
+    """
+    __slots__ = ("corpus", "version", "scan_max", "total", "fetched_at", "base", "base_len", "delta")
+
+    def __init__(self, posts: List[Dict], scan_max: int, fetched_at: Optional[float] = None,
+                 prev: Optional["CorpusSnapshot"] = None, total: Optional[int] = None):
+        self.version = corpus_version(posts)
+        self.corpus = CompactCorpus.from_posts(posts, prev.corpus if prev is not None else None)
+        self.scan_max = scan_max
+        self.total = total
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.base = self.base_len = self.delta = None
+        if prev is not None:
+            # token ids are stable across the two (the vocabulary was seeded from prev)
+            self.base, self.base_len = prev.version, len(prev.corpus)
+            self.delta = frozenset() if prev.version == self.version else changed_users(prev.corpus, self.corpus)
+
+    @property
+    def complete(self) -> bool:
+        # upstream ran out before the cap, or said it holds no more than we scanned
+        n = len(self.corpus)
+        return n < self.scan_max or (self.total is not None and n >= self.total)
+
+    def covers(self, max_scan: int) -> bool:
+        return self.complete or max_scan <= self.scan_max
+
+    def view(self, max_scan: int) -> CompactCorpus:
+        return self.corpus.head(max_scan)
+
+    def delta_since(self, version: str, n: int, max_scan: int) -> Optional[FrozenSet[int]]:
+        """
+        Users whose posts differ between an `n`-post view of corpus `version` and view(max_scan):
+        empty for the same view; None when the delta can't tell (unrelated version, or a partial
+        view, where a shifted window changes users the delta does not list).
+        """
+        size = min(max_scan, len(self.corpus))
+        if version == self.version:
+            return frozenset() if n == size else None
+        if self.delta is None or version != self.base or n != self.base_len or size != len(self.corpus):
+            return None
+        return self.delta
+
+    @classmethod
+    def restore(cls, corpus: CompactCorpus, version: str, scan_max: int, fetched_at: float,
+                total: Optional[int] = None) -> "CorpusSnapshot":
+        """
+        Rebuild from persisted columns (no re-hash, no re-tokenize).
+        """
+        snap = cls.__new__(cls)
+        snap.corpus, snap.version, snap.scan_max, snap.fetched_at = corpus, version, scan_max, fetched_at
+        snap.total = total
+        snap.base = snap.base_len = snap.delta = None
+        return snap
+
+
+class CorpusStore:
+    """
+    Ingests posts once and hands the same versioned snapshot to every analytics endpoint.
+    `loader(n)` returns the first n posts and upstream's X-Total-Count (None if not sent).
+    A background task re-scans every `refresh_interval` seconds at the configured scan_max.
+    A request needing more records than that is served by a one-off larger scan, done outside
+    the lock and shared by concurrent requests for the same size; it is installed as the
+    current snapshot unless a newer one landed meanwhile, and later refreshes go back to scan_max.
+    """
+
+    def __init__(self, loader: Callable[[int], Awaitable[Tuple[List[Dict], Optional[int]]]], scan_max: int,
+                 refresh_interval: float):
+        self._loader = loader
+        self._scan_max = scan_max
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[CorpusSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._oversize: Dict[int, asyncio.Task] = {}   # max_scan -> in-flight one-off scan
+        self.refreshes = 0
+        self.stale_served = 0
+        self._restored: Optional[CorpusSnapshot] = None
+
+    @property
+    def snapshot(self) -> Optional[CorpusSnapshot]:
+        return self._snapshot
+
+    def _fresh(self, snap: Optional[CorpusSnapshot], max_scan: int) -> bool:
+        if snap is None or not snap.covers(max_scan):
+            return False
+        if snap is self._restored:
+            return True   # served as-is until the first background refresh replaces it
+        if self.refresh_interval > 0 and time.time() - snap.fetched_at > 2 * self.refresh_interval:
+            return False  # background refresher is behind; don't serve arbitrarily old data
+        return True
+
+    async def get(self, max_scan: int) -> CorpusSnapshot:
+        snap = self._snapshot
+        if self._fresh(snap, max_scan):
+            return snap
+        if max_scan > self._scan_max:
+            return await self._oversized(max_scan)
+        async with self._lock:
+            snap = self._snapshot
+            if self._fresh(snap, max_scan):  # someone else refreshed while we waited
+                return snap
+            try:
+                return await self._refresh_locked(self._scan_max)
+            except Exception:
+                if snap is not None and snap.covers(max_scan):
+                    self.stale_served += 1
+                    return snap  # upstream failing (or breaker open): an old snapshot beats an error
+                raise
+
+    async def _oversized(self, max_scan: int) -> CorpusSnapshot:
+        # one scan per size; concurrent callers await the same task (its result or its exception)
+        task = self._oversize.get(max_scan)
+        if task is None:
+            task = self._oversize[max_scan] = asyncio.create_task(self._scan_oversized(max_scan))
+            task.add_done_callback(lambda _: self._oversize.pop(max_scan, None))
+        # shield: one caller disconnecting must not cancel the scan for the others
+        return await asyncio.shield(task)
+
+    async def _scan_oversized(self, max_scan: int) -> CorpusSnapshot:
+        # scanned without the lock so regular requests and refreshes never wait on it
+        started = time.time()
+        posts, total = await self._loader(max_scan)
+        async with self._lock:
+            cur = self._snapshot
+            if cur is not None and cur.fetched_at > started:
+                # a newer scan landed while this one ran: answer from it (or from this scan),
+                # but never roll the current snapshot back to older data
+                return cur if cur.covers(max_scan) else CorpusSnapshot(posts, max_scan, total=total)
+            snap = CorpusSnapshot(posts, max_scan, prev=cur, total=total)
+            self._install(snap)
+        return snap
+
+    async def refresh(self) -> CorpusSnapshot:
+        async with self._lock:
+            return await self._refresh_locked(self._scan_max)
+
+    async def _refresh_locked(self, scan_max: int) -> CorpusSnapshot:
+        posts, total = await self._loader(scan_max)
+        snap = CorpusSnapshot(posts, scan_max, prev=self._snapshot, total=total)
+        self._install(snap)
+        return snap
+
+    def _install(self, snap: CorpusSnapshot):
+        self._snapshot = snap
+        self._restored = None
+        self.refreshes += 1
+
+    def seed(self, snap: CorpusSnapshot):
+        """
+        Install a snapshot loaded from disk; it is served immediately and start() refreshes it
+        in the background right away instead of waiting a full interval.
+        """
+        self._snapshot = self._restored = snap
+
+    # ---- background refresh ----
+    async def _run(self):
+        if self._restored is not None:
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # keep serving the restored snapshot; retry next tick
+        if self.refresh_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if self._snapshot is None:
+                continue  # nothing ingested yet; first request will load it
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # keep serving the previous snapshot; retry next tick
+
+    def start(self):
+        if (self.refresh_interval > 0 or self._restored is not None) and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,120 @@
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backend.utils import MINHASH_PERM, MINHASH_BANDS, minhash_signatures, _word_re, _MH_A
+from backend.corpus import CompactCorpus
+
+CROSS_USER_MEMORY = int(os.getenv("CROSS_USER_MEMORY", str(128 * 1024 * 1024)))  # bytes for signatures + band scratch
+SIGNATURE_CHUNK = 8192                                                             # posts shingled/signed per step
+MIN_PERM = 16                                                                      # below this LSH recall collapses
+
+
+# -------------------- Cross-user "cookie cutter" clusters --------------------
+# Per-user grouping can't see one template posted from many accounts. Here every post (title +
+# body) gets a MinHash signature over word-bigram shingles; LSH bands over the whole corpus
+# propose candidate pairs, so only posts sharing a band are ever compared. Candidates are
+# verified by signature agreement (estimated Jaccard) against their bucket's first post and
+# joined with union-find; clusters must reach a size and a distinct-user count.
+def _shingles(title_ids, body_ids) -> set:
+    # word bigrams within the title and within the body; a lone word stands for itself
+    out = set()
+    for toks in (title_ids, body_ids):
+        if len(toks) == 1:
+            out.add(toks[0])
+        out.update(((a + 1) << 32) | b for a, b in zip(toks, toks[1:]))
+    return out
+
+
+def signature_perm(n: int, memory_bytes: int, rows: int) -> int:
+    """
+    Signature length that keeps n uint32 signatures plus per-band scratch (~40 bytes/post)
+    inside memory_bytes: MINHASH_PERM when it fits, else fewer whole bands; 0 if not even MIN_PERM fits.
+    """
+    if not n:
+        return MINHASH_PERM
+    perm = min(MINHASH_PERM, (memory_bytes // n - 40) // 4) // rows * rows
+    return perm if perm >= MIN_PERM else 0
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cross_user_clusters(corpus: CompactCorpus, threshold: float = 0.8, min_size: int = 3, min_users: int = 3,
+                        memory_bytes: int = CROSS_USER_MEMORY) -> Tuple[List[Dict], Dict]:
+    """
+    Clusters of near-identical posts (estimated Jaccard >= threshold on title + body shingles)
+    with at least min_size posts from at least min_users distinct users, plus work stats.
+    """
+    n = len(corpus)
+    rows = max(1, MINHASH_PERM // MINHASH_BANDS)
+    perm = signature_perm(n, memory_bytes, rows)
+    stats = {"posts": n, "num_perm": perm, "memory_budget": memory_bytes, "candidate_pairs": 0, "verified_pairs": 0}
+    if not perm:
+        stats["skipped"] = "memory budget too small for this corpus"
+        return [], stats
+    if n < 2:
+        return [], stats
+
+    # signatures a chunk at a time (shingle sets never exist for the whole corpus at once)
+    vocab = dict(corpus.vocab)
+    findall = _word_re.findall
+    sig = np.empty((n, perm), dtype=np.uint32)
+    empty = np.zeros(n, dtype=bool)
+    for start in range(0, n, SIGNATURE_CHUNK):
+        sets = []
+        for i in range(start, min(n, start + SIGNATURE_CHUNK)):
+            body_ids = [vocab.setdefault(w, len(vocab)) for w in findall(corpus.body(i).lower())]
+            sets.append(_shingles(corpus.token_ids(i).tolist(), body_ids))
+        sig[start:start + len(sets)] = minhash_signatures(sets, perm)   # values < 2**31
+        empty[start:start + len(sets)] = [not s for s in sets]
+    del sets, vocab
+
+    # LSH: posts sharing a band key are candidates; each is verified against the bucket's first post
+    live = np.flatnonzero(~empty)
+    edges = []
+    for band in range(perm // rows):
+        keys = (sig[live, band * rows:(band + 1) * rows].astype(np.uint64) * _MH_A[-rows:]).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sk = keys[order]
+        starts = np.flatnonzero(np.concatenate(([True], sk[1:] != sk[:-1])))
+        sizes = np.diff(np.append(starts, len(sk)))
+        first = np.repeat(starts, sizes)                         # bucket start for every sorted slot
+        pos = np.flatnonzero(np.arange(len(sk)) != first)       # every non-first member
+        if not len(pos):
+            continue
+        a, b = live[order[first[pos]]], live[order[pos]]
+        stats["candidate_pairs"] += len(pos)
+        for lo in range(0, len(a), SIGNATURE_CHUNK):
+            ca, cb = a[lo:lo + SIGNATURE_CHUNK], b[lo:lo + SIGNATURE_CHUNK]
+            ok = (sig[ca] == sig[cb]).mean(axis=1) >= threshold
+            edges.append(np.stack([ca[ok], cb[ok]], axis=1))
+    del sig
+    if not edges:
+        return [], stats
+    pairs = np.unique(np.concatenate(edges), axis=0)
+    stats["verified_pairs"] = len(pairs)
+
+    parent = list(range(n))
+    for i, j in pairs.tolist():
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    members: Dict[int, List[int]] = {}
+    for i in np.unique(pairs).tolist():
+        members.setdefault(_find(parent, i), []).append(i)
+
+    clusters = []
+    for rows_ in members.values():
+        users = sorted(set(corpus.user_ids[i] for i in rows_))
+        if len(rows_) >= min_size and len(users) >= min_users:
+            clusters.append({"rep_title": corpus.titles[rows_[0]], "postIds": [corpus.ids[i] for i in rows_],
+                             "userIds": users, "count": len(rows_), "users": len(users)})
+    clusters.sort(key=lambda c: (-c["users"], -c["count"], c["postIds"][0]))
+    stats["clusters"] = len(clusters)
+    return clusters, stats
@@ -0,0 +1,70 @@
+import gzip, json
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback; same bytes modulo float formatting
+    orjson = None
+
+
+# -------------------- JSON encoding --------------------
+def dumps(obj) -> bytes:
+    """
+    Compact UTF-8 JSON; orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+# -------------------- Pre-encoded response bodies --------------------
+class Encoded:
+    """
+    A response body encoded once at cache-fill time: JSON bytes plus, for payloads of at
+    least `gzip_min` bytes, a gzipped copy. Cache hits write these bytes as-is.
+    """
+    __slots__ = ("body", "gz")
+
+    def __init__(self, body: bytes, gz: Optional[bytes] = None):
+        self.body = body
+        self.gz = gz
+
+    @classmethod
+    def encode(cls, obj, gzip_min: int = 0) -> "Encoded":
+        return cls.from_body(dumps(obj), gzip_min)
+
+    @classmethod
+    def from_body(cls, body: bytes, gzip_min: int = 0) -> "Encoded":
+        gz = gzip.compress(body, compresslevel=6, mtime=0) if gzip_min and len(body) >= gzip_min else None
+        return cls(body, gz)
+
+    def data(self):
+        return loads(self.body)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + len(self.body) + (len(self.gz) if self.gz else 0)
+
+    # flat framing for serialized cache backends: 8-byte body length, body, gz
+    def to_bytes(self) -> bytes:
+        return len(self.body).to_bytes(8, "little") + self.body + (self.gz or b"")
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "Encoded":
+        n = int.from_bytes(blob[:8], "little")
+        return cls(blob[8:8 + n], blob[8 + n:] or None)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            try:
+                return not (q.startswith("q=") and float(q[2:]) == 0)
+            except ValueError:
+                return True
+    return False
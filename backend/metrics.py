@@ -0,0 +1,165 @@
+import time, bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# -------------------- Prometheus-style metrics (no external deps) --------------------
+# Counters and histograms are plain dicts keyed by label values: one lookup + add per
+# observation, cheap enough to leave on. render() emits the text exposition format.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple, le: Optional[str] = None) -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for lv, v in self._values.items():
+            out.append(f"{self.name}{_fmt_labels(self.labels, lv)} {v}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}   # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *label_values):
+        row = self._values.get(label_values)
+        if row is None:
+            row = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, row in self._values.items():
+            acc = 0
+            for b, n in zip(self.buckets, row):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, str(b))} {acc}")
+            acc += row[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, lv, '+Inf')} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, lv)} {row[-1]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, lv)} {acc}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[Tuple, float]]]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        m = Counter(*args, **kwargs); self._metrics.append(m); return m
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        m = Histogram(*args, **kwargs); self._metrics.append(m); return m
+
+    def collector(self, fn: Callable):
+        """
+        fn() -> iterable of (name, type, help, {(label_name, label_value)...: value}) read at scrape time,
+        for state that already lives elsewhere (cache stats, pool state).
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, v in samples.items():
+                    names = tuple(k for k, _ in labels)
+                    lines.append(f"{name}{_fmt_labels(names, tuple(val for _, val in labels))} {v}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_SECONDS     = REGISTRY.histogram("http_request_duration_seconds", "Request latency by path and status", ("path", "status"))
+UPSTREAM_SECONDS = REGISTRY.histogram("upstream_request_duration_seconds", "Upstream GET latency per attempt", ("outcome",))
+UPSTREAM_RETRIES = REGISTRY.counter("upstream_retries_total", "Upstream attempts retried after an error")
+SCAN_PAGES       = REGISTRY.histogram("scan_pages", "Upstream pages fetched per iter_pages scan",
+                                      buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000))
+STAGE_SECONDS    = REGISTRY.histogram("analytics_stage_duration_seconds", "Analytics stage latency", ("stage", "method"))
+
+
+# -------------------- Per-request stage timings (Server-Timing) --------------------
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float, method: str = ""):
+    STAGE_SECONDS.observe(seconds, stage, method)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str, method: str = ""):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0, method)
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    parts = [f"{name};dur={sec * 1000:.2f}" for name, sec in timings]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: request latency histogram and (optionally) a Server-Timing header
+    listing the stages recorded while handling the request.
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if self.server_timing:
+                    header = server_timing_header(timings, time.perf_counter() - t0)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            path = scope["path"] if status[0] != 404 else "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - t0, path, status[0])
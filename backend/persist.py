@@ -0,0 +1,79 @@
+import os, json, time, zlib
+from typing import Dict, List, Tuple
+
+from backend.corpus import CompactCorpus, CorpusSnapshot
+from backend.encoding import Encoded
+
+
+# -------------------- On-disk corpus + analytics snapshot --------------------
+# File layout: MAGIC, 8-byte header length, JSON header, then the raw sections back to back.
+# Sections are the CompactCorpus columns (array bytes / UTF-8 blobs) plus pre-encoded
+# /anomalies and /summary bodies for that corpus version, so a restart serves them at once.
+MAGIC = b"CCSNAP\x00\x01"
+FORMAT = 1
+ENTRY_PREFIX = "entry:"
+
+
+class SnapshotError(Exception):
+    """Snapshot file is unusable (format, source, age or checksum)."""
+
+
+def save_snapshot(path: str, snap: CorpusSnapshot, entries: List[Tuple[str, Encoded]], source: str) -> int:
+    """
+    Atomically write the snapshot (temp file + rename); returns bytes written.
+    """
+    sections = snap.corpus.to_sections()
+    for key, enc in entries:
+        sections[ENTRY_PREFIX + key] = enc.to_bytes()
+    header = json.dumps({
+        "format": FORMAT, "source": source, "version": snap.version, "scan_max": snap.scan_max,
+        "total": snap.total, "fetched_at": snap.fetched_at, "saved_at": time.time(),
+        "sections": [[name, len(data), zlib.crc32(data)] for name, data in sections.items()],
+    }).encode()
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for data in sections.values():
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(MAGIC) + 8 + len(header) + sum(len(d) for d in sections.values())
+
+
+def load_snapshot(path: str, source: str, max_age: float = 0) -> Tuple[CorpusSnapshot, Dict[str, Encoded]]:
+    """
+    (snapshot, {cache key: encoded body}). Raises FileNotFoundError or SnapshotError.
+    max_age (seconds, 0 = any) is checked against when the corpus was fetched from upstream.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SnapshotError("not a snapshot file")
+        header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+        if header.get("format") != FORMAT:
+            raise SnapshotError(f"format {header.get('format')} != {FORMAT}")
+        if header.get("source") != source:
+            raise SnapshotError("snapshot was taken from a different upstream")
+        if max_age and time.time() - header["fetched_at"] > max_age:
+            raise SnapshotError(f"snapshot older than {max_age:.0f}s")
+        sections: Dict[str, bytes] = {}
+        for name, size, crc in header["sections"]:
+            data = f.read(size)
+            if len(data) != size or zlib.crc32(data) != crc:
+                raise SnapshotError(f"section {name} is truncated or corrupt")
+            sections[name] = data
+    entries = {name[len(ENTRY_PREFIX):]: Encoded.from_bytes(data)
+               for name, data in sections.items() if name.startswith(ENTRY_PREFIX)}
+    corpus = CompactCorpus.from_sections(sections)
+    snap = CorpusSnapshot.restore(corpus, header["version"], header["scan_max"], header["fetched_at"], header.get("total"))
+    return snap, entries
+
+
+def snapshot_entries(items: List[Tuple[str, object]], version: str) -> List[Tuple[str, Encoded]]:
+    """
+    Cached analytics bodies worth persisting: those computed for `version`.
+    """
+    prefixes = (f"anoms:{version}:", f"summary:{version}:")
+    return [(k, v) for k, v in items if k.startswith(prefixes) and isinstance(v, Encoded)]
@@ -0,0 +1,144 @@
+import time, random, asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+
+# -------------------- Upstream failures surfaced as httpx errors --------------------
+# Subclassing httpx keeps every existing handler (502/504, in-band stream errors) working.
+class CircuitOpen(httpx.RequestError):
+    """Upstream breaker is open; failing fast without a request."""
+
+
+class ScanDeadlineExceeded(httpx.TimeoutException):
+    """A scan's shared deadline ran out before all of its pages arrived."""
+
+
+# -------------------- Circuit breaker --------------------
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open rejects calls for
+    `reset_timeout` seconds, then half-open lets one probe through: success closes, failure reopens,
+    and an outcome that is neither (release_probe) lets the next call probe instead.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def check(self, now: Optional[float] = None):
+        """
+        Raise CircuitOpen unless a call may go out now.
+        """
+        if self.state == self.CLOSED or not self.failure_threshold:
+            return
+        now = time.monotonic() if now is None else now
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        # one probe at a time; a probe that never reported back (cancelled) expires after reset_timeout
+        if self.state == self.HALF_OPEN and (not self._probing or now - self._probe_at >= self.reset_timeout):
+            self._probing, self._probe_at = True, now
+            return
+        self.stats["rejected"] += 1
+        raise CircuitOpen(f"upstream circuit {self.state}; retry in "
+                          f"{max(0.0, self.reset_timeout - (now - self.opened_at)):.1f}s")
+
+    def record_success(self):
+        self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_failure(self, now: Optional[float] = None):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.failure_threshold and self.failures >= self.failure_threshold):
+            if self.state != self.OPEN:
+                self.stats["opened"] += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic() if now is None else now
+        self._probing = False
+
+    def info(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+
+
+# -------------------- Latency-percentile hedging --------------------
+class Hedger:
+    """
+    Fires a duplicate request when the first has run longer than the `percentile` latency of
+    recent successes (never sooner than `min_delay`); the first success wins, the loser is cancelled.
+    """
+
+    def __init__(self, percentile: float = 95, min_delay: float = 0.05, window: int = 256, min_samples: int = 20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self.stats = {"hedged": 0, "hedge_wins": 0}
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        if not self.percentile or len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        k = min(len(ordered) - 1, int(self.percentile / 100 * len(ordered)))
+        return max(self.min_delay, ordered[k])
+
+    async def run(self, send: Callable[[], Awaitable]):
+        delay = self.delay()
+        first = asyncio.ensure_future(send())
+        if delay is None:
+            return await first
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.stats["hedged"] += 1
+                tasks.append(asyncio.ensure_future(send()))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is not first:
+                            self.stats["hedge_wins"] += 1
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)].
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def deadline_after(seconds: float) -> Optional[float]:
+    """
+    Absolute monotonic deadline shared by every page of one scan (None = unbounded).
+    """
+    return time.monotonic() + seconds if seconds > 0 else None
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise ScanDeadlineExceeded("scan deadline exceeded")
+    return left
@@ -0,0 +1,300 @@
+import os, math, time, array, bisect, asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils import tokenize, STOPWORDS, _word_re
+from backend.corpus import CompactCorpus, CorpusSnapshot
+
+SEARCH_TITLE_BOOST = int(os.getenv("SEARCH_TITLE_BOOST", "2"))       # a title occurrence counts as this many body ones
+SEARCH_MAX_EXPANSIONS = int(os.getenv("SEARCH_MAX_EXPANSIONS", "64"))  # terms a prefix may expand to (most frequent)
+BM25_K1, BM25_B = 1.2, 0.75
+BUILD_CHUNK = 65536                                                   # posts tokenized per build step
+
+
+class QueryError(ValueError):
+    """Query has no searchable terms."""
+
+
+# -------------------- Inverted index over titles + bodies --------------------
+class SearchIndex:
+    """
+    Posting lists (CSR): for term t, rows[off[t]:off[t+1]] are the corpus rows containing it
+    (ascending) and tf[...] the matching term frequencies (title hits weighted by
+    SEARCH_TITLE_BOOST). Terms are tokenize() output, so STOPWORDS are never indexed.
+    Queries evaluate with numpy set operations and rank by BM25.
+    """
+    __slots__ = ("version", "corpus", "words", "vocab", "sorted_words", "off", "rows", "tf", "df", "dl", "avgdl",
+                 "user_ids")
+
+    @classmethod
+    def build(cls, corpus: CompactCorpus, version: str) -> "SearchIndex":
+        n = len(corpus)
+        vocab: Dict[str, int] = {}
+        # titles: reuse the corpus token ids, remapped onto search term ids (stopwords -> -1)
+        tmap = np.full(len(corpus.words), -1, dtype=np.int64)
+        for tid, w in enumerate(corpus.words):
+            if not corpus.stop[tid]:
+                tmap[tid] = vocab.setdefault(w, len(vocab))
+        tok_off = np.frombuffer(corpus.tok_off, dtype=np.int64)
+        t_terms = tmap[np.frombuffer(corpus.tok_flat, dtype=np.uint32)] if len(corpus.tok_flat) else tmap[:0]
+        t_rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(tok_off))
+        keep = t_terms >= 0
+        t_terms, t_rows = t_terms[keep], t_rows[keep]
+
+        # bodies: the same tokens as tokenize(), a chunk at a time; each chunk is reduced to
+        # distinct (term, row) + tf. Stopwords map to -1 so the hot loop is one dict lookup per token.
+        lut: Dict[str, int] = dict.fromkeys(STOPWORDS, -1)
+        lut.update(vocab)
+        get, findall = lut.get, _word_re.findall
+
+        def term_id(w: str) -> int:
+            t = get(w)
+            if t is None:
+                t = lut[w] = vocab[w] = len(vocab)
+            return t
+
+        parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for start in range(0, n, BUILD_CHUNK):
+            stop = min(n, start + BUILD_CHUNK)
+            b_terms, b_counts = array.array("q"), array.array("q")
+            for i in range(start, stop):
+                toks = findall(corpus.body(i))
+                if toks:
+                    toks = "\x00".join(toks).lower().split("\x00")   # one lower() per body, not per token
+                    ids = [get(w, -2) for w in toks]
+                    if -2 in ids:
+                        ids = [term_id(w) for w in toks]
+                    b_terms.extend(ids)
+                b_counts.append(len(toks))
+            b_term_arr = np.frombuffer(b_terms, dtype=np.int64)
+            b_row_arr = np.repeat(np.arange(start, stop, dtype=np.int64), np.frombuffer(b_counts, dtype=np.int64))
+            body = b_term_arr >= 0
+            lo, hi = np.searchsorted(t_rows, [start, stop])
+            keys = np.concatenate([(t_terms[lo:hi] << 32) | t_rows[lo:hi], (b_term_arr[body] << 32) | b_row_arr[body]])
+            weights = np.concatenate([np.full(hi - lo, SEARCH_TITLE_BOOST, dtype=np.int64),
+                                      np.ones(int(body.sum()), dtype=np.int64)])
+            uniq, inverse = np.unique(keys, return_inverse=True)
+            tf = np.bincount(inverse, weights=weights, minlength=len(uniq))
+            parts.append(((uniq >> 32).astype(np.uint32), (uniq & 0xFFFFFFFF).astype(np.uint32),
+                          np.minimum(tf, 65535).astype(np.uint16)))
+
+        # counting sort of all chunks by term; rows stay ascending since chunks are in row order
+        self = cls()
+        T = len(vocab)
+        self.df = np.zeros(T, dtype=np.int64)
+        for terms, _, _ in parts:
+            self.df += np.bincount(terms, minlength=T)
+        self.off = np.zeros(T + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.off[1:])
+        self.rows = np.empty(self.off[-1], dtype=np.uint32)
+        self.tf = np.empty(self.off[-1], dtype=np.uint16)
+        self.dl = np.zeros(n, dtype=np.float32)
+        cursor = self.off[:-1].copy()
+        while parts:
+            terms, rows, tf = parts.pop(0)
+            first = np.searchsorted(terms, terms)        # first slot of each entry's term in this chunk
+            dest = cursor[terms] + (np.arange(len(terms)) - first)
+            self.rows[dest], self.tf[dest] = rows, tf
+            cursor += np.bincount(terms, minlength=T)
+            self.dl += np.bincount(rows, weights=tf, minlength=n).astype(np.float32)
+        self.version, self.corpus, self.vocab = version, corpus, vocab
+        self.words = list(vocab)
+        self.sorted_words = sorted(self.words)
+        self.avgdl = float(self.dl.mean()) if n else 0.0
+        self.user_ids = np.frombuffer(corpus.user_ids, dtype=np.int64)
+        return self
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.off, self.rows, self.tf, self.df, self.dl)) + 120 * len(self.words)
+
+    def info(self) -> Dict:
+        return {"version": self.version, "posts": len(self.corpus), "terms": len(self.words),
+                "postings": int(self.off[-1]), "bytes": self.nbytes()}
+
+    # ---- queries ----
+    def expand(self, prefix: str) -> List[int]:
+        """
+        Term ids starting with `prefix`, at most SEARCH_MAX_EXPANSIONS (highest document frequency first).
+        """
+        lo = bisect.bisect_left(self.sorted_words, prefix)
+        hi = bisect.bisect_left(self.sorted_words, prefix + "\U0010ffff", lo)
+        ids = [self.vocab[w] for w in self.sorted_words[lo:hi]]
+        if len(ids) > SEARCH_MAX_EXPANSIONS:
+            ids = sorted(ids, key=lambda t: -self.df[t])[:SEARCH_MAX_EXPANSIONS]
+        return ids
+
+    def postings(self, t: int) -> np.ndarray:
+        return self.rows[self.off[t]:self.off[t + 1]]
+
+    def _union(self, lists: List[np.ndarray]) -> np.ndarray:
+        # a dense mask beats sorting the concatenation once prefixes expand to many terms
+        if len(lists) == 1:
+            return lists[0]
+        mask = np.zeros(len(self.corpus), dtype=bool)
+        for rows in lists:
+            mask[rows] = True
+        return np.flatnonzero(mask).astype(np.uint32)
+
+    def _restrict(self, rows: np.ndarray, ids: List[int]) -> np.ndarray:
+        """
+        rows that appear in any of the posting lists of `ids`.
+        """
+        if len(rows) * len(ids) * 8 >= sum(int(self.df[t]) for t in ids):
+            return np.intersect1d(rows, self._union([self.postings(t) for t in ids]), assume_unique=True)
+        keep = np.zeros(len(rows), dtype=bool)
+        for t in ids:
+            plist = self.postings(t)
+            if len(plist):
+                pos = np.minimum(np.searchsorted(plist, rows), len(plist) - 1)
+                keep |= plist[pos] == rows
+        return rows[keep]
+
+    def match(self, groups: List[List[Tuple[str, bool]]]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Rows matching any group (OR) where a group needs all of its clauses (AND); a clause is
+        a term or, with the flag set, a prefix. Returns (rows ascending, term ids to score).
+        """
+        hits, scored = [], set()
+        for group in groups:
+            clauses = []
+            for text, prefix in group:
+                ids = self.expand(text) if prefix else [t for t in [self.vocab.get(text)] if t is not None]
+                scored.update(ids)
+                clauses.append(ids)
+            if not all(clauses):
+                continue
+            # narrowest clause first; the rest only filter its rows
+            clauses.sort(key=lambda ids: sum(int(self.df[t]) for t in ids))
+            rows = self._union([self.postings(t) for t in clauses[0]])
+            for ids in clauses[1:]:
+                rows = self._restrict(rows, ids)
+            hits.append(rows)
+        if not hits:
+            return np.empty(0, dtype=np.uint32), []
+        return self._union(hits), sorted(scored)
+
+    def _term_score(self, tf: np.ndarray, t: int, norm: np.ndarray) -> np.ndarray:
+        n = len(self.corpus)
+        return math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5)) * tf * (BM25_K1 + 1) / (tf + norm)
+
+    def bm25(self, rows: np.ndarray, terms: List[int]) -> np.ndarray:
+        """
+        BM25 of each row over `terms`. Few candidates: look each up in the posting lists;
+        many (broad prefixes): accumulate every posting into a dense per-row array instead.
+        """
+        inv_avgdl = 1.0 / (self.avgdl or 1.0)
+        if len(rows) * len(terms) * 2 < sum(int(self.df[t]) for t in terms):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.dl[rows] * inv_avgdl)
+            score = np.zeros(len(rows), dtype=np.float64)
+            for t in terms:
+                plist = self.postings(t)
+                pos = np.searchsorted(plist, rows)
+                found = pos < len(plist)
+                found[found] = plist[pos[found]] == rows[found]
+                tf = np.zeros(len(rows), dtype=np.float64)
+                tf[found] = self.tf[self.off[t] + pos[found]]
+                score += self._term_score(tf, t, norm)
+            return score
+        acc = np.zeros(len(self.corpus), dtype=np.float64)
+        for t in terms:
+            plist = self.postings(t)
+            tf = self.tf[self.off[t]:self.off[t + 1]].astype(np.float64)
+            acc[plist] += self._term_score(tf, t, BM25_K1 * (1 - BM25_B + BM25_B * self.dl[plist] * inv_avgdl))
+        return acc[rows]
+
+    def search(self, query: str, user_id: Optional[int] = None, offset: int = 0, limit: int = 20,
+               max_rows: Optional[int] = None) -> Dict:
+        """
+        {"total", "data": posts ranked by BM25 (+ "score"), page [offset, offset + limit)};
+        `max_rows` limits matches to the first rows of the corpus (a max_scan view).
+        """
+        rows, terms = self.match(parse_query(query))
+        if max_rows is not None and max_rows < len(self.corpus):
+            rows = rows[rows < max_rows]
+        if user_id is not None and len(rows):
+            rows = rows[self.user_ids[rows] == user_id]
+        total = len(rows)
+        k = min(total, offset + limit)
+        if offset >= k:
+            return {"total": total, "data": []}
+        score = self.bm25(rows, terms)
+        if k < total:
+            # everything scoring at least the k-th best, so ties at the cut still resolve by corpus order
+            top = np.nonzero(score >= score[np.argpartition(-score, k - 1)[k - 1]])[0]
+        else:
+            top = np.arange(total)
+        top = top[np.lexsort((rows[top], -score[top]))][offset:k]   # score desc, then corpus order
+        return {"total": total,
+                "data": [{**self.corpus.post(int(rows[j])), "score": round(float(score[j]), 4)} for j in top]}
+
+
+def parse_query(query: str) -> List[List[Tuple[str, bool]]]:
+    """
+    "a b OR c*" -> [[("a", False), ("b", False)], [("c", True)]]: whitespace is AND, an
+    upper-case OR separates alternatives, a trailing * makes the (last) token a prefix.
+    """
+    groups: List[List[Tuple[str, bool]]] = [[]]
+    for word in query.split():
+        if word == "OR":
+            groups.append([])
+            continue
+        if word == "AND":
+            continue
+        prefix = word.endswith("*")
+        toks = tokenize(word.rstrip("*"), drop_stops=not prefix)
+        groups[-1].extend((t, prefix and k == len(toks) - 1) for k, t in enumerate(toks))
+    groups = [g for g in groups if g]
+    if not groups:
+        raise QueryError("query has no searchable terms")
+    return groups
+
+
+# -------------------- Index lifecycle --------------------
+class SearchIndexHolder:
+    """
+    The current index plus at most one background build. A new corpus version starts a
+    rebuild; until it lands, queries are answered from the previous index. A version seen
+    while a build runs is queued (latest wins) and built when that one finishes.
+    """
+
+    def __init__(self):
+        self.index: Optional[SearchIndex] = None
+        self._task: Optional[asyncio.Task] = None
+        self._building: Optional[str] = None
+        self._queued: Optional[CorpusSnapshot] = None
+        self.stats = {"builds": 0, "stale_served": 0, "last_build_seconds": 0.0}
+
+    def _start(self, snap: CorpusSnapshot):
+        self._task, self._building = asyncio.ensure_future(self._build(snap)), snap.version
+
+    async def _build(self, snap: CorpusSnapshot) -> SearchIndex:
+        t0 = time.perf_counter()
+        try:
+            index = await asyncio.to_thread(SearchIndex.build, snap.corpus, snap.version)
+            self.stats["builds"] += 1
+            self.stats["last_build_seconds"] = round(time.perf_counter() - t0, 3)
+            self.index = index
+        finally:
+            nxt, self._queued = self._queued, None
+            if nxt is not None and (self.index is None or nxt.version != self.index.version):
+                self._start(nxt)
+            else:
+                self._task = self._building = None
+        return index
+
+    async def get(self, snap: CorpusSnapshot) -> SearchIndex:
+        index = self.index
+        if index is not None and index.version == snap.version:
+            return index
+        if self._task is None:
+            self._start(snap)
+        elif self._building != snap.version:
+            self._queued = snap
+        if index is not None:
+            self.stats["stale_served"] += 1
+            return index
+        return await asyncio.shield(self._task)
+
+    def info(self) -> Dict:
+        return {**self.stats, "building": self._building, "index": self.index.info() if self.index else None}
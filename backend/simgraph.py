@@ -0,0 +1,215 @@
+import os, sys, array, difflib
+from typing import Dict, List, Optional, Sequence, Tuple
+from collections import Counter
+
+from backend.utils import cosine_neighbors, shingle_set, lsh_buckets, _lsh_candidates, jaccard
+
+SIMILARITY_FLOOR = float(os.getenv("SIMILARITY_FLOOR", "0.3"))   # lowest score kept in cached similarity graphs
+FUZZY_MEMO_MAX = int(os.getenv("FUZZY_MEMO_MAX", "100000"))      # fuzzy ratios memoized per user, at most
+
+
+# -------------------- Threshold-independent similarity graphs --------------------
+# The expensive part of grouping (pairwise scores) is computed once per corpus version and
+# method; grouping at any threshold is then a cheap greedy pass over the cached scores.
+def similarity_floor(thresholds: Sequence[float]) -> float:
+    """
+    Floor a graph must be built at to serve every (positive) threshold requested.
+    """
+    return min([SIMILARITY_FLOOR] + [t for t in thresholds if t > 0])
+
+
+def _units(items: List[Dict]) -> Tuple[List[str], List[List[int]]]:
+    """
+    Distinct normalized titles in first-seen order, with the item indices holding each.
+    Identical titles always share a greedy group, so the fuzzy and MinHash graphs work on these.
+    """
+    first: Dict[str, int] = {}
+    members: List[List[int]] = []
+    for k, it in enumerate(items):
+        u = first.setdefault(it["norm"], len(members))
+        if u == len(members):
+            members.append([])
+        members[u].append(k)
+    return list(first), members
+
+
+def _expand(items: List[Dict], unit_groups: List[List[int]], members: Optional[List[List[int]]]) -> List[Dict]:
+    out = []
+    for g in unit_groups:
+        ks = sorted(k for u in g for k in members[u]) if members is not None else g
+        if len(ks) >= 2:
+            out.append({"rep_title": items[ks[0]]["raw"], "postIds": [items[k]["id"] for k in ks], "count": len(ks)})
+    return out
+
+
+def _one_group(items: List[Dict]) -> List[Dict]:
+    # threshold <= 0: every pair qualifies, so greedy grouping puts everything in the first group
+    return _expand(items, [list(range(len(items)))], None)
+
+
+class SimilarityGraph:
+    """
+    Weighted edge list (CSR) over the units of one user's titles: for unit i, the later units j
+    with score >= floor, ascending j. Cosine scores items directly (TF-IDF depends on duplicates);
+    MinHash scores distinct titles among LSH candidates.
+    """
+    __slots__ = ("method", "floor", "members", "off", "nbr", "w")
+
+    def __init__(self, method: str, floor: float, neighbors: List[List[Tuple[int, float]]],
+                 members: Optional[List[List[int]]] = None):
+        self.method, self.floor, self.members = method, floor, members
+        self.off = array.array("q", [0])
+        self.nbr = array.array("I")
+        self.w = array.array("d")
+        for row in neighbors:
+            for j, sim in row:
+                self.nbr.append(j); self.w.append(sim)
+            self.off.append(len(self.nbr))
+
+    @classmethod
+    def build(cls, items: List[Dict], method: str, floor: float) -> "SimilarityGraph":
+        if method == "cosine":
+            return cls(method, floor, cosine_neighbors([it["norm"] for it in items], floor))
+        norms, members = _units(items)
+        sets = [shingle_set(s) for s in norms]
+        doc_buckets = lsh_buckets(sets)
+        neighbors = []
+        for i, A in enumerate(sets):
+            row = []
+            for j in _lsh_candidates(i, doc_buckets):
+                sim = jaccard(A, sets[j])
+                if sim >= floor:
+                    row.append((j, sim))
+            neighbors.append(row)
+        return cls(method, floor, neighbors, members)
+
+    @property
+    def edges(self) -> int:
+        return len(self.nbr)
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.off, self.nbr, self.w)) + 8 * len(self.off)
+
+    def groups(self, items: List[Dict], threshold: float) -> Tuple[List[Dict], Dict[str, int]]:
+        if threshold <= 0:
+            return _one_group(items), {}
+        off, nbr, w = self.off, self.nbr, self.w
+        n = len(off) - 1
+        assigned = [False] * n
+        unit_groups = []
+        for i in range(n):
+            if assigned[i]: continue
+            group = [i]; assigned[i] = True
+            for p in range(off[i], off[i + 1]):
+                j = nbr[p]
+                if not assigned[j] and w[p] >= threshold:
+                    group.append(j); assigned[j] = True
+            unit_groups.append(group)
+        return _expand(items, unit_groups, self.members), {}
+
+
+class FuzzyScores:
+    """
+    Fuzzy ratios are too costly to score every pair up front (SequenceMatcher is ~100x a cosine
+    entry), so the fuzzy "graph" is the memo of every ratio greedy grouping has needed so far,
+    keyed by (later unit, earlier unit) since ratio(later, earlier) is what grouping compares.
+    Any threshold reuses it and scores only the pairs it has not seen; the cheap character
+    bounds are kept as well so repeat passes skip the Counter work. Each memo holds at most
+    FUZZY_MEMO_MAX entries, and a cached one is copied before use so it never grows past the
+    size it was stored with.
+    """
+    __slots__ = ("method", "floor", "ratios", "bounds")
+
+    def __init__(self):
+        self.method, self.floor = "fuzzy", 0.0   # holds exact ratios, valid for every threshold
+        self.ratios: Dict[int, float] = {}       # (later << 32 | earlier) -> ratio(later, earlier)
+        self.bounds: Dict[int, float] = {}       # same key -> shared-character upper bound
+
+    @property
+    def edges(self) -> int:
+        return len(self.ratios)
+
+    def nbytes(self) -> int:
+        return sum(sys.getsizeof(d) + 56 * len(d) for d in (self.ratios, self.bounds))
+
+    def copy(self) -> "FuzzyScores":
+        out = FuzzyScores()
+        out.ratios, out.bounds = dict(self.ratios), dict(self.bounds)
+        return out
+
+    def groups(self, items: List[Dict], threshold: float) -> Tuple[List[Dict], Dict[str, int]]:
+        """
+        Greedy first match against representatives in group order (the same groups as comparing
+        every title with fuzzy_ratio(title, rep)), skipping pairs whose length / shared-character
+        bounds fall below the threshold.
+        """
+        stats = {"pairs": 0, "pruned_length": 0, "pruned_chars": 0, "exact": 0, "reused": 0}
+        if threshold <= 0:
+            return _one_group(items), stats
+        norms, members = _units(items)
+        ratios, bounds = self.ratios, self.bounds
+        reps: List[list] = []   # [unit, length, chars, matcher or None, member units]
+        for k, a in enumerate(norms):
+            la = len(a)
+            chars = None
+            placed = False
+            for rep in reps:
+                stats["pairs"] += 1
+                key = (k << 32) | rep[0]
+                ratio = ratios.get(key)
+                if ratio is not None:
+                    # a known ratio beats any bound
+                    stats["reused"] += 1
+                else:
+                    total = la + rep[1]
+                    if total:
+                        # ratio = 2*M/total with M <= min(len) and M <= |shared chars|
+                        if 2.0 * min(la, rep[1]) / total < threshold:
+                            stats["pruned_length"] += 1
+                            continue
+                        bound = bounds.get(key)
+                        if bound is None:
+                            if chars is None:
+                                chars = Counter(a)
+                            bound = 2.0 * sum((chars & rep[2]).values()) / total
+                            if len(bounds) < FUZZY_MEMO_MAX:
+                                bounds[key] = bound
+                        if bound < threshold:
+                            stats["pruned_chars"] += 1
+                            continue
+                    stats["exact"] += 1
+                    if rep[3] is None:
+                        # SequenceMatcher caches its analysis of seq2, so keep one per representative
+                        rep[3] = difflib.SequenceMatcher(None, "", norms[rep[0]])
+                    rep[3].set_seq1(a)
+                    ratio = rep[3].ratio()
+                    if len(ratios) < FUZZY_MEMO_MAX:
+                        ratios[key] = ratio
+                if ratio >= threshold:
+                    rep[4].append(k); placed = True; break
+            if not placed:
+                reps.append([k, la, Counter(a), None, [k]])
+        return _expand(items, [rep[4] for rep in reps], members), stats
+
+
+def similarity_groups(items: List[Dict], method: str, thresholds: Sequence[float], floor: float,
+                      graph=None) -> Tuple[List[Tuple[List[Dict], Dict[str, int]]], object]:
+    """
+    Groups (count >= 2) + pair stats for each threshold, and the graph used: `graph` when it
+    is still valid for `floor`, else a freshly built one. "exact" needs no graph.
+    """
+    if method == "exact":
+        buckets: Dict[str, List[Dict]] = {}
+        for it in items:
+            buckets.setdefault(it["norm"], []).append(it)
+        groups = [{"rep_title": b[0]["raw"], "postIds": [it["id"] for it in b], "count": len(b)}
+                  for b in buckets.values() if len(b) >= 2]
+        return [(groups, {}) for _ in thresholds], None
+    if method == "fuzzy":
+        # the cached memo was sized when stored: extend a copy, never the cached object
+        graph = graph.copy() if isinstance(graph, FuzzyScores) else FuzzyScores()
+    elif graph is None or graph.method != method or graph.floor > floor:
+        graph = SimilarityGraph.build(items, method, floor) if any(t > 0 for t in thresholds) else None
+    if graph is None:
+        return [(_one_group(items), {}) for _ in thresholds], None
+    return [graph.groups(items, t) for t in thresholds], graph
@@ -0,0 +1,99 @@
+from backend.analytics import (build_user_index, prepare_anomalies, similarity_job, similarity_jobs, similarity_backend,
+                               collect_suspicious, anomalies_meta, summary_job)
+from backend.corpus import CompactCorpus
+from backend.simgraph import similarity_floor
+
+
+POSTS = [
+    {"userId": 2, "id": 1, "title": "Qui est esse", "body": ""},
+    {"userId": 1, "id": 2, "title": "sunt aut facere repellat", "body": ""},
+    {"userId": 1, "id": 3, "title": "Sunt aut facere, repellat!", "body": ""},
+    {"userId": 2, "id": 4, "title": "qui est esse", "body": ""},
+    {"userId": 1, "id": 5, "title": "sunt aut facere repellat", "body": ""},
+    {"userId": 2, "id": 6, "title": "dolorem eum magni eos", "body": ""},
+]
+CORPUS = CompactCorpus.from_posts(POSTS)
+
+
+def anomalies(corpus, method, threshold, suspicious_threshold=1):
+    # the /anomalies stages as iter_anomaly_sections runs them, inline
+    state, short_titles, duplicate_titles, _ = prepare_anomalies(corpus, 15, "v1")
+    backend = similarity_backend(method)
+    uids = similarity_jobs(state.index)
+    floor = similarity_floor([threshold])
+    results = [similarity_job(state.index[uid], backend, [threshold], floor)[0][0] for uid in uids]
+    suspicious_users, pair_stats = collect_suspicious(uids, results, suspicious_threshold)
+    return {"short_titles": short_titles, "duplicate_titles": duplicate_titles, "suspicious_users": suspicious_users,
+            "meta": anomalies_meta(method, backend, threshold, 100, "v1", pair_stats)}
+
+
+def test_user_index_single_pass():
+    index = build_user_index(CORPUS)
+    assert list(index) == [2, 1]
+    assert [it["id"] for it in index[1].items] == [2, 3, 5]
+    assert list(index[1].buckets) == ["sunt aut facere repellat"]
+
+
+def test_anomalies_pipeline_output():
+    out = anomalies(CORPUS, "exact", 0.4)
+    assert out["short_titles"] == [POSTS[0], POSTS[3]]
+    assert out["duplicate_titles"] == [
+        {"userId": 1, "title": "sunt aut facere repellat", "count": 3, "postIds": [2, 3, 5]},
+        {"userId": 2, "title": "Qui est esse", "count": 2, "postIds": [1, 4]},
+    ]
+    assert out["suspicious_users"] == [
+        {"userId": 1, "total_similar_posts": 3, "groups": [{"rep_title": "sunt aut facere repellat", "postIds": [2, 3, 5], "count": 3}]},
+        {"userId": 2, "total_similar_posts": 2, "groups": [{"rep_title": "Qui est esse", "postIds": [1, 4], "count": 2}]},
+    ]
+    for method in ("fuzzy", "cosine"):
+        assert anomalies(CORPUS, method, 0.9)["suspicious_users"] == out["suspicious_users"]
+
+
+def test_summary_counts():
+    out = summary_job(CORPUS, 1, True, 100, "v1")[0]
+    assert out["top_users_by_unique_words"] == [{"userId": 2, "unique_word_count": 4}]
+    assert out["top_words"][0] == {"word": "sunt", "count": 3}
+
+
+def test_embedding_reports_minhash_backend():
+    out = anomalies(CORPUS, "embedding", 0.9)
+    assert out["meta"]["backend"] == "minhash"
+    assert out["suspicious_users"] == anomalies(CORPUS, "exact", 0.9)["suspicious_users"]
+
+
+def test_incremental_state_matches_full_recompute():
+    from backend.corpus import CorpusSnapshot
+    old = CorpusSnapshot(POSTS, 100)
+    summary_state = summary_job(old.corpus, 3, True, 100, old.version)[1]
+    anoms_state = prepare_anomalies(old.corpus, 15, old.version)[0]
+
+    posts = [dict(p) for p in POSTS]
+    posts[0]["title"] = "sunt aut facere repellat"      # user 2 now shares user 1's words
+    del posts[2]
+    posts.append({"userId": 3, "id": 7, "title": "brand new words here", "body": ""})
+    new = CorpusSnapshot(posts, 100, prev=old)
+    users = new.delta_since(summary_state.version, summary_state.n, 100)
+    assert users == {1, 2, 3}
+
+    out, state = summary_job(new.corpus, 3, True, 100, new.version, summary_state, users)
+    assert out == summary_job(new.corpus, 3, True, 100, new.version)[0]
+    assert state.user_counts is not summary_state.user_counts   # the old state is left intact
+    assert prepare_anomalies(new.corpus, 15, new.version, anoms_state, users)[1:3] == \
+        prepare_anomalies(new.corpus, 15, new.version)[1:3]
+
+
+def test_summary_word_ties_follow_current_corpus_order():
+    from collections import Counter
+    from backend.corpus import CorpusSnapshot
+    old = CorpusSnapshot([{"userId": 1, "id": 1, "title": "alpha beta", "body": ""},
+                          {"userId": 2, "id": 2, "title": "gamma delta", "body": ""}], 100)
+    state = summary_job(old.corpus, 3, True, 100, old.version)[1]
+    # same words, new order: the vocabulary (token ids) still carries the old order
+    posts = [{"userId": 2, "id": 3, "title": "gamma delta", "body": ""},
+             {"userId": 1, "id": 4, "title": "alpha beta", "body": ""}]
+    new = CorpusSnapshot(posts, 100, prev=old)
+    users = new.delta_since(state.version, state.n, 100)
+    out = summary_job(new.corpus, 3, True, 100, new.version, state, users)[0]
+    expected = Counter(w for p in posts for w in p["title"].split()).most_common(20)
+    assert [(t["word"], t["count"]) for t in out["top_words"]] == expected
+    assert out == summary_job(CorpusSnapshot(posts, 100).corpus, 3, True, 100, new.version)[0]
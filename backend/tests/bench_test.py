@@ -0,0 +1,32 @@
+import json
+import httpx
+
+from backend.bench.synthetic import make_corpus, upstream_transport
+
+
+def test_synthetic_upstream_honors_paging_and_user_filter():
+    posts = make_corpus(500, users=5, dup_rate=0.3, seed=1)
+    assert [p["id"] for p in posts] == list(range(1, 501))
+    with httpx.Client(transport=upstream_transport(posts)) as c:
+        r = c.get("http://upstream/posts", params={"_start": 40, "_limit": 7})
+        assert [p["id"] for p in r.json()] == list(range(41, 48)) and r.headers["X-Total-Count"] == "500"
+        r = c.get("http://upstream/posts", params={"userId": 2, "_start": 0, "_limit": 1000})
+        assert all(p["userId"] == 2 for p in r.json()) and r.headers["X-Total-Count"] == str(len(r.json()))
+
+
+def test_bench_report_is_machine_readable(tmp_path):
+    from backend.bench.run import main
+    out = tmp_path / "bench.json"
+    main(["--posts", "300", "--requests", "3", "--cold-requests", "1", "--methods", "exact", "minhash",
+          "--out", str(out)])
+    report = json.loads(out.read_text())
+    assert {"p50_ms", "p95_ms", "p99_ms", "throughput_rps"} <= set(report["scenarios"][0])
+    assert all(s["errors"] == 0 for s in report["scenarios"])
+    assert "similarity:minhash" in report["stages_ms"] and report["peak_rss_mb"] > 0
+
+
+def test_memory_report_smaller_than_dicts():
+    from backend.bench.memory import memory_report
+    posts = [{"userId": i % 10, "id": i, "title": f"title {i % 50}", "body": "lorem ipsum dolor " * 5} for i in range(2000)]
+    report = memory_report(posts)
+    assert report["posts"] == 2000 and report["compact_bytes"] < report["list_of_dicts_bytes"]
@@ -0,0 +1,81 @@
+from backend.cache import TTLCache, estimate_size
+
+
+def test_ttl_expiry_and_stale_window():
+    c = TTLCache(max_items=10, stale_ttl=5)
+    c.set("a", {"x": 1}, ttl=10, now=100)
+    assert c.lookup("a", now=105) == ({"x": 1}, True)
+    assert c.lookup("a", now=112) == ({"x": 1}, False)   # expired but servable
+    assert c.get("a", now=112) is None
+    assert c.lookup("a", now=116) == (None, False)       # past the stale window
+    assert len(c) == 0 and c.bytes == 0
+
+
+def test_expired_entries_are_purged_on_write_without_full_sweep():
+    c = TTLCache(max_items=1000)
+    for i in range(100):
+        c.set(f"k{i}", i, ttl=1, now=0)
+    c.set("fresh", 1, ttl=100, now=50)
+    assert len(c) == 1 and c.get("fresh", now=60) == 1
+
+
+def test_lru_count_and_byte_caps():
+    c = TTLCache(max_items=2)
+    c.set("a", 1, ttl=60, now=0); c.set("b", 2, ttl=60, now=0)
+    c.get("a", now=1)                       # a becomes most recent
+    c.set("c", 3, ttl=60, now=1)
+    assert c.get("b", now=1) is None and c.get("a", now=1) == 1
+
+    big = "x" * 1000
+    c = TTLCache(max_items=100, max_bytes=3 * estimate_size(big))
+    for k in "abcd":
+        c.set(k, big, ttl=60, now=0)
+    assert c.get("a", now=0) is None and c.get("d", now=0) == big
+    assert c.bytes <= c.max_bytes and c.evictions == 1
+
+
+def test_overwrites_keep_heap_bounded():
+    c = TTLCache(max_items=10)
+    for i in range(10_000):
+        c.set("same", i, ttl=60, now=0)
+    assert len(c) == 1 and len(c._heap) < 200
+
+
+def test_sqlite_cache_matches_ttl_semantics_and_is_shared(tmp_path):
+    from backend.cache import SQLiteCache
+    path = str(tmp_path / "cache.sqlite3")
+    a, b = SQLiteCache(path, max_items=2, stale_ttl=5), SQLiteCache(path, max_items=2, stale_ttl=5)
+    a.set("k", {"x": [1, 2]}, ttl=10, now=100)
+    assert b.lookup("k", now=105) == ({"x": [1, 2]}, True)    # second connection (worker) sees it
+    assert b.lookup("k", now=112) == ({"x": [1, 2]}, False)   # expired but servable
+    assert a.lookup("k", now=116) == (None, False) and len(b) == 1   # reads don't write...
+    a.set("x", 0, ttl=60, now=116)
+    assert b.lookup("k", now=0) == (None, False)                      # ...the next set purges
+
+    a.set("a", 1, ttl=60, now=0); b.set("b", b"raw", ttl=60, now=0)
+    assert a.get("b", now=1) == b"raw"          # bytes round-trip untouched; b becomes most recent
+    a.set("c", 3, ttl=60, now=1)                # ...as of this set, which flushes a's hits
+    assert a.get("a", now=1) is None and a.get("b", now=1) == b"raw" and a.evictions == 1
+
+    from backend.encoding import Encoded
+    a.set("enc", Encoded.encode({"x": "y" * 2000}, gzip_min=1024), ttl=60, now=1)
+    enc = b.get("enc", now=1)
+    assert enc.data() == {"x": "y" * 2000} and enc.gz is not None
+
+    c = SQLiteCache(str(tmp_path / "bytes.sqlite3"), max_items=100, max_bytes=2500)
+    for k in "abcd":
+        c.set(k, "x" * 1000, ttl=60, now=0)
+    assert c.get("a", now=0) is None and c.get("d", now=0) == "x" * 1000
+    assert c.stats()["bytes"] <= 2500
+
+
+def test_sqlite_eviction_applies_both_caps_in_one_pass(tmp_path):
+    from backend.cache import SQLiteCache
+    c = SQLiteCache(str(tmp_path / "evict.sqlite3"), max_items=3, max_bytes=0)
+    for i, k in enumerate("abcdef"):
+        c.set(k, i, ttl=60, now=0)
+    assert [k for k in "abcdef" if c.get(k, now=0) is not None] == ["d", "e", "f"] and c.evictions == 3
+    c.max_bytes = 2003                        # rows are 1 byte each, "big" 2002
+    c.set("big", "x" * 2000, ttl=60, now=0)   # count cap drops "d", bytes cap drops "e" too
+    assert [k for k in ("d", "e", "f", "big") if c.get(k, now=0) is not None] == ["f", "big"]
+    assert c.evictions == 5
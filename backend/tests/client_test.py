@@ -1,4 +1,5 @@
 from backend.api_handle import app
+import os
 import httpx
 
 from fastapi.testclient import TestClient
@@ -51,3 +52,470 @@ def test_cors_preflight_allows_origin():
         )
         assert r.status_code in (200, 204)
         assert r.headers.get("access-control-allow-origin") == "http://localhost:3000"
+
+
+def test_parallel_scan_keeps_order_and_cap(monkeypatch, fake_upstream):
+    import asyncio
+    from types import SimpleNamespace
+    from backend import api_handle
+    posts = [{"userId": 1, "id": i, "title": f"t{i}", "body": ""} for i in range(1, 238)]
+    calls = {"n": 0}
+
+    async def collect(max_records, concurrency):
+        out = []
+        async for page, _ in api_handle.iter_pages({}, 0, 20, max_records, concurrency=concurrency):
+            out.extend(page)
+        return out
+
+    monkeypatch.setattr(app.state, "client", SimpleNamespace(get=fake_upstream(posts, calls, delay=0.01)), raising=False)
+    assert [p["id"] for p in asyncio.run(collect(0, 8))] == list(range(1, 238))
+    assert calls["n"] == 12  # no trailing empty probe: X-Total-Count planned the windows
+    assert [p["id"] for p in asyncio.run(collect(105, 8))] == list(range(1, 106))
+    assert asyncio.run(collect(105, 1)) == asyncio.run(collect(105, 8))
+
+
+def test_concurrent_misses_are_coalesced():
+    import asyncio
+    from backend import api_handle
+    calls = {"n": 0}
+
+    async def run():
+        async def slow_fail():
+            calls["n"] += 1
+            await asyncio.sleep(0.05)
+            raise httpx.RequestError("boom", request=httpx.Request("GET", UPSTREAM_URL))
+
+        before = api_handle.cache_stats()["coalesced"]
+        results = await asyncio.gather(*[api_handle.cache_get_or_compute("sf:test", slow_fail, 60) for _ in range(5)],
+                                       return_exceptions=True)
+        assert all(isinstance(r, httpx.RequestError) for r in results)
+        assert calls["n"] == 1 and api_handle.cache_stats()["coalesced"] - before == 4
+        assert await api_handle.cache_get("sf:test") is None   # failures are not cached
+
+        async def slow_ok():
+            calls["n"] += 1
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+        results = await asyncio.gather(*[api_handle.cache_get_or_compute("sf:test", slow_ok, 60) for _ in range(5)])
+        assert results == [{"ok": True}] * 5 and calls["n"] == 2
+
+    asyncio.run(run())
+
+
+def test_stale_entry_served_while_refreshing(monkeypatch):
+    import asyncio
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(100, stale_ttl=60))
+
+    async def run():
+        api_handle._mem_cache.set("swr:test2", "old", ttl=-1)   # expired a second ago -> stale
+
+        async def fresh():
+            await asyncio.sleep(0.01)
+            return "new"
+        assert await api_handle.cache_get_or_compute("swr:test2", fresh, 60) == "old"
+        await asyncio.sleep(0.05)
+        assert await api_handle.cache_get("swr:test2") == "new"
+
+    asyncio.run(run())
+
+
+def test_posts_and_anomalies_stream_ndjson(upstream, make_posts):
+    import json
+    client, _ = upstream(make_posts(120, users=2, cycle=3))
+    r = client.get("/posts?limit=70&offset=15&cache=false", headers={"Accept": "application/x-ndjson"})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert [p["id"] for p in lines[:-1]] == list(range(16, 86))
+    assert lines[-1]["meta"]["source_total"] == "120"
+
+    plain = client.get("/anomalies?max_scan=120&method=exact").json()
+    r = client.get("/anomalies?max_scan=120&method=exact&stream=true&cache=false")
+    sections = [json.loads(l) for l in r.text.splitlines()]
+    assert [next(iter(s)) for s in sections] == ["short_titles", "duplicate_titles", "suspicious_users", "meta"]
+    merged = {k: v for s in sections for k, v in s.items()}
+    assert merged == plain
+
+
+def test_stream_upstream_error_is_502(monkeypatch):
+    async def raises_request_error(*args, **kwargs):
+        raise httpx.RequestError("down", request=httpx.Request("GET", UPSTREAM_URL))
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state.client, "get", raises_request_error, raising=True)
+        r = client.get("/posts?limit=5&cache=false&stream=true")
+        assert r.status_code == 502
+
+
+def test_metrics_endpoint_and_server_timing(upstream, make_posts):
+    client, _ = upstream(make_posts(40, users=2, cycle=3))
+    r = client.get("/anomalies?max_scan=40&method=fuzzy&cache=false")
+    assert r.status_code == 200
+    stages = [p.split(";")[0] for p in r.headers["server-timing"].split(", ")]
+    assert {"corpus", "index", "short_titles", "duplicates", "similarity", "total"} <= set(stages)
+
+    text = client.get("/metrics").text
+    assert 'analytics_stage_duration_seconds_count{stage="similarity",method="fuzzy"}' in text
+    assert 'http_request_duration_seconds_count{path="/anomalies",status="200"}' in text
+    assert "upstream_request_duration_seconds_bucket" in text
+    assert 'cache_requests_total{result="misses"}' in text
+
+
+def test_cached_bodies_are_pre_encoded_and_negotiated(monkeypatch, upstream, make_posts):
+    import gzip, json
+    from backend import api_handle
+    from backend.encoding import Encoded
+    client, _ = upstream(make_posts(60, users=2, cycle=3))
+    monkeypatch.setattr(api_handle, "RESPONSE_GZIP_MIN", 256)
+    plain = client.get("/summary?max_scan=60", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and "Accept-Encoding" in plain.headers["vary"]
+    version = plain.json()["meta"]["corpus_version"]
+    cached = api_handle._mem_cache.get(f"summary:{version}:3:True:60")
+    assert isinstance(cached, Encoded) and plain.content == cached.body
+
+    r = client.get("/summary?max_scan=60", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(cached.gz)) == r.json() == plain.json()
+
+
+def test_overlapping_slices_reuse_page_blocks(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "CHUNK_LIMIT", 20)
+    monkeypatch.setattr(api_handle, "SCAN_MAX", 1000)
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(1000))
+    client, calls = upstream(make_posts(237, users=1, title="t{}"))
+    before = api_handle.block_stats()
+    r = client.get("/posts?limit=50&offset=5")
+    assert [p["id"] for p in r.json()["data"]] == list(range(6, 56))
+    assert calls["n"] == 3    # blocks 0..2
+    for off in (0, 10, 20, 30, 40):
+        assert [p["id"] for p in client.get(f"/posts?limit=10&offset={off}").json()["data"]] == list(range(off + 1, off + 11))
+    assert calls["n"] == 3    # pagination inside cached blocks stays off upstream
+    r = client.get("/posts?limit=40&offset=220")
+    assert [p["id"] for p in r.json()["data"]] == list(range(221, 238))
+    assert calls["n"] == 4    # only block 11; X-Total-Count stops before block 12
+    after = api_handle.block_stats()
+    assert after["misses"] - before["misses"] == 4 and after["hits"] - before["hits"] == 5
+    assert client.get("/stats").json()["blocks"] == after
+
+
+def test_breaker_fails_fast_and_serves_stale_corpus(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "UPSTREAM_BACKOFF", 0.001)
+    client, _ = upstream(make_posts(40, users=1))
+    ok = client.get("/summary?max_scan=40&cache=false").json()
+
+    calls = {"n": 0}
+    async def down(*args, **kwargs):
+        calls["n"] += 1
+        raise httpx.ConnectError("down", request=httpx.Request("GET", UPSTREAM_URL))
+    monkeypatch.setattr(app.state.client, "get", down, raising=True)
+    monkeypatch.setattr(app.state.corpus, "refresh_interval", 0.001)   # snapshot now counts as stale
+
+    assert client.get("/posts?limit=5&offset=100&cache=false").status_code == 502
+    assert client.get("/posts?limit=5&offset=150&cache=false").status_code == 502
+    assert app.state.breaker.state == "open" and calls["n"] == 5
+    r = client.get("/posts?limit=5&offset=200&cache=false")
+    assert r.status_code == 502 and "circuit" in r.json()["detail"] and calls["n"] == 5
+
+    assert client.get("/summary?max_scan=40&cache=false").json() == ok   # old snapshot, no upstream
+    stats = client.get("/stats").json()["upstream"]
+    assert stats["breaker"]["state"] == "open" and stats["corpus_stale_served"] == 1
+    assert 'upstream_breaker_state{state="open"} 1' in client.get("/metrics").text
+
+
+def test_anomalies_thresholds_reuse_similarity_graph(upstream):
+    posts = [{"userId": 1 + i % 2, "id": i + 1, "title": f"lorem ipsum dolor {i % 7} sit {i % 3}", "body": "b"}
+             for i in range(80)]
+    client, _ = upstream(posts)
+    base = "/anomalies?max_scan=80&method=cosine&suspicious_threshold=1"
+    first = client.get(base + "&similar_threshold=0.5").json()
+    assert first["meta"]["similarity_graph"]["reused"] is False
+    moved = client.get(base + "&similar_threshold=0.8").json()
+    assert moved["meta"]["similarity_graph"]["reused"] is True
+
+    sweep = client.get(base + "&similar_threshold=0.5&thresholds=0.8,0.5,1").json()
+    assert sweep["suspicious_users"] == first["suspicious_users"]
+    assert sweep["suspicious_users_by_threshold"]["0.8"] == moved["suspicious_users"]
+    assert sweep["suspicious_users_by_threshold"]["0.5"] == first["suspicious_users"]
+    assert set(sweep["suspicious_users_by_threshold"]) == {"0.8", "0.5", "1.0"}
+    assert client.get(base + "&thresholds=0.5,abc").status_code == 422
+    assert client.get(base + "&thresholds=1.5").status_code == 422
+
+
+def test_snapshot_warm_start_serves_without_upstream(monkeypatch, fake_upstream, tmp_path):
+    from backend import api_handle
+    posts = [{"userId": 1 + i % 2, "id": i + 1, "title": f"lorem ipsum {i % 5}", "body": "b"} for i in range(40)]
+    monkeypatch.setattr(api_handle, "SNAPSHOT_PATH", str(tmp_path / "corpus.snap"))
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(1000))
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state.client, "get", fake_upstream(posts, {"n": 0}), raising=True)
+        anoms = client.get("/anomalies?max_scan=40").json()
+        summary = client.get("/summary?max_scan=40").json()
+    assert os.path.getsize(tmp_path / "corpus.snap") > 0   # saved on shutdown
+
+    # fresh process: empty response cache, upstream down
+    calls = {"n": 0}
+    async def down(self, *args, **kwargs):
+        calls["n"] += 1
+        raise httpx.ConnectError("down", request=httpx.Request("GET", UPSTREAM_URL))
+    monkeypatch.setattr(httpx.AsyncClient, "get", down)
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(1000))
+    with TestClient(app) as client:
+        info = client.get("/stats").json()["snapshot"]
+        assert info["loaded"] is True and info["posts"] == 40 and info["entries"] == 2
+        hits = api_handle.cache_stats()["hits"]
+        assert client.get("/anomalies?max_scan=40").json() == anoms
+        assert api_handle.cache_stats()["hits"] == hits + 1
+        assert client.get("/summary?max_scan=40&cache=false").json() == summary   # restored corpus
+
+
+def test_refresh_recomputes_only_changed_users(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    posts = make_posts(60, users=4, title="lorem ipsum {} dolor", cycle=6)
+    monkeypatch.setattr(api_handle, "SCAN_MAX", 100)
+    client, _ = upstream(posts)
+    monkeypatch.setattr(app.state.corpus, "_scan_max", 100)
+    client.get("/summary?max_scan=100")
+    client.get("/anomalies?max_scan=100&method=cosine")
+    before = api_handle.incremental_stats()
+
+    posts[4]["title"] = "a different title"         # user 1
+    posts.append({"userId": 3, "id": 61, "title": "lorem ipsum 1 dolor", "body": "b"})
+    client.portal.call(app.state.corpus.refresh)
+    summary = client.get("/summary?max_scan=100").json()
+    anoms = client.get("/anomalies?max_scan=100&method=cosine").json()
+    after = api_handle.incremental_stats()
+    assert after["advanced"] - before["advanced"] == 2
+    assert after["users_recomputed"] - before["users_recomputed"] == 4   # {1, 3} for each endpoint
+    assert anoms["meta"]["similarity_graph"]["reused"] is True
+
+    assert summary == client.get("/summary?max_scan=100&cache=false").json()
+    full = client.get("/anomalies?max_scan=100&method=cosine&cache=false").json()
+    assert anoms["suspicious_users"] == full["suspicious_users"] and anoms["duplicate_titles"] == full["duplicate_titles"]
+    assert client.get("/stats").json()["incremental"]["states"]["items"] >= 2
+
+
+def test_search_endpoint_rebuilds_on_refresh(upstream, make_posts):
+    import time
+    posts = make_posts(30, body="dolor sit amet")
+    client, _ = upstream(posts)
+    r = client.get("/search?q=lorem 7&max_scan=30").json()
+    assert r["total"] == 1 and r["data"][0]["id"] == 8 and r["meta"]["stale"] is False
+    r = client.get("/search?q=dolor&userId=2&limit=3&offset=2&max_scan=30").json()
+    assert r["total"] == 10 and [p["userId"] for p in r["data"]] == [2, 2, 2]
+    assert client.get("/search?q=et&max_scan=30").status_code == 422   # stopwords only
+    assert client.get("/search?max_scan=30").status_code == 422
+
+    posts[0]["title"] = "zebra crossing"
+    client.portal.call(app.state.corpus.refresh)
+    for _ in range(100):   # the old index answers until the rebuild lands
+        r = client.get("/search?q=zebra&max_scan=30").json()
+        if not r["meta"]["stale"]:
+            break
+        assert r["total"] == 0
+        time.sleep(0.02)
+    assert r["total"] == 1 and r["data"][0]["id"] == 1
+    assert client.get("/stats").json()["search"]["builds"] >= 2
+
+
+def test_dashboard_bundles_sections_under_endpoint_keys(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    posts = make_posts(45, title="lorem ipsum dolor {}", cycle=4)
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(1000))
+    client, _ = upstream(posts)
+    r = client.get("/dashboard?max_scan=50&posts_limit=10&userId=2&method=exact&top_n_users=2")
+    assert r.status_code == 200
+    body = r.json()
+    assert set(body) == {"posts", "anomalies", "summary", "meta"}
+    assert set(body["meta"]["timings"]) == {"corpus", "posts", "anomalies", "summary"}
+    assert all(t["cache"] == "miss" for k, t in body["meta"]["timings"].items() if k != "corpus")
+    assert [p["id"] for p in body["posts"]["data"]] == list(range(2, 31, 3))
+    assert body["posts"]["meta"]["source_total"] == "15"   # complete scan: cut from the snapshot
+
+    _, calls = upstream(posts)
+    hits = api_handle.cache_stats()["hits"]
+    assert client.get("/posts?limit=10&offset=0&userId=2").json() == body["posts"]
+    assert client.get("/anomalies?max_scan=50&method=exact").json() == body["anomalies"]
+    assert client.get("/summary?max_scan=50&top_n_users=2").json() == body["summary"]
+    assert api_handle.cache_stats()["hits"] == hits + 3 and calls["n"] == 0
+
+    again = client.get("/dashboard?max_scan=50&posts_limit=0&method=exact&top_n_users=2").json()
+    assert "posts" not in again and again["meta"]["timings"]["summary"]["cache"] == "hit"
+
+
+def test_anomalies_cross_user_clusters_opt_in(upstream, make_posts):
+    posts = make_posts(40, users=4, title="lorem ipsum {} dolor", body="body {}")
+    posts += [{"userId": 5 + k, "id": 50 + k, "title": "Claim your prize now", "body": "visit the link to claim it"}
+              for k in range(3)]
+    client, _ = upstream(posts)
+    plain = client.get("/anomalies?max_scan=43").json()
+    assert "cross_user_clusters" not in plain and "cross_user" not in plain["meta"]
+    body = client.get("/anomalies?max_scan=43&cross_user=true").json()
+    assert [c["postIds"] for c in body["cross_user_clusters"]] == [[50, 51, 52]]
+    assert body["meta"]["cross_user"]["clusters"] == 1
+    assert client.get("/anomalies?max_scan=43&cross_user=true&cross_user_min_users=4").json()["cross_user_clusters"] == []
+    dash = client.get("/dashboard?max_scan=43&posts_limit=0&cross_user=true").json()
+    assert dash["anomalies"]["cross_user_clusters"] == body["cross_user_clusters"]
+
+
+def test_etags_answer_304_without_recomputing(upstream, make_posts):
+    posts = make_posts(30, title="lorem ipsum dolor sit {}", cycle=5)
+    client, _ = upstream(posts)
+    for path in ("/anomalies?max_scan=30", "/summary?max_scan=30", "/posts?limit=5",
+                 "/dashboard?max_scan=30&posts_limit=5"):
+        first = client.get(path)
+        etag = first.headers["etag"]
+        assert etag.startswith("W/") == path.startswith(("/dashboard", "/anomalies"))
+        _, calls = upstream(posts)
+        again = client.get(path, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+        assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+        assert calls["n"] == 0
+
+    # a gzip representation has its own tag, and either one revalidates
+    gz = client.get("/anomalies?max_scan=30&similar_threshold=0.1", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/anomalies?max_scan=30&similar_threshold=0.1", headers={"Accept-Encoding": "identity"})
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.headers["etag"] == plain.headers["etag"][:-1] + '-gz"'
+    assert client.get("/anomalies?max_scan=30&similar_threshold=0.1",
+                      headers={"If-None-Match": gz.headers["etag"]}).status_code == 304
+
+    # a new corpus version changes the tag
+    before = client.get("/summary?max_scan=30").headers["etag"]
+    posts[0]["title"] = "a brand new title"
+    client.portal.call(app.state.corpus.refresh)
+    assert client.get("/summary?max_scan=30", headers={"If-None-Match": before}).status_code == 200
+
+
+def test_upstream_pages_revalidated_with_conditional_gets(upstream, make_posts):
+    posts = make_posts(100, title="title {}")
+    client, calls = upstream(posts, etags=True)
+    client.get("/anomalies?max_scan=100")
+    pages = calls["n"]
+    client.portal.call(app.state.corpus.refresh)
+    assert calls["n"] == 2 * pages and calls["not_modified"] == pages
+    assert app.state.corpus.snapshot.corpus.titles[0] == "title 0"
+
+    posts[0]["title"] = "changed"   # only the first page's tag changes
+    client.portal.call(app.state.corpus.refresh)
+    assert calls["not_modified"] == 2 * pages - 1
+    assert app.state.corpus.snapshot.corpus.titles[0] == "changed"
+    assert client.get("/stats").json()["upstream"]["pages"]["not_modified"] >= 2 * pages - 1
+
+
+def test_search_upstream_failure_is_502(monkeypatch):
+    async def raises_request_error(*args, **kwargs):
+        raise httpx.RequestError("down", request=httpx.Request("GET", UPSTREAM_URL))
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state.client, "get", raises_request_error, raising=True)
+        r = client.get("/search?q=lorem&max_scan=7")
+        assert r.status_code == 502 and "Upstream error" in r.json()["detail"]
+
+
+def test_analytics_cold_start_with_breaker_open_fails_fast(monkeypatch):
+    calls = {"n": 0}
+
+    async def down(*args, **kwargs):
+        calls["n"] += 1
+        raise httpx.ConnectError("down", request=httpx.Request("GET", UPSTREAM_URL))
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state.client, "get", down, raising=True)
+        for _ in range(app.state.breaker.failure_threshold):
+            app.state.breaker.record_failure()
+        for path in ("/anomalies?max_scan=7", "/summary?max_scan=7"):
+            r = client.get(path)
+            assert r.status_code == 502 and "circuit" in r.json()["detail"]
+        assert calls["n"] == 0
+
+
+def test_parallel_scan_survives_capped_page_size(upstream, make_posts):
+    from backend import api_handle
+
+    async def scan(concurrency):
+        rows = []
+        async for page, _ in api_handle.iter_pages({}, 0, 50, 200, concurrency):
+            rows.extend(page)
+        return [p["id"] for p in rows]
+
+    client, _ = upstream(make_posts(200, users=10, title="t{}", body=""), page_cap=20)   # at most 20 rows per page
+    assert client.portal.call(scan, 4) == client.portal.call(scan, 1) == list(range(1, 201))
+
+
+def test_posts_blocks_fill_past_capped_page_size(upstream, make_posts):
+    client, _ = upstream(make_posts(200, users=10, title="t{}", body=""), page_cap=20)
+    body = client.get("/posts?limit=200&offset=0&cache=false").json()
+    assert [p["id"] for p in body["data"]] == list(range(1, 101))   # SCAN_MAX caps the slice
+    assert [p["id"] for p in client.get("/posts?limit=30&offset=40").json()["data"]] == list(range(41, 71))
+
+
+def test_dashboard_upstream_5xx_is_502(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "UPSTREAM_BACKOFF", 0.001)
+    client, _ = upstream(make_posts(30), status=500)
+    for path in ("/dashboard?max_scan=30", "/dashboard?max_scan=30&posts_limit=0"):
+        r = client.get(path)
+        assert r.status_code == 502 and "Upstream error" in r.json()["detail"]
+
+
+def test_upstream_5xx_is_502_on_every_corpus_endpoint(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "UPSTREAM_BACKOFF", 0.001)
+    client, _ = upstream(make_posts(30), status=503)
+    for path in ("/search?q=lorem&max_scan=30", "/anomalies?max_scan=30", "/summary?max_scan=30",
+                 "/posts?limit=5&cache=false"):
+        r = client.get(path)
+        assert r.status_code == 502 and "Upstream error" in r.json()["detail"]
+
+
+def test_dashboard_cuts_posts_from_a_scan_of_exactly_scan_max(upstream, make_posts):
+    from backend import api_handle
+    posts = make_posts(api_handle.SCAN_MAX)   # the JSONPlaceholder shape: 100 posts, SCAN_MAX=100
+    client, calls = upstream(posts)
+    r = client.get(f"/dashboard?posts_limit=200&max_scan={api_handle.SCAN_MAX}&cache=false")
+    assert r.status_code == 200 and "etag" in r.headers
+    assert calls["n"] == api_handle.SCAN_MAX // api_handle.CHUNK_LIMIT   # one scan, no second pass for posts
+    assert r.json()["posts"] == client.get("/posts?limit=200&cache=false").json()
+
+
+def test_dashboard_posts_section_is_capped_like_posts(upstream, make_posts):
+    from backend import api_handle
+    # a scan larger than SCAN_MAX still caps the posts section, as /posts does under the same key
+    client, _ = upstream(make_posts(150))
+    body = client.get("/dashboard?posts_limit=200&max_scan=150&cache=false").json()
+    assert len(body["posts"]["data"]) == api_handle.SCAN_MAX
+    assert body["posts"] == client.get("/posts?limit=200&cache=false").json()
+
+
+def test_block_lookups_are_single_and_count_stale(monkeypatch, upstream, make_posts):
+    from backend import api_handle
+    monkeypatch.setattr(api_handle, "_mem_cache", api_handle.TTLCache(100, stale_ttl=60))
+    lookups = []
+    lookup = api_handle.cache_lookup
+
+    async def counting(key):
+        lookups.append(key)
+        return await lookup(key)
+    monkeypatch.setattr(api_handle, "cache_lookup", counting)
+    client, calls = upstream(make_posts(40, users=1, title="t{}"))
+    before = api_handle.block_stats()
+    client.get("/posts?limit=10&cache=false")
+    client.get("/posts?limit=10&offset=10")                  # block 0 cached: one lookup, a hit
+    key = api_handle.block_key(None, 0)
+    assert lookups.count(key) == 1
+    api_handle._mem_cache.set(key, api_handle._mem_cache.get(key), ttl=-1)   # now stale
+    client.get("/posts?limit=10&offset=20")
+    after = api_handle.block_stats()
+    assert [after[k] - before[k] for k in ("hits", "stale", "misses")] == [1, 1, 0]
+
+
+def test_half_open_probe_answered_with_4xx_closes_the_breaker(upstream, make_posts):
+    import time
+    client, _ = upstream(make_posts(10), status=404)
+    breaker = app.state.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout   # reset window over: next call probes
+    assert client.get("/posts?limit=5&cache=false").status_code == 502
+    assert breaker.state == "closed"                # a 4xx is our request, not upstream trouble
+    client, _ = upstream(make_posts(10))
+    assert client.get("/posts?limit=5&cache=false").status_code == 200
@@ -0,0 +1,74 @@
+import asyncio, json, zlib
+import httpx
+import pytest
+
+from fastapi.testclient import TestClient
+
+from backend.api_handle import app
+
+
+def _fake_get(posts, calls, delay=0.0, etags=False, status=200, page_cap=None):
+    """
+    Stand-in for app.state.client.get that honors _start/_limit/userId and X-Total-Count.
+    etags=True also sends a per-page ETag and answers a matching If-None-Match with 304;
+    status >= 400 answers every GET with that status instead; page_cap serves at most that many rows
+    per page whatever _limit asks for.
+    """
+    async def get(url, params=None, headers=None, **kwargs):
+        calls["n"] += 1
+        params = params or {}
+        calls.setdefault("params", []).append(dict(params))
+        if delay:
+            await asyncio.sleep(delay)
+        if status >= 400:
+            return httpx.Response(status, json={"error": "upstream"}, request=httpx.Request("GET", url))
+        rows = [p for p in posts if "userId" not in params or p["userId"] == int(params["userId"])]
+        start = int(params.get("_start", 0))
+        limit = int(params.get("_limit", len(rows)))
+        rows_out = rows[start:start + (limit if page_cap is None else min(limit, page_cap))]
+        out_headers = {"X-Total-Count": str(len(rows))}
+        if etags:
+            out_headers["ETag"] = f'"{zlib.crc32(json.dumps(rows_out).encode())}"'
+            if (headers or {}).get("If-None-Match") == out_headers["ETag"]:
+                calls["not_modified"] = calls.get("not_modified", 0) + 1
+                return httpx.Response(304, headers={"ETag": out_headers["ETag"]}, request=httpx.Request("GET", url))
+        return httpx.Response(200, json=rows_out, headers=out_headers, request=httpx.Request("GET", url))
+    return get
+
+
+def _make_posts(n, users=3, title="lorem ipsum {}", body="b", cycle=0):
+    """
+    n posts (ids 1..n, users 1..`users` round-robin); title is formatted with i % cycle (or i), body with i.
+    """
+    return [{"userId": 1 + i % users, "id": i + 1, "title": title.format(i % cycle if cycle else i),
+             "body": body.format(i)} for i in range(n)]
+
+
+@pytest.fixture
+def fake_upstream():
+    return _fake_get
+
+
+@pytest.fixture
+def make_posts():
+    return _make_posts
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    serve(posts, **kw) -> (client, calls): a started TestClient whose upstream GETs are answered
+    from `posts` by _fake_get (kw as there). Calling it again re-points the same client, with fresh calls.
+    """
+    clients = []
+
+    def serve(posts, **kwargs):
+        if not clients:
+            clients.append(TestClient(app).__enter__())
+        calls = {"n": 0}
+        monkeypatch.setattr(app.state.client, "get", _fake_get(posts, calls, **kwargs), raising=True)
+        return clients[0], calls
+
+    yield serve
+    for client in clients:
+        client.__exit__(None, None, None)
@@ -0,0 +1,119 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.api_handle import app
+from backend.corpus import CorpusStore, corpus_version
+
+
+POSTS = [{"userId": 1 + i % 3, "id": i + 1, "title": f"title number {i % 7}", "body": "lorem"} for i in range(30)]
+
+
+def test_corpus_version_tracks_content():
+    a = corpus_version(POSTS)
+    assert a == corpus_version([dict(p) for p in POSTS])
+    changed = [dict(p) for p in POSTS]
+    changed[0]["title"] = "something else"
+    assert corpus_version(changed) != a
+
+
+def test_store_loads_once_and_grows_on_demand():
+    loads = []
+
+    async def loader(n):
+        loads.append(n)
+        return POSTS[:n], len(POSTS)
+
+    async def run():
+        store = CorpusStore(loader, scan_max=10, refresh_interval=0)
+        s1 = await store.get(5)
+        s2 = await store.get(10)
+        assert s1 is s2 and len(s2.view(5)) == 5
+        s3 = await store.get(20)  # needs more than the snapshot holds
+        assert len(s3.corpus) == 20
+        s4 = await store.get(500)  # upstream exhausted at 30
+        s5 = await store.get(1000)
+        assert s4 is s5 and s4.complete
+        # the oversized scans were one-offs: refreshes stay at the configured scan_max
+        assert len((await store.refresh()).corpus) == 10
+    asyncio.run(run())
+    assert loads == [10, 20, 500, 10]
+
+
+def test_oversized_scans_are_shared_and_never_roll_back():
+    loads = []
+    gate = None
+
+    async def loader(n):
+        loads.append(n)
+        if n > 10:
+            await gate.wait()
+        return [dict(p, title=f"{p['title']} v{len(loads)}") for p in POSTS[:n]], len(POSTS)
+
+    async def run():
+        nonlocal gate
+        gate = asyncio.Event()
+        store = CorpusStore(loader, scan_max=10, refresh_interval=0)
+        await store.get(10)
+        waiters = [asyncio.create_task(store.get(25)) for _ in range(8)]
+        while 25 not in loads:
+            await asyncio.sleep(0)
+        newer = await store.refresh()            # lands while the oversized scan is in flight
+        gate.set()
+        snaps = await asyncio.gather(*waiters)
+        assert all(s is snaps[0] for s in snaps) and len(snaps[0].corpus) == 25
+        assert store.snapshot is newer           # the older oversized scan was not installed
+    asyncio.run(run())
+    assert loads == [10, 25, 10]
+
+
+def test_analytics_endpoints_share_one_scan(upstream):
+    client, calls = upstream(POSTS)
+    r1 = client.get("/anomalies?similar_threshold=0.5&max_scan=30")
+    scanned = calls["n"]
+    r2 = client.get("/anomalies?similar_threshold=0.8&max_scan=30")
+    r3 = client.get("/summary?top_n_users=2&max_scan=30")
+    assert r1.status_code == r2.status_code == r3.status_code == 200
+    assert calls["n"] == scanned
+    assert r1.json()["meta"]["corpus_version"] == r3.json()["meta"]["corpus_version"]
+
+
+def test_compact_corpus_round_trip_and_head():
+    from backend.corpus import CompactCorpus
+    from backend.utils import normalize_title, tokenize
+    c = CompactCorpus.from_posts(POSTS)
+    assert list(c.posts()) == POSTS
+    assert c.norms == [normalize_title(p["title"]) for p in POSTS]
+    assert [c.words[t] for t in c.token_ids(3)] == tokenize(POSTS[3]["title"], drop_stops=False)
+    h = c.head(10)
+    assert len(h) == 10 and list(h.posts()) == POSTS[:10] and c.head(99) is c
+    # identical titles share one string; a rebuild reuses the previous snapshot's work
+    assert c.titles[0] is c.titles[7]
+    again = CompactCorpus.from_posts([dict(p) for p in POSTS], prev=c)
+    assert again.titles[0] is c.titles[0] and again.vocab == c.vocab
+
+
+def test_snapshot_delta_lists_changed_users():
+    from backend.corpus import CorpusSnapshot
+    old = CorpusSnapshot(POSTS, 100)
+    posts = [dict(p) for p in POSTS]
+    posts[0]["title"] = "renamed"                      # user 1
+    posts[1]["body"] = "body only"                     # user 2: ignored
+    posts[2]["userId"] = 1                              # moved 3 -> 1
+    del posts[5]                                        # removed: user 3
+    posts.append({"userId": 9, "id": 99, "title": "new", "body": ""})
+    new = CorpusSnapshot(posts, 100, prev=old)
+    assert new.base == old.version and new.delta == {1, 3, 9}
+    assert new.delta_since(old.version, len(POSTS), 100) == {1, 3, 9}
+    assert new.delta_since(old.version, len(POSTS), 10) is None     # partial view
+    assert new.delta_since("other", len(POSTS), 100) is None
+    assert new.delta_since(new.version, len(posts), 100) == frozenset()
+
+    swapped = [dict(p) for p in POSTS]
+    swapped[0], swapped[3] = swapped[3], swapped[0]     # both user 1: per-user order changed
+    assert CorpusSnapshot(swapped, 100, prev=old).delta == {1}
+
+
+def test_max_scan_is_bounded():
+    with TestClient(app) as client:
+        assert client.get("/summary?max_scan=100000000").status_code == 422
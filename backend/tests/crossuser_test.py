@@ -0,0 +1,41 @@
+from backend.corpus import CompactCorpus
+from backend.crossuser import cross_user_clusters, signature_perm
+
+TEMPLATE = ("Claim your free cookie cutter set today",
+            "click the link below to claim your free set before the offer ends tonight")
+
+
+def make_posts():
+    posts = [{"userId": 1 + i % 6, "id": i + 1, "title": f"lorem {i} ipsum dolor {i * 7}",
+              "body": f"sed {i} quia {i * 3} magnam {i * 11} est"} for i in range(60)]
+    for k in range(5):   # one template from five accounts, one copy lightly edited
+        posts.append({"userId": 10 + k, "id": 100 + k, "title": TEMPLATE[0],
+                      "body": TEMPLATE[1] + (" now" if k == 4 else "")})
+    # a user repeating themselves is per-user duplication, not a cross-user cluster
+    posts += [{"userId": 1, "id": 200 + k, "title": "my weekly update", "body": "same words every week"} for k in range(4)]
+    return posts
+
+
+def test_finds_template_spanning_users():
+    clusters, stats = cross_user_clusters(CompactCorpus.from_posts(make_posts()), threshold=0.7)
+    assert [(c["postIds"], c["userIds"], c["count"], c["users"]) for c in clusters] == [
+        ([100, 101, 102, 103, 104], [10, 11, 12, 13, 14], 5, 5)]
+    assert clusters[0]["rep_title"] == TEMPLATE[0]
+    assert stats["clusters"] == 1 and stats["verified_pairs"] <= stats["candidate_pairs"]
+
+
+def test_size_and_user_thresholds():
+    corpus = CompactCorpus.from_posts(make_posts())
+    assert cross_user_clusters(corpus, threshold=0.7, min_users=6)[0] == []
+    solo = cross_user_clusters(corpus, threshold=0.7, min_users=1)[0]
+    assert [c["postIds"] for c in solo] == [[100, 101, 102, 103, 104], [200, 201, 202, 203]]
+    # the edited copy drops out at threshold 1.0
+    assert cross_user_clusters(corpus, threshold=1.0, min_size=5)[0] == []
+
+
+def test_memory_budget_shrinks_then_skips():
+    assert signature_perm(100_000, 1 << 30, 4) == 64
+    assert signature_perm(100_000, 16 << 20, 4) == 28
+    assert signature_perm(100_000, 8 << 20, 4) == 0
+    clusters, stats = cross_user_clusters(CompactCorpus.from_posts(make_posts()), memory_bytes=1024)
+    assert clusters == [] and "skipped" in stats
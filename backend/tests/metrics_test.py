@@ -0,0 +1,26 @@
+from backend.metrics import Registry, server_timing_header
+
+
+def test_counter_and_histogram_render():
+    reg = Registry()
+    c = reg.counter("jobs_total", "Jobs", ("kind",))
+    c.inc(1, "a")
+    c.inc(2, "a")
+    c.inc(1, 'q"x')
+    h = reg.histogram("lat_seconds", "Latency", buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 3.0):
+        h.observe(v)
+    reg.collector(lambda: [("pending", "gauge", "Pending", {(("pool", "p"),): 4})])
+    lines = reg.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="a"} 3' in lines
+    assert 'jobs_total{kind="q\\"x"} 1' in lines
+    assert 'lat_seconds_bucket{le="0.1"} 1' in lines
+    assert 'lat_seconds_bucket{le="1.0"} 2' in lines
+    assert 'lat_seconds_bucket{le="+Inf"} 3' in lines
+    assert "lat_seconds_count 3" in lines
+    assert 'pending{pool="p"} 4' in lines
+
+
+def test_server_timing_header():
+    assert server_timing_header([("corpus", 0.0015)], 0.002) == "corpus;dur=1.50, total;dur=2.00"
@@ -0,0 +1,49 @@
+import os, time
+
+import pytest
+
+from backend.corpus import CorpusSnapshot
+from backend.encoding import Encoded
+from backend.persist import SnapshotError, load_snapshot, save_snapshot, snapshot_entries
+
+
+POSTS = [{"userId": 1 + i % 3, "id": i + 1, "title": f"título {i % 7} — lorem", "body": "b"} for i in range(50)]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "corpus.snap")
+    snap = CorpusSnapshot(POSTS, 50, total=50)
+    enc = Encoded.encode({"a": [1, 2]}, gzip_min=1)
+    entries = snapshot_entries([(f"anoms:{snap.version}:x", enc), ("anoms:old:x", enc),
+                                (f"summary:{snap.version}:y", {"not": "encoded"})], snap.version)
+    assert [k for k, _ in entries] == [f"anoms:{snap.version}:x"]
+    save_snapshot(path, snap, entries, "up")
+
+    loaded, got = load_snapshot(path, "up", max_age=60)
+    assert loaded.version == snap.version and loaded.scan_max == 50 and loaded.total == 50 and loaded.complete
+    assert loaded.fetched_at == snap.fetched_at
+    assert list(loaded.corpus.posts()) == list(snap.corpus.posts())
+    assert list(got) == [f"anoms:{snap.version}:x"]
+    assert got[f"anoms:{snap.version}:x"].data() == {"a": [1, 2]}
+    assert got[f"anoms:{snap.version}:x"].gz == enc.gz
+    assert not [f for f in os.listdir(tmp_path) if ".tmp" in f]
+
+
+def test_snapshot_rejects_unusable_files(tmp_path):
+    path = str(tmp_path / "corpus.snap")
+    with pytest.raises(FileNotFoundError):
+        load_snapshot(path, "up")
+    snap = CorpusSnapshot(POSTS, 50)
+    snap.fetched_at = time.time() - 120
+    save_snapshot(path, snap, [], "up")
+    with pytest.raises(SnapshotError, match="different upstream"):
+        load_snapshot(path, "elsewhere")
+    with pytest.raises(SnapshotError, match="older"):
+        load_snapshot(path, "up", max_age=60)
+    load_snapshot(path, "up", max_age=600)
+
+    data = bytearray(open(path, "rb").read())
+    data[-3] ^= 0xFF
+    open(path, "wb").write(bytes(data))
+    with pytest.raises(SnapshotError, match="corrupt"):
+        load_snapshot(path, "up")
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from backend.resilience import CircuitBreaker, CircuitOpen, Hedger, ScanDeadlineExceeded, backoff_delay, remaining
+
+
+def test_breaker_opens_fails_fast_and_probes():
+    b = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        b.check(now=0); b.record_failure(now=0)
+    b.record_success()                              # success resets the consecutive count
+    for _ in range(3):
+        b.check(now=1); b.record_failure(now=1)
+    assert b.state == "open"
+    with pytest.raises(CircuitOpen):
+        b.check(now=5)
+    b.check(now=12)                                 # half-open: one probe goes through
+    with pytest.raises(CircuitOpen):
+        b.check(now=12)                             # ...and only one
+    b.record_failure(now=12)
+    assert b.state == "open" and b.info()["opened"] == 2
+    b.check(now=23); b.record_success()
+    assert b.state == "closed" and b.info()["rejected"] == 2
+
+
+def test_breaker_released_probe_lets_the_next_call_probe():
+    b = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    b.check(now=0); b.record_failure(now=0)
+    b.check(now=11)                                 # the probe
+    b.release_probe()                               # ended without a verdict
+    b.check(now=11)                                 # the next call may probe
+    assert b.state == "half_open" and b.info()["rejected"] == 0
+
+
+def test_hedger_duplicates_slow_request_and_first_success_wins():
+    calls = []
+
+    async def send():
+        calls.append(time.perf_counter())
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    h = Hedger(percentile=95, min_delay=0.02, min_samples=5)
+    for _ in range(5):
+        h.observe(0.01)
+    t0 = time.perf_counter()
+    assert asyncio.run(h.run(send)) == 2
+    assert time.perf_counter() - t0 < 0.3 and h.stats == {"hedged": 1, "hedge_wins": 1}
+
+
+def test_hedger_off_until_enough_samples():
+    h = Hedger(min_samples=20)
+    assert h.delay() is None
+
+    async def boom():
+        raise httpx.ConnectError("down")
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(h.run(boom))
+
+
+def test_backoff_is_jittered_and_capped_and_deadline_raises():
+    delays = [backoff_delay(5, 0.2, 1.0) for _ in range(200)]
+    assert all(0 <= d <= 1.0 for d in delays) and len(set(delays)) > 100
+    assert remaining(None) is None and remaining(time.monotonic() + 5) > 4
+    with pytest.raises(ScanDeadlineExceeded):
+        remaining(time.monotonic() - 1)
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import pytest
+
+from backend.corpus import CompactCorpus, CorpusSnapshot
+from backend.search import SearchIndex, SearchIndexHolder, QueryError, parse_query
+
+
+POSTS = [
+    {"userId": 1, "id": 1, "title": "Alpine lakes", "body": "hiking near alpine lakes and a river"},
+    {"userId": 1, "id": 2, "title": "River fishing", "body": "the river was calm"},
+    {"userId": 2, "id": 3, "title": "Alphabet soup", "body": "letters in soup"},
+    {"userId": 2, "id": 4, "title": "Lakes of the north", "body": "cold lakes, cold rivers"},
+    {"userId": 3, "id": 5, "title": "Nothing here", "body": "filler text"},
+]
+INDEX = SearchIndex.build(CompactCorpus.from_posts(POSTS), "v1")
+
+
+def ids(result):
+    return [p["id"] for p in result["data"]]
+
+
+def test_parse_query():
+    assert parse_query("Lakes river OR alp*") == [[("lakes", False), ("river", False)], [("alp", True)]]
+    assert parse_query("in* AND soup") == [[("in", True), ("soup", False)]]
+    with pytest.raises(QueryError):
+        parse_query("in et OR ut")
+
+
+def test_boolean_prefix_and_user_filter():
+    assert ids(INDEX.search("lakes")) == [1, 4]
+    assert ids(INDEX.search("lakes cold")) == [4]
+    assert set(ids(INDEX.search("soup OR fishing"))) == {2, 3}
+    assert set(ids(INDEX.search("alp*"))) == {1, 3}
+    assert set(ids(INDEX.search("river*"))) == {1, 2, 4}
+    assert ids(INDEX.search("lakes", user_id=2)) == [4]
+    assert INDEX.search("missing")["total"] == 0
+    assert ids(INDEX.search("lakes", max_rows=2)) == [1]
+
+
+def test_bm25_ranking_and_paging():
+    # title hits are boosted, so "river fishing" outranks a body-only mention
+    r = INDEX.search("river", limit=10)
+    assert ids(r)[0] == 2 and r["data"][0]["score"] > r["data"][1]["score"]
+    assert r["data"][0]["title"] == "River fishing" and r["data"][0]["body"] == "the river was calm"
+    full = ids(INDEX.search("river* OR lakes OR soup", limit=10))
+    assert ids(INDEX.search("river* OR lakes OR soup", offset=1, limit=2)) == full[1:3]
+    assert INDEX.search("lakes", offset=5)["data"] == []
+
+
+def test_holder_runs_one_build_at_a_time(monkeypatch):
+    real_build, running, built = SearchIndex.build, [], []
+
+    def slow_build(corpus, version):
+        running.append(version)
+        assert len(running) == 1
+        time.sleep(0.05)
+        running.pop()
+        built.append(version)
+        return real_build(corpus, version)
+    monkeypatch.setattr(SearchIndex, "build", staticmethod(slow_build))
+    s1, s2, s3 = (CorpusSnapshot(POSTS[:n], 100) for n in (5, 4, 3))
+
+    async def run():
+        holder = SearchIndexHolder()
+        first = asyncio.ensure_future(holder.get(s1))
+        await asyncio.sleep(0)
+        assert (await holder.get(s2)).version == s1.version   # waits on the running build
+        assert (await first).version == s1.version
+        assert (await holder.get(s3)).version == s1.version   # s2 building, s3 queued: stale answer
+        while holder._task is not None:
+            await holder._task
+        return holder
+    holder = asyncio.run(run())
+    assert built == [s1.version, s2.version, s3.version] and holder.index.version == s3.version
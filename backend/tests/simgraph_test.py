@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from backend import utils
+from backend.utils import (normalize_title, fuzzy_ratio, cosine_similarity_titles, shingle_set, lsh_buckets,
+                           _lsh_candidates, jaccard)
+from backend.simgraph import FuzzyScores, SimilarityGraph, similarity_floor, similarity_groups
+
+
+# -------------------- naive references: every pair scored, plain greedy passes --------------------
+def _first_match_greedy(items, t):
+    # fuzzy: each title joins the first group whose representative it matches
+    groups = []
+    for it in items:
+        for g in groups:
+            if fuzzy_ratio(it["norm"], normalize_title(g["rep_title"])) >= t:
+                g["postIds"].append(it["id"]); g["count"] += 1; break
+        else:
+            groups.append({"rep_title": it["raw"], "postIds": [it["id"]], "count": 1})
+    return [g for g in groups if g["count"] >= 2]
+
+
+def _dense_greedy(items, sim, t):
+    # cosine / minhash: each unassigned i takes every later unassigned j with sim >= t
+    assigned, groups = [False] * len(items), []
+    for i in range(len(items)):
+        if assigned[i]: continue
+        group = [i]; assigned[i] = True
+        for j in range(i + 1, len(items)):
+            if not assigned[j] and sim[i][j] >= t:
+                group.append(j); assigned[j] = True
+        if len(group) >= 2:
+            groups.append({"rep_title": items[group[0]]["raw"], "postIds": [items[k]["id"] for k in group], "count": len(group)})
+    return groups
+
+
+def _lsh_sim(items):
+    # shingle Jaccard for pairs sharing an LSH bucket, 0 for the rest (what the graph can see)
+    sets = [shingle_set(it["norm"]) for it in items]
+    buckets = lsh_buckets(sets)
+    sim = [[0.0] * len(items) for _ in items]
+    for i in range(len(items)):
+        for j in _lsh_candidates(i, buckets):
+            sim[i][j] = jaccard(sets[i], sets[j])
+    return sim
+
+
+REFERENCE = {"fuzzy": _first_match_greedy,
+             "cosine": lambda items, t: _dense_greedy(items, cosine_similarity_titles([it["norm"] for it in items]), t),
+             "minhash": lambda items, t: _dense_greedy(items, _lsh_sim(items), t)}
+
+
+def groups_at(items, method, t):
+    return similarity_groups(items, method, [t], similarity_floor([t]))[0][0][0]
+
+
+def _items(seed=5, n=160):
+    rng = random.Random(seed)
+    words = "lorem ipsum dolor sit amet qui est esse eum et nesciunt quas odio".split()
+    titles = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 6))) for _ in range(n)]
+    titles += [titles[3], titles[3] + "!", ""]   # duplicates and an empty title
+    return [{"id": i, "raw": t.title(), "norm": normalize_title(t)} for i, t in enumerate(titles)]
+
+
+@pytest.mark.parametrize("method", ["fuzzy", "cosine", "minhash"])
+def test_cached_graph_matches_direct_grouping_at_every_threshold(method):
+    items = _items()
+    graph = None
+    # one graph serves a slider sweep in any order, including thresholds below the default floor
+    for t in (0.8, 0.4, 0.95, 0.0, 0.55, 0.2, 1.0):
+        results, g = similarity_groups(items, method, [t], similarity_floor([t]), graph)
+        graph = g
+        assert results[0][0] == REFERENCE[method](items, t), t
+    assert graph.floor <= 0.2
+
+
+def test_graph_is_reused_when_floor_allows():
+    items = _items()
+    _, g = similarity_groups(items, "cosine", [0.5], similarity_floor([0.5]))
+    assert isinstance(g, SimilarityGraph) and g.floor == 0.3
+    assert similarity_groups(items, "cosine", [0.7, 0.9], 0.3, g)[1] is g
+    assert similarity_groups(items, "cosine", [0.1], 0.1, g)[1] is not g   # below the floor: rebuilt
+
+
+def test_fuzzy_scores_only_compute_unseen_pairs():
+    items = _items()
+    scores = FuzzyScores()
+    first = scores.groups(items, 0.6)[1]
+    again = scores.groups(items, 0.6)[1]
+    assert first["reused"] == 0 and again["reused"] == first["exact"] and again["exact"] == 0
+    lower = scores.groups(items, 0.5)[1]
+    assert lower["reused"] > 0 and scores.edges >= first["exact"] + lower["exact"]
+
+
+def test_cached_fuzzy_memo_is_never_grown_and_is_capped(monkeypatch):
+    from backend import simgraph
+    items = _items()
+    _, cached = similarity_groups(items, "fuzzy", [0.8], 0.3)
+    size = cached.nbytes()
+    _, grown = similarity_groups(items, "fuzzy", [0.5], 0.3, cached)
+    assert grown is not cached and cached.nbytes() == size and grown.edges > cached.edges
+    monkeypatch.setattr(simgraph, "FUZZY_MEMO_MAX", 5)
+    results, capped = similarity_groups(items, "fuzzy", [0.5], 0.3)
+    assert capped.edges == 5 and len(capped.bounds) <= 5
+    assert results[0][0] == REFERENCE["fuzzy"](items, 0.5)
+
+
+def test_multi_threshold_results_line_up():
+    items = _items()
+    results, _ = similarity_groups(items, "minhash", [0.3, 0.6, 0.9], 0.3)
+    assert [r[0] for r in results] == [REFERENCE["minhash"](items, t) for t in (0.3, 0.6, 0.9)]
+
+
+def test_fuzzy_pruning_is_counted():
+    stats = FuzzyScores().groups(_items(seed=7, n=150), 0.7)[1]
+    assert stats["pairs"] == stats["exact"] + stats["pruned_length"] + stats["pruned_chars"]
+    assert stats["pruned_length"] + stats["pruned_chars"] > 0
+
+
+def test_cosine_fallback_without_sklearn(monkeypatch):
+    def broken(*a, **k): raise ValueError("no sklearn")
+    items = _items(seed=3, n=120)
+    monkeypatch.setattr(utils, "TfidfVectorizer", broken)
+    dense = cosine_similarity_titles([it["norm"] for it in items])   # word-overlap fallback
+    for t in (0.0, 0.3, 0.6, 1.0):
+        assert groups_at(items, "cosine", t) == _dense_greedy(items, dense, t)
+
+
+def test_minhash_finds_near_duplicates():
+    titles = [
+        "sunt aut facere repellat provident occaecati",
+        "qui est esse",
+        "sunt aut facere repellat provident occaecatii",
+        "ea molestias quasi exercitationem repellat",
+        "qui est esse",
+        "sunt aut facere repellat provident occaecati",
+    ]
+    items = [{"id": i + 1, "raw": t, "norm": normalize_title(t)} for i, t in enumerate(titles)]
+    groups = groups_at(items, "minhash", 0.6)
+    assert {"rep_title": titles[0], "postIds": [1, 3, 6], "count": 3} in groups
+    assert {"rep_title": titles[1], "postIds": [2, 5], "count": 2} in groups
+    assert len(groups) == 2
+    # every edge kept in the graph is a real shingle Jaccard at or above its floor
+    graph = SimilarityGraph.build(items, "minhash", 0.3)
+    norms = list(dict.fromkeys(it["norm"] for it in items))
+    for i in range(len(graph.off) - 1):
+        for p in range(graph.off[i], graph.off[i + 1]):
+            j, w = graph.nbr[p], graph.w[p]
+            assert j > i and w >= 0.3 and w == jaccard(shingle_set(norms[i]), shingle_set(norms[j]))
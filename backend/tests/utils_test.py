@@ -64,3 +64,11 @@ def test_levenshtein_sim_basics():
     assert 0.5 < val < 0.6
     # totally different single chars -> 0
     assert levenshtein_sim("a", "b") == 0.0
+
+def test_cosine_neighbors_block_size_is_invisible():
+    import random
+    from backend.utils import cosine_neighbors
+    rng = random.Random(3)
+    words = "lorem ipsum dolor sit amet qui est esse eum et nesciunt quas odio".split()
+    titles = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 5))) for _ in range(120)]
+    assert cosine_neighbors(titles, 0.5, block_rows=7) == cosine_neighbors(titles, 0.5)
@@ -0,0 +1,56 @@
+import time
+import asyncio
+import pytest
+
+from backend.api_handle import app
+from backend.analytics import similarity_job, build_user_index
+from backend.corpus import CompactCorpus
+from backend.workers import AnalyticsExecutor, AnalyticsBusy, AnalyticsTimeout
+
+
+POSTS = [{"userId": 1 + i % 4, "id": i + 1, "title": f"lorem ipsum {i % 5} dolor", "body": ""} for i in range(40)]
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_modes_agree(mode):
+    index = build_user_index(CompactCorpus.from_posts(POSTS))
+    jobs = [(index[uid], "fuzzy", [0.8, 0.5], 0.5) for uid in sorted(index)]
+    pool = AnalyticsExecutor(mode, workers=2)
+    try:
+        got = asyncio.run(pool.map(similarity_job, jobs))
+        assert [res for res, _ in got] == [similarity_job(*j)[0] for j in jobs]
+    finally:
+        pool.shutdown()
+
+
+def test_queue_cap_and_timeout():
+    pool = AnalyticsExecutor("thread", workers=2, max_queue=2, timeout=0.05)
+
+    async def run():
+        # a fan-out wider than the cap runs through its own lanes instead of being rejected
+        assert await pool.map(abs, [(-i,) for i in range(10)]) == list(range(10))
+        with pytest.raises(AnalyticsTimeout):
+            await pool.run(time.sleep, 0.2)
+        # the abandoned job still holds its slot until the thread finishes
+        assert pool.pending == 1
+        await pool.run(abs, 1)
+        with pytest.raises(AnalyticsBusy):
+            await asyncio.gather(pool.run(time.sleep, 0.01), pool.map(abs, [(1,)]))
+        await asyncio.sleep(0.3)
+        assert pool.pending == 0
+    asyncio.run(run())
+    assert pool.stats["rejected"] == 1 and pool.stats["timeouts"] == 1
+    pool.shutdown()
+
+
+def test_busy_maps_to_503(monkeypatch, upstream):
+    client, _ = upstream(POSTS)
+    monkeypatch.setattr(app.state.analytics, "max_queue", 0)
+    r = client.get("/summary?max_scan=40&cache=false")
+    assert r.status_code == 503
+
+
+def test_anomalies_fan_out_wider_than_queue(monkeypatch, upstream, make_posts):
+    client, _ = upstream(make_posts(160, users=80, title="lorem ipsum {} dolor sit", body="", cycle=3))
+    monkeypatch.setattr(app.state.analytics, "max_queue", 8)
+    assert client.get("/anomalies?max_scan=160&cache=false").status_code == 200
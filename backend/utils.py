@@ -1,11 +1,18 @@
-import os, re, time, asyncio
+import os, re, time, zlib, asyncio, difflib, itertools
 from typing import Dict, List, Optional, Literal, Tuple
+from collections import Counter
 
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 from nltk.metrics import edit_distance
 
+COSINE_BLOCK_ROWS = int(os.getenv("COSINE_BLOCK_ROWS", "512"))   # rows per sparse similarity block
+MINHASH_PERM      = int(os.getenv("MINHASH_PERM", "64"))         # signature length (max 1024)
+MINHASH_BANDS     = int(os.getenv("MINHASH_BANDS", "16"))        # LSH bands; rows per band = PERM // BANDS
+MINHASH_SHINGLE   = int(os.getenv("MINHASH_SHINGLE", "3"))       # character shingle size
+
 
 # -------------------- /anomalies: short, duplicates, similar --------------------
 _space_re = re.compile(r"\s+")
@@ -18,7 +25,6 @@ def normalize_title(s: str) -> str:
     return s
 
 def fuzzy_ratio(a: str, b: str) -> float:
-    import difflib
     return difflib.SequenceMatcher(None, a, b).ratio()
 
 def cosine_similarity_titles(titles: List[str]) -> List[List[float]]:
@@ -46,6 +52,117 @@ def cosine_similarity_titles(titles: List[str]) -> List[List[float]]:
             mats.append(row)
         return mats
 
+def cosine_neighbors(titles: List[str], threshold: float, block_rows: int = COSINE_BLOCK_ROWS) -> List[List[Tuple[int, float]]]:
+    """
+    Sparse counterpart of cosine_similarity_titles: for each i, the (j, sim) pairs with
+    j > i and sim >= threshold (threshold > 0), in ascending j. Similarities come from the
+    TF-IDF sparse matrix `block_rows` rows at a time, so no n x n matrix is ever built.
+    Falls back to word-overlap cosine over an inverted index if scikit-learn fails.
+    """
+    n = len(titles)
+    out: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+    try:
+        X = TfidfVectorizer(ngram_range=(1,2), min_df=1).fit_transform(titles)
+    except Exception:
+        return _overlap_neighbors(titles, threshold)
+    for lo in range(0, n, block_rows):
+        block = cosine_similarity(X[lo:lo + block_rows], X, dense_output=False).tocsr()
+        for r in range(block.shape[0]):
+            i = lo + r
+            a, b = block.indptr[r], block.indptr[r + 1]
+            row = sorted((int(j), float(v)) for j, v in zip(block.indices[a:b], block.data[a:b]) if j > i and v >= threshold)
+            out[i] = row
+    return out
+
+def _overlap_neighbors(titles: List[str], threshold: float) -> List[List[Tuple[int, float]]]:
+    sets = [set(t.split()) for t in titles]
+    postings: Dict[str, List[int]] = {}
+    for i, A in enumerate(sets):
+        for w in A:
+            postings.setdefault(w, []).append(i)
+    empties = [i for i, A in enumerate(sets) if not A]
+    out: List[List[Tuple[int, float]]] = [[] for _ in titles]
+    for i, A in enumerate(sets):
+        if not A:
+            out[i] = [(j, 1.0) for j in empties if j > i]  # two empty titles count as identical
+            continue
+        inter = Counter(j for w in A for j in postings[w] if j > i)
+        row = []
+        for j, k in inter.items():
+            sim = k / ((len(A) * len(sets[j])) ** 0.5 or 1.0)
+            if sim >= threshold:
+                row.append((j, sim))
+        out[i] = sorted(row)
+    return out
+
+# -------------------- MinHash / LSH near-duplicates --------------------
+_MERSENNE = (1 << 31) - 1
+_mh_rng = np.random.default_rng(20240229)   # fixed seed: signatures are stable across processes
+_MH_A = _mh_rng.integers(1, _MERSENNE, size=1024, dtype=np.uint64)
+_MH_B = _mh_rng.integers(0, _MERSENNE, size=1024, dtype=np.uint64)
+
+def shingle_set(s: str, k: int = MINHASH_SHINGLE) -> set:
+    """
+    Hashed character k-shingles; strings shorter than k are a single shingle.
+    """
+    if len(s) <= k:
+        return {zlib.crc32(s.encode())} if s else set()
+    return {zlib.crc32(s[i:i + k].encode()) for i in range(len(s) - k + 1)}
+
+def minhash_signatures(sets: List[set], num_perm: int = MINHASH_PERM, chunk: int = 1 << 16) -> np.ndarray:
+    """
+    (n, num_perm) MinHash signatures, hashing about `chunk` shingles at a time.
+    Empty sets get an all-max signature (they only collide with each other).
+    """
+    sig = np.full((len(sets), num_perm), _MERSENNE, dtype=np.uint64)
+    a, b = _MH_A[:num_perm], _MH_B[:num_perm]
+    docs = [i for i, S in enumerate(sets) if S]
+    lo = 0
+    while lo < len(docs):
+        hi, size = lo, 0
+        while hi < len(docs) and (size == 0 or size + len(sets[docs[hi]]) <= chunk):
+            size += len(sets[docs[hi]]); hi += 1
+        block = docs[lo:hi]
+        lens = [len(sets[i]) for i in block]
+        x = np.fromiter(itertools.chain.from_iterable(sets[i] for i in block), dtype=np.uint64, count=size) % _MERSENNE
+        starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+        sig[block] = np.minimum.reduceat((x[:, None] * a + b) % _MERSENNE, starts, axis=0)
+        lo = hi
+    return sig
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0  # two empty titles count as identical
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+def lsh_buckets(sets: List[set], num_perm: int = MINHASH_PERM, bands: int = MINHASH_BANDS) -> List[List[List[int]]]:
+    """
+    For each set, the LSH buckets (ascending member lists, shared between members) it falls in:
+    one per band of num_perm // bands signature rows. A pair with Jaccard s shares at least one
+    bucket with probability 1 - (1 - s^rows)^bands: more bands -> higher recall, fewer -> precision.
+    """
+    rows = max(1, num_perm // bands)
+    sigs = minhash_signatures(sets, rows * bands)
+    doc_buckets: List[List[List[int]]] = [[] for _ in sets]
+    for band in range(bands):
+        # fold each band's rows into one 64-bit key (wrapping arithmetic); a rare key collision
+        # only adds a candidate, which the exact Jaccard check then rejects
+        keys = (sigs[:, band * rows:(band + 1) * rows] * _MH_A[-rows:]).sum(axis=1)
+        buckets: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys.tolist()):
+            members = buckets.setdefault(key, [])
+            members.append(i)
+            doc_buckets[i].append(members)
+    return doc_buckets
+
+def _lsh_candidates(i: int, doc_buckets: List[List[List[int]]], skip=None) -> List[int]:
+    cands = set()
+    for members in doc_buckets[i]:
+        if len(members) > 1:
+            cands.update(members)
+    return sorted(j for j in cands if j > i and not (skip and skip[j]))
+
 def levenshtein_sim(a: str, b: str) -> float:
     # normalized similarity in [0,1]
     if not a and not b:
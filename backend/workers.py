@@ -0,0 +1,117 @@
+import os, asyncio, multiprocessing
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# -------------------- Analytics execution backend --------------------
+class AnalyticsBusy(Exception):
+    """Too many analytics jobs queued; surfaced as 503."""
+
+
+class AnalyticsTimeout(Exception):
+    """An analytics job exceeded its time budget; surfaced as 504."""
+
+
+class AnalyticsExecutor:
+    """
+    Runs CPU-bound analytics off the event loop.
+    - mode "inline":  call directly (blocks the loop; no queue cap or timeout)
+    - mode "thread":  ThreadPoolExecutor (sklearn/numpy release the GIL for the heavy parts)
+    - mode "process": ProcessPoolExecutor (spawn); args/results must be picklable
+    At most `max_queue` jobs may be pending at once; a job running past `timeout` seconds
+    is abandoned by the caller (the worker finishes it in the background).
+    """
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None, max_queue: int = 64, timeout: float = 30.0):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"unknown analytics executor: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        self.pending = 0
+        self.stats = {"completed": 0, "rejected": 0, "timeouts": 0}
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="analytics")
+        return self._pool
+
+    def _admit(self, n: int):
+        if self.pending + n > self.max_queue:
+            self.stats["rejected"] += n
+            raise AnalyticsBusy(f"analytics queue full ({self.pending} pending)")
+
+    def _start(self, fn: Callable, args: Sequence) -> asyncio.Future:
+        # pending counts jobs the pool holds, until the worker is actually done with them
+        # (a timed-out thread job keeps its slot while it runs on)
+        loop = asyncio.get_running_loop()
+        cfut = self._get_pool().submit(fn, *args)
+        self.pending += 1
+        cfut.add_done_callback(lambda _: self._finished(loop))
+        return asyncio.wrap_future(cfut)
+
+    def _finished(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:   # loop already closed
+            self._release()
+
+    def _release(self):
+        self.pending -= 1
+
+    async def _submit(self, fn: Callable, args: Sequence):
+        fut = self._start(fn, args)
+        try:
+            result = await asyncio.wait_for(fut, self.timeout) if self.timeout else await fut
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise AnalyticsTimeout(f"analytics job exceeded {self.timeout}s")
+        self.stats["completed"] += 1
+        return result
+
+    async def run(self, fn: Callable, *args):
+        if self.mode == "inline":
+            return fn(*args)
+        self._admit(1)
+        return await self._submit(fn, args)
+
+    async def map(self, fn: Callable, arg_lists: Iterable[Sequence]) -> List:
+        """
+        Fan independent jobs out across the pool; results come back in input order.
+        At most min(workers, max_queue) of the batch are in flight at once, and only that
+        many slots are admitted, so one large fan-out cannot exceed the queue cap by itself.
+        """
+        arg_lists = list(arg_lists)
+        if self.mode == "inline":
+            return [fn(*args) for args in arg_lists]
+        if not arg_lists:
+            return []
+        width = max(1, min(len(arg_lists), self.workers, self.max_queue))
+        self._admit(width)
+        results: List = [None] * len(arg_lists)
+        jobs = iter(enumerate(arg_lists))
+
+        async def lane():
+            for i, args in jobs:
+                results[i] = await self._submit(fn, args)
+
+        lanes = [asyncio.ensure_future(lane()) for _ in range(width)]
+        try:
+            await asyncio.gather(*lanes)
+        finally:
+            for t in lanes:
+                t.cancel()
+        return results
+
+    def info(self) -> Dict:
+        return {"mode": self.mode, "workers": self.workers, "pending": self.pending, **self.stats}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
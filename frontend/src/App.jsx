@@ -91,26 +91,27 @@ async function loadAnomaliesOnly() {
     setError("");
     setLoading(true);
     try {
-      // posts slice for mapping ids -> titles
-      const postsRes = await safeFetch(`${apiBase}/posts?limit=200&offset=0`);
-      const posts = Array.isArray(postsRes) ? postsRes : postsRes.data;
-      const idx = new Map(posts.map((p) => [p.id, { id: p.id, userId: p.userId, title: p.title }]));
-      setPostsIndex(idx);
-
+      // one request: posts slice (ids -> titles), anomalies and summary from the same scan
       const params = new URLSearchParams({
+        posts_limit: "200",
+        posts_offset: "0",
         method,
         min_title_len: String(minLen),
         similar_threshold: String(threshold),
+        top_n_users: String(sumTopN),
+        drop_stopwords: sumDropStops ? "true" : "false",
+        max_scan: String(sumMaxScan),
         cache: "true",
       });
-      setAnoms(await safeFetch(`${apiBase}/anomalies?${params.toString()}`));
-
-      //anomalies
-      await loadAnomaliesOnly();
-      // summary
-      await loadSummaryOnly();
+      const data = await safeFetch(`${apiBase}/dashboard?${params.toString()}`);
+      const posts = data.posts?.data || [];
+      setPostsIndex(new Map(posts.map((p) => [p.id, { id: p.id, userId: p.userId, title: p.title }])));
+      setAnoms(data.anomalies);
+      setSummary(data.summary);
   } catch (e) {
     setError(e.message || String(e));
+    // nothing loaded yet: undefined lets TopWordsChart fetch /summary on its own
+    setSummary((s) => s ?? undefined);
   } finally {
     setLoading(false);
   }
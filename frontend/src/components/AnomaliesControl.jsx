@@ -57,7 +57,7 @@ export default function AnomaliesControl({
         <div className="space-y-2">
           <div className="text-sm text-neutral-300">Method</div>
           <div className="flex flex-wrap gap-2">
-            {["exact", "fuzzy", "cosine", "embedding"].map((m) => (
+            {["exact", "fuzzy", "cosine", "minhash", "embedding"].map((m) => (
               <button
                 key={m}
                 type="button"
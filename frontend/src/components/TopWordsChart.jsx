@@ -22,9 +22,10 @@ export default function TopWordsChart({
   const [loading, setLoading] = useState(false);
   const [err, setErr] = useState("");
 
-  // fetch only if summary prop not supplied
+  // fetch only if summary prop not supplied (null = parent is still loading it; App passes
+  // undefined when its /dashboard request failed)
   useEffect(() => {
-    if (summary) return; // reuse prop, no fetch
+    if (summary !== undefined) return; // reuse prop, no fetch
     if (!apiBase) return;
 
     const ctrl = new AbortController();